@@ -1,3 +1,6 @@
+-- Схема применяется командой `python schema.py migrate` (версионированные миграции);
+-- этот файл — справочник по таблицам и запросам отчётов.
+
 -- Создание таблиц one-to-many
 
 CREATE TABLE rooms (
@@ -13,9 +16,143 @@ CREATE TABLE students (
     room_id INT REFERENCES Rooms(id)
 );
 
--- Список комнат и количество студентов в каждой из них
+-- Сводная статистика по комнатам; загрузчик пересчитывает её для затронутых комнат,
+-- экспорт с --room-stats читает отчёты из неё, не агрегируя students.
+-- birthday_sum — сумма дат рождения в днях от 1970-01-01.
+
+CREATE TABLE room_stats (
+    room_id INT PRIMARY KEY REFERENCES rooms(id),
+    student_count INT NOT NULL,
+    birthday_min DATE,
+    birthday_max DATE,
+    birthday_sum BIGINT,
+    male_count INT NOT NULL,
+    female_count INT NOT NULL
+);
+
+-- Хеш содержимого строки: загрузка в режиме синхронизации пропускает неизменившихся студентов
+
+ALTER TABLE students ADD COLUMN content_hash UUID GENERATED ALWAYS AS (
+    md5(name || '|' || (birthday - DATE '1970-01-01')::text || '|' || sex || '|' || COALESCE(room_id::text, ''))::uuid
+) STORED;
+
+-- Дата рождения в виде числа YYYYMMDD: возраст в полных годах на дату as_of —
+-- целочисленное (as_of_key - birthday_key) / 10000, без AGE для каждой строки
+
+ALTER TABLE students ADD COLUMN birthday_key INT GENERATED ALWAYS AS (
+    (EXTRACT(YEAR FROM birthday) * 10000 + EXTRACT(MONTH FROM birthday) * 100 + EXTRACT(DAY FROM birthday))::int
+) STORED;
+
+-- Столбцы room_stats, по которым упорядочены отчёты с первыми N комнатами:
+-- средняя дата рождения (средний возраст убывает с её ростом) и полных лет между
+-- самой ранней и самой поздней датой рождения (разница в возрасте на любую дату отличается не больше чем на 1)
+
+ALTER TABLE room_stats ADD COLUMN birthday_mean NUMERIC GENERATED ALWAYS AS (
+    birthday_sum::numeric / NULLIF(student_count, 0)
+) STORED;
+
+ALTER TABLE room_stats ADD COLUMN age_span INT GENERATED ALWAYS AS (
+    ((EXTRACT(YEAR FROM birthday_max) * 10000 + EXTRACT(MONTH FROM birthday_max) * 100 + EXTRACT(DAY FROM birthday_max))
+    - (EXTRACT(YEAR FROM birthday_min) * 10000 + EXTRACT(MONTH FROM birthday_min) * 100 + EXTRACT(DAY FROM birthday_min)))::int / 10000
+) STORED;
+
+CREATE INDEX idx_room_stats_birthday_mean ON room_stats (birthday_mean DESC, room_id) WHERE student_count > 0;
+CREATE INDEX idx_room_stats_age_span ON room_stats (age_span DESC, room_id) WHERE student_count > 0;
+
+-- Покрывающий индекс для агрегатов по комнатам (index-only scan)
+
+CREATE INDEX idx_students_room_id_ages ON students (room_id) INCLUDE (id, birthday_key, birthday, sex);
+
+-- Секционирование по корпусам (python schema.py partition): корпус b — комнаты
+-- с id от b * ROOMS_PER_BUILDING до (b + 1) * ROOMS_PER_BUILDING - 1, по секции на корпус.
+-- Первичный ключ секционированной таблицы включает ключ секционирования.
+-- Запросы отчётов ограничены диапазоном room_id корпуса (--building), поэтому
+-- планировщик читает только его секцию; без --building диапазон охватывает все комнаты.
+
+CREATE TABLE students (
+    id INT NOT NULL DEFAULT nextval('students_id_seq'),
+    name VARCHAR(255) NOT NULL,
+    birthday DATE NOT NULL,
+    sex CHAR(1) NOT NULL,
+    room_id INT NOT NULL REFERENCES rooms(id),
+    PRIMARY KEY (id, room_id)
+) PARTITION BY RANGE (room_id);
+
+CREATE TABLE students_building_3 PARTITION OF students FOR VALUES FROM (300) TO (400);
+
+-- Глобальная уникальность id: первичный ключ student_ids отвергает id, уже занятый в другом корпусе;
+-- триггеры уровня оператора (track_student_ids) добавляют и удаляют id вместе со строками students
 
-CREATE INDEX idx_students_room_id ON students(room_id);
+CREATE TABLE student_ids (id INT PRIMARY KEY);
+
+CREATE TRIGGER students_track_ids_insert AFTER INSERT ON students
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_student_ids();
+
+-- Уведомления об изменениях (report_watcher.py): триггеры уровня команды отправляют в канал
+-- room_changes идентификаторы изменившихся комнат через запятую, порциями по 500
+-- (полезная нагрузка NOTIFY ограничена 8000 байтами). Триггер students (миграция 11) обходится
+-- без таблиц переходов, которые хранили бы каждую строку COPY, и отправляет '*' — наблюдатель
+-- пересчитывает все отчёты. Загрузчики и заселение выполняют SET LOCAL dormitory.defer_notify = 'on',
+-- отключающий триггеры, и сами отправляют комнаты записанных студентов перед фиксацией.
+
+CREATE FUNCTION notify_room_changes() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    changed INT[];
+BEGIN
+    IF current_setting('dormitory.defer_notify', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        SELECT array_agg(id ORDER BY id) INTO changed FROM old_rows;
+    ELSE
+        SELECT array_agg(id ORDER BY id) INTO changed FROM new_rows;
+    END IF;
+    PERFORM pg_notify('room_changes', array_to_string(changed[1:500], ','));
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER rooms_notify_insert AFTER INSERT ON rooms
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_room_changes();
+
+CREATE TRIGGER rooms_notify_delete AFTER DELETE ON rooms
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_room_changes();
+
+CREATE FUNCTION notify_students_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF current_setting('dormitory.defer_notify', true) IS DISTINCT FROM 'on' THEN
+        PERFORM pg_notify('room_changes', '*');
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER students_notify_changes AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON students
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_students_changed();
+
+LISTEN room_changes;
+
+-- Первая загрузка с --unlogged (data_loader.py): студенты пишутся через COPY в нежурналируемую
+-- таблицу без индексов, а последняя транзакция подменяет ею пустую students и строит ключи и индекс.
+-- Триггеры уведомлений создаются заново, загруженные комнаты уведомляются через pg_notify.
+
+CREATE UNLOGGED TABLE students_load (LIKE students INCLUDING DEFAULTS INCLUDING GENERATED);
+
+COPY students_load (id, room_id, birthday, sex, name) FROM STDIN WITH (FORMAT binary);
+
+ALTER TABLE students_load SET LOGGED;
+ALTER SEQUENCE students_id_seq OWNED BY NONE;
+DROP TABLE students;
+ALTER TABLE students_load RENAME TO students;
+ALTER SEQUENCE students_id_seq OWNED BY students.id;
+ALTER TABLE students ADD PRIMARY KEY (id);
+ALTER TABLE students ADD FOREIGN KEY (room_id) REFERENCES rooms(id);
+CREATE INDEX idx_students_room_id_ages ON students (room_id) INCLUDE (id, birthday_key, birthday, sex);
+
+-- Список комнат и количество студентов в каждой из них
 
 SELECT rooms.id, rooms.name, COUNT(students.id) AS student_count
 FROM rooms
@@ -23,34 +160,30 @@ LEFT JOIN students ON rooms.id = students.room_id
 GROUP BY rooms.id, rooms.name
 ORDER BY rooms.id;
 
--- 5 комнат, где самый маленький средний возраст студентов
+-- 5 комнат, где самый маленький средний возраст студентов (возраст на 2024-09-01)
 
-CREATE INDEX idx_students_birthday ON students(birthday);
-
-SELECT rooms.id, rooms.name, AVG(EXTRACT(YEAR FROM AGE(NOW(), students.birthday))) AS average_age
+SELECT rooms.id, rooms.name, AVG((20240901 - students.birthday_key) / 10000) AS average_age
 FROM rooms
-LEFT JOIN students ON rooms.id = students.room_id
+INNER JOIN students ON rooms.id = students.room_id
 GROUP BY rooms.id, rooms.name
-ORDER BY average_age ASC
+ORDER BY average_age ASC, rooms.id
 LIMIT 5;
 
--- 5 комнат с самой большой разницей в возрасте студентов
+-- 5 комнат с самой большой разницей в возрасте студентов (возраст на 2024-09-01)
 
-CREATE INDEX idx_students_birthday ON students(birthday);
-
-SELECT rooms.id, rooms.name, MAX(EXTRACT(YEAR FROM AGE(NOW(), students.birthday))) - MIN(EXTRACT(YEAR FROM AGE(NOW(), students.birthday))) AS age_difference
+SELECT rooms.id, rooms.name,
+    ((20240901 - MIN(students.birthday_key)) / 10000 - (20240901 - MAX(students.birthday_key)) / 10000)::numeric AS age_difference
 FROM rooms
-LEFT JOIN students ON rooms.id = students.room_id
+INNER JOIN students ON rooms.id = students.room_id
 GROUP BY rooms.id, rooms.name
-ORDER BY age_difference DESC
+ORDER BY age_difference DESC, rooms.id
 LIMIT 5;
 
 -- Список комнат где живут разнополые студенты
 
-CREATE INDEX idx_students_sex ON students(sex);
-
 SELECT rooms.id, rooms.name
 FROM rooms
 INNER JOIN students ON rooms.id = students.room_id
 GROUP BY rooms.id, rooms.name
-HAVING COUNT(DISTINCT students.sex) > 1;
+HAVING COUNT(DISTINCT students.sex) > 1
+ORDER BY rooms.id;
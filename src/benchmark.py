@@ -0,0 +1,318 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
+from data_exporter_async import AsyncDataExporter
+from data_exporter_json import DataExporterJson
+from data_exporter_xml import DataExporterXml
+from data_loader import DataLoader
+from database_manager import DatabaseManager
+from json_stream import write_json_array
+from metrics import METRICS
+from schema import SchemaManager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FIRST_NAMES = ["Peggy", "Christian", "Juan", "Nathaniel", "Laura", "Maria", "John", "Olga", "Ivan", "Anna",
+               "Kevin", "Sofia", "Daniel", "Emma", "Pavel", "Irina", "Mark", "Alice", "Yahor", "Nina"]
+LAST_NAMES = ["Ryan", "Bush", "Strickland", "Clark", "Smith", "Ivanov", "Brown", "Petrova", "Miller", "Davis",
+              "Garcia", "Wilson", "Moore", "Taylor", "Kozlov", "Martin", "Lee", "Walker", "Young", "King"]
+BIRTHDAY_START = date(1915, 1, 1)
+BIRTHDAY_DAYS = (date(2015, 12, 31) - BIRTHDAY_START).days
+STUDENTS_PER_ROOM = 10
+GENERATE_BATCH_SIZE = 10000
+
+EXPORT_METHODS = [
+    "export_rooms_with_student_count",
+    "export_rooms_with_average_age",
+    "export_rooms_with_age_difference",
+    "export_rooms_with_multiple_sex",
+]
+
+
+def generate_dataset(output_dir: str, students: int, rooms: Optional[int] = None,
+                     skew: float = 1.0, seed: int = 0) -> None:
+    """
+    Генерирует синтетические rooms.json и students.json того же вида, что и файлы в data/.
+
+    Заселённость комнат неравномерная: вес комнаты с номером k пропорционален 1 / (k + 1) ** skew,
+    при skew = 0 студенты распределяются равномерно. Файлы пишутся потоково, поэтому
+    генерация десятков миллионов студентов не требует памяти под весь набор.
+
+    Args:
+        output_dir (str): Каталог для файлов rooms.json и students.json.
+        students (int): Количество студентов.
+        rooms (Optional[int]): Количество комнат; по умолчанию одна комната на STUDENTS_PER_ROOM студентов.
+        skew (float): Степень неравномерности заселённости.
+        seed (int): Начальное значение генератора случайных чисел.
+    """
+    rooms = rooms or max(1, students // STUDENTS_PER_ROOM)
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(os.path.join(output_dir, "rooms.json"), 'w') as rooms_file:
+        write_json_array(rooms_file, ({"id": room_id, "name": f"Room #{room_id}"} for room_id in range(rooms)), 4)
+
+    cumulative_weights = []
+    total = 0.0
+    for room_id in range(rooms):
+        total += 1.0 / (room_id + 1) ** skew
+        cumulative_weights.append(total)
+    room_ids = list(range(rooms))
+    # Номера комнат перемешиваются, чтобы самые заселённые не шли подряд
+    rng.shuffle(room_ids)
+
+    def students_records() -> Iterator[Dict[str, Any]]:
+        for start in range(0, students, GENERATE_BATCH_SIZE):
+            size = min(GENERATE_BATCH_SIZE, students - start)
+            assigned_rooms = rng.choices(room_ids, cum_weights=cumulative_weights, k=size)
+            for offset, room_id in enumerate(assigned_rooms):
+                birthday = BIRTHDAY_START + timedelta(days=rng.randrange(BIRTHDAY_DAYS))
+                yield {
+                    "birthday": f"{birthday.isoformat()}T00:00:00.000000",
+                    "id": start + offset,
+                    "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                    "room": room_id,
+                    "sex": rng.choice("MF"),
+                }
+
+    with open(os.path.join(output_dir, "students.json"), 'w') as students_file:
+        write_json_array(students_file, students_records(), 4)
+    logger.info(f"Generated {students} students in {rooms} rooms in {output_dir}")
+
+
+async def _export_async(db_manager: DatabaseManager, output_dir: str) -> None:
+    """
+    Экспортирует все отчёты в JSON и XML асинхронным экспортёром.
+    """
+    async with AsyncDataExporter(db_manager) as exporter:
+        await exporter.export_all(output_dir)
+
+
+def _measure(target: Callable[[], Optional[int]]) -> Dict[str, Any]:
+    """
+    Выполняет функцию в отдельном процессе и измеряет время и пиковое потребление памяти.
+
+    Отдельный процесс нужен, чтобы пиковый RSS относился только к измеряемому шагу.
+
+    Args:
+        target (Callable[[], Optional[int]]): Измеряемая функция.
+
+    Returns:
+        Dict[str, Any]: Время выполнения в секундах, пиковый RSS в килобайтах, а также время
+            по фазам и счётчики шага (см. metrics.Metrics.snapshot).
+    """
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+
+    def run() -> None:
+        METRICS.reset()
+        started = time.perf_counter()
+        target()
+        wall_time = time.perf_counter() - started
+        sender.send({"wall_time": wall_time, "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                     **METRICS.snapshot()})
+
+    process = context.Process(target=run)
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Benchmark step failed with exit code {process.exitcode}")
+    return receiver.recv()
+
+
+class BenchmarkRunner:
+    """
+    Класс для замера производительности загрузки и экспорта на локальной базе PostgreSQL.
+
+    Каждый шаг выполняется в отдельном процессе; для него записываются время выполнения,
+    количество строк в секунду и пиковый RSS.
+
+    Args:
+        db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+        workers (int): Количество процессов и соединений для загрузки студентов.
+
+    Methods:
+        run(data_dir: str) -> List[Dict[str, Any]]:
+            Загружает набор данных и выполняет все экспорты, возвращая результаты замеров.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, workers: int = 1):
+        """
+        Инициализирует экземпляр класса BenchmarkRunner.
+
+        Args:
+            db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+            workers (int): Количество процессов и соединений для загрузки студентов.
+        """
+        self.db_manager = db_manager
+        self.workers = workers
+
+    def _reset_database(self) -> None:
+        """
+        Применяет миграции и очищает таблицы перед загрузкой.
+        """
+        SchemaManager(self.db_manager).migrate()
+        with self.db_manager as db:
+            with db.conn.cursor() as cursor:
+                cursor.execute("TRUNCATE room_stats, students, rooms;")
+            db.conn.commit()
+
+    def _step(self, name: str, rows: int, target: Callable[[], Optional[int]]) -> Dict[str, Any]:
+        """
+        Измеряет один шаг и записывает результат в журнал.
+        """
+        # Соединения родительского процесса не должны наследоваться измеряемым процессом
+        self.db_manager.pool.closeall()
+        result = {"name": name, "rows": rows, **_measure(target)}
+        result["rows_per_sec"] = rows / result["wall_time"] if result["wall_time"] > 0 else None
+        logger.info(f"{name}: {result['wall_time']:.3f}s, {result['peak_rss_kb']} KB peak RSS")
+        return result
+
+    def run(self, data_dir: str) -> List[Dict[str, Any]]:
+        """
+        Загружает rooms.json и students.json из data_dir и выполняет все методы экспорта.
+
+        Для загрузки rows — количество студентов; для экспортов — количество студентов,
+        которые агрегирует запрос.
+
+        Args:
+            data_dir (str): Каталог с rooms.json и students.json.
+
+        Returns:
+            List[Dict[str, Any]]: Результаты замеров по шагам.
+        """
+        rooms_file = os.path.join(data_dir, "rooms.json")
+        students_file = os.path.join(data_dir, "students.json")
+        self._reset_database()
+
+        loader = DataLoader(self.db_manager)
+        results = []
+        results.append(self._step("load_data_to_db", -1, lambda: loader.load_data_to_db(
+            rooms_file, students_file, workers=self.workers)))
+
+        with self.db_manager as db:
+            with db.conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM students;")
+                students = cursor.fetchone()[0]
+                db.conn.commit()
+                # Без актуальной статистики планировщик не выбирает index-only scan
+                db.conn.autocommit = True
+                cursor.execute("VACUUM ANALYZE;")
+                db.conn.autocommit = False
+        results[0]["rows"] = students
+        results[0]["rows_per_sec"] = students / results[0]["wall_time"] if results[0]["wall_time"] > 0 else None
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            for exporter_class, extension in ((DataExporterJson, "json"), (DataExporterXml, "xml")):
+                exporter = exporter_class(self.db_manager)
+                for method in EXPORT_METHODS:
+                    output_file = os.path.join(output_dir, f"{method}.{extension}")
+                    export = getattr(exporter, method)
+                    results.append(self._step(f"{exporter_class.__name__}.{method}", students,
+                                              lambda: export(output_file)))
+                results.append(self._step(f"{exporter_class.__name__}.export_all", students,
+                                          lambda: exporter.export_all(output_dir)))
+            results.append(self._step("AsyncDataExporter.export_all", students,
+                                      lambda: asyncio.run(_export_async(self.db_manager, output_dir))))
+        return results
+
+
+def _git_revision() -> Optional[str]:
+    """
+    Возвращает короткий хеш текущего коммита или None вне git-репозитория.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results_file: str, run: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Добавляет результаты прогона в JSON-файл с историей прогонов.
+
+    Args:
+        results_file (str): Путь к файлу с историей.
+        run (Dict[str, Any]): Результаты прогона.
+
+    Returns:
+        Optional[Dict[str, Any]]: Предыдущий прогон на наборе того же размера, если он есть.
+    """
+    history = []
+    if os.path.exists(results_file):
+        with open(results_file, 'r') as file:
+            history = json.load(file)
+
+    previous = next((item for item in reversed(history) if item["students"] == run["students"]), None)
+    history.append(run)
+    with open(results_file, 'w') as file:
+        json.dump(history, file, indent=2)
+    return previous
+
+
+def log_comparison(previous: Dict[str, Any], current: Dict[str, Any]) -> None:
+    """
+    Записывает в журнал изменение времени каждого шага относительно предыдущего прогона.
+
+    Args:
+        previous (Dict[str, Any]): Предыдущий прогон.
+        current (Dict[str, Any]): Текущий прогон.
+    """
+    previous_steps = {step["name"]: step for step in previous["results"]}
+    for step in current["results"]:
+        before = previous_steps.get(step["name"])
+        if before and before["wall_time"] > 0:
+            change = (step["wall_time"] - before["wall_time"]) / before["wall_time"] * 100
+            logger.info(f"{step['name']}: {before['wall_time']:.3f}s -> {step['wall_time']:.3f}s ({change:+.1f}%) "
+                        f"vs {previous.get('revision')}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic data and benchmark loading and exports.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="Generate synthetic rooms.json and students.json.")
+    generate_parser.add_argument("--students", type=int, default=10000, help="Number of students.")
+    generate_parser.add_argument("--rooms", type=int, help="Number of rooms (default: students / 10).")
+    generate_parser.add_argument("--skew", type=float, default=1.0,
+                                 help="Room occupancy skew; 0 gives uniform occupancy.")
+    generate_parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    generate_parser.add_argument("--output-dir", default="benchmark_data", help="Directory for generated files.")
+
+    run_parser = subparsers.add_parser("run", help="Load a data set and time every loader and exporter method.")
+    run_parser.add_argument("--data-dir", default="benchmark_data", help="Directory with rooms.json and students.json.")
+    run_parser.add_argument("--results", default="benchmark_results.json", help="JSON file to append results to.")
+    run_parser.add_argument("--workers", type=int, default=1, help="Workers for the student load.")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        generate_dataset(args.output_dir, args.students, args.rooms, args.skew, args.seed)
+
+    if args.command == "run":
+        db_manager = DatabaseManager(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
+        step_results = BenchmarkRunner(db_manager, args.workers).run(args.data_dir)
+        current_run = {
+            "revision": _git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "students": step_results[0]["rows"],
+            "workers": args.workers,
+            "results": step_results,
+        }
+        previous_run = save_results(args.results, current_run)
+        if previous_run:
+            log_comparison(previous_run, current_run)
@@ -3,3 +3,53 @@ DB_PORT = '5432'
 DB_NAME = 'dormitory'
 DB_USER = 'postgres'
 DB_PASSWORD = 'postgres'
+
+# Минимальное количество студентов, начиная с которого вставка идёт через COPY
+COPY_MIN_ROWS = 1000
+
+# Количество студентов, которое читается из файла и вставляется за один раз
+LOAD_BATCH_SIZE = 5000
+
+# Файл JSON Lines, в который загрузчик дописывает отклонённые проверкой записи о студентах
+LOAD_REJECTS_FILE = 'rejected_students.jsonl'
+
+# Пакетная фиксация загрузки студентов (data_loader.py --commit-rows / --commit-bytes)
+LOAD_COMMIT_ROWS = None  # Фиксировать транзакцию после стольких строк; None — вся загрузка одной транзакцией
+LOAD_COMMIT_BYTES = None  # Фиксировать транзакцию после стольких байт переданных данных; None — без ограничения
+
+# Сколько секунд поток записи параллельной загрузки ждёт остальные потоки перед фиксацией;
+# по истечении все транзакции загрузки откатываются
+LOAD_COMMIT_TIMEOUT = 600
+
+# Пул соединений с базой данных
+POOL_MIN_SIZE = 1  # Сколько простаивающих соединений держать открытыми несмотря на таймаут
+POOL_MAX_SIZE = 16  # Максимальное количество одновременно открытых соединений
+POOL_IDLE_TIMEOUT = 300  # Через сколько секунд простоя лишнее соединение закрывается
+POOL_HEALTH_CHECK_INTERVAL = 30  # После скольких секунд простоя соединение проверяется перед выдачей
+POOL_TIMEOUT = 30  # Сколько секунд ждать свободного соединения, если пул исчерпан
+
+# Количество строк, которое серверный курсор передаёт за один запрос при потоковом экспорте
+EXPORT_ITERSIZE = 2000
+
+# Кеш результатов запросов экспортёров на диске
+QUERY_CACHE_DIR = '.query_cache'  # Каталог кеша; загрузчик меняет в нём версию данных после каждой загрузки
+QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Максимальный размер кеша; старые записи вытесняются (LRU)
+
+# Заселение студентов (room_placement.py)
+ROOM_CAPACITY = 4  # Количество мест в комнате
+PLACEMENT_MAX_AGE_GAP = 5  # Наибольшая разница в возрасте соседей по комнате, полных лет
+PLACEMENT_UNPLACED_FILE = 'unplaced_students.jsonl'  # Файл JSON Lines для студентов, которых не удалось заселить
+
+# Наблюдение за изменениями (report_watcher.py)
+WATCH_DEBOUNCE = 0.1  # Сколько секунд без новых уведомлений ждать перед перезаписью отчётов
+WATCH_MAX_DELAY = 0.5  # Наибольшая задержка перезаписи после первого уведомления при непрерывном потоке изменений
+
+# Количество комнат в отчётах о самом маленьком среднем возрасте и самой большой разнице в возрасте
+TOP_ROOMS_LIMIT = 5
+
+# Количество комнат в корпусе: корпус b — комнаты с идентификаторами от b * ROOMS_PER_BUILDING
+# до (b + 1) * ROOMS_PER_BUILDING - 1; по корпусам секционируется таблица students (schema.py partition)
+ROOMS_PER_BUILDING = 100
+
+# Количество строк в одном пакете (record batch) колоночного снимка Arrow/Parquet
+SNAPSHOT_BATCH_SIZE = 50000
@@ -0,0 +1,318 @@
+import argparse
+import logging
+import os
+from datetime import date
+from typing import Any, Collection, Dict, Iterator, List, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from config import LOAD_BATCH_SIZE, LOAD_REJECTS_FILE
+from data_exporter_arrow import SEX_CODES, SEX_DICTIONARY
+from json_stream import batched, iter_json_records
+from metrics import METRICS, add_metrics_arguments, instrumented
+from student_validation import validate_students, write_rejected
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Скомпилированные файлы — Arrow IPC без сжатия: столбцы фиксированной ширины и куча строк
+# отображаются в память и читаются без разбора
+COMPILED_SUFFIX = ".arrow"
+COMPILED_FILES = {"rooms": "rooms" + COMPILED_SUFFIX, "students": "students" + COMPILED_SUFFIX}
+
+COMPILED_ROOMS_SCHEMA = pa.schema([
+    pa.field("id", pa.int32(), nullable=False),
+    pa.field("name", pa.string(), nullable=False),
+])
+
+# Дата рождения — номер дня от 1970-01-01 (date32), пол — однобайтовый код словаря SEX_DICTIONARY
+COMPILED_STUDENTS_SCHEMA = pa.schema([
+    pa.field("id", pa.int32(), nullable=False),
+    pa.field("name", pa.string(), nullable=False),
+    pa.field("birthday", pa.date32(), nullable=False),
+    pa.field("sex", pa.dictionary(pa.int8(), pa.string()), nullable=False),
+    pa.field("room_id", pa.int32(), nullable=False),
+])
+
+# Двоичный формат COPY: заголовок, кортежи (число полей, затем длина и значение каждого поля)
+# и признак конца -1. Порядок полей задаёт список столбцов команды COPY; имя идёт последним,
+# чтобы поля фиксированной ширины занимали одинаковые смещения в каждом кортеже
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + bytes(8)
+PGCOPY_TRAILER = b"\xff\xff"
+BINARY_COPY_COLUMNS = "(id, room_id, birthday, sex, name)"
+
+# Даты в двоичном формате PostgreSQL отсчитываются от 2000-01-01
+POSTGRES_EPOCH_DAYS = (date(2000, 1, 1) - date(1970, 1, 1)).days
+
+_TUPLE_PREFIX = np.dtype([
+    ("field_count", ">i2"),
+    ("id_size", ">i4"), ("id", ">i4"),
+    ("room_id_size", ">i4"), ("room_id", ">i4"),
+    ("birthday_size", ">i4"), ("birthday", ">i4"),
+    ("sex_size", ">i4"), ("sex", "S1"),
+    ("name_size", ">i4"),
+])
+
+
+def is_compiled(file_path: str) -> bool:
+    """
+    Проверяет, является ли файл скомпилированным (по расширению).
+
+    Args:
+        file_path (str): Путь к файлу комнат или студентов.
+
+    Returns:
+        bool: True для скомпилированного файла, False для JSON.
+    """
+    return file_path.endswith(COMPILED_SUFFIX)
+
+
+def iter_compiled_batches(file_path: str, schema: pa.Schema) -> Iterator[pa.RecordBatch]:
+    """
+    Читает пакеты скомпилированного файла. Файл отображается в память, и столбцы пакетов
+    ссылаются прямо на его страницы.
+
+    Args:
+        file_path (str): Путь к скомпилированному файлу.
+        schema (pa.Schema): Ожидаемая схема файла.
+
+    Yields:
+        pa.RecordBatch: Очередной пакет файла.
+
+    Raises:
+        ValueError: Если схема файла отличается от ожидаемой.
+    """
+    with pa.memory_map(file_path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        if not reader.schema.equals(schema):
+            raise ValueError(f"{file_path} is not a compiled file with schema {schema.names}")
+        for index in range(reader.num_record_batches):
+            yield reader.get_batch(index)
+
+
+def iter_room_records(rooms_file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Читает комнаты из JSON-файла или из скомпилированного файла.
+
+    Args:
+        rooms_file_path (str): Путь к файлу с данными о комнатах.
+
+    Yields:
+        Dict[str, Any]: Комната в виде {"id": ..., "name": ...}.
+    """
+    if not is_compiled(rooms_file_path):
+        yield from iter_json_records(rooms_file_path)
+        return
+    for batch in iter_compiled_batches(rooms_file_path, COMPILED_ROOMS_SCHEMA):
+        yield from batch.to_pylist()
+
+
+def compiled_students_batch(rows: List[Tuple]) -> pa.RecordBatch:
+    """
+    Преобразует проверенные строки студентов в пакет скомпилированного файла.
+
+    Args:
+        rows (List[Tuple]): Строки (id, name, birthday, sex, room_id), см. validate_students.
+
+    Returns:
+        pa.RecordBatch: Пакет со схемой COMPILED_STUDENTS_SCHEMA.
+    """
+    ids, names, birthdays, sexes, room_ids = zip(*rows)
+    return pa.RecordBatch.from_arrays([
+        pa.array(ids, pa.int32()),
+        pa.array(names, pa.string()),
+        pa.array(birthdays, pa.date32()),
+        pa.DictionaryArray.from_arrays(pa.array([SEX_CODES[sex] for sex in sexes], pa.int8()), SEX_DICTIONARY),
+        pa.array(room_ids, pa.int32()),
+    ], schema=COMPILED_STUDENTS_SCHEMA)
+
+
+def students_copy_data(batch: pa.RecordBatch) -> bytes:
+    """
+    Кодирует пакет скомпилированного файла в кортежи двоичного формата COPY.
+
+    Кодирование векторное: поля фиксированной ширины записываются структурным массивом NumPy,
+    а имена копируются из кучи строк пакета одной операцией.
+
+    Args:
+        batch (pa.RecordBatch): Пакет со схемой COMPILED_STUDENTS_SCHEMA.
+
+    Returns:
+        bytes: Кортежи для столбцов BINARY_COPY_COLUMNS без заголовка и признака конца.
+    """
+    names = batch.column(1)
+    sexes = batch.column(3)
+    offsets = np.frombuffer(names.buffers()[1], dtype=np.int32)[names.offset:names.offset + batch.num_rows + 1]
+    heap_buffer = names.buffers()[2]
+    heap = np.frombuffer(heap_buffer, dtype=np.uint8)[offsets[0]:offsets[-1]] if heap_buffer else np.empty(0, np.uint8)
+    name_sizes = np.diff(offsets)
+
+    prefixes = np.empty(batch.num_rows, dtype=_TUPLE_PREFIX)
+    prefixes["field_count"] = 5
+    prefixes["id_size"] = prefixes["room_id_size"] = prefixes["birthday_size"] = 4
+    prefixes["sex_size"] = 1
+    prefixes["id"] = batch.column(0).to_numpy()
+    prefixes["room_id"] = batch.column(4).to_numpy()
+    prefixes["birthday"] = batch.column(2).view(pa.int32()).to_numpy() - POSTGRES_EPOCH_DAYS
+    prefixes["sex"] = np.array(sexes.dictionary.to_pylist(), dtype="S1")[sexes.indices.to_numpy()]
+    prefixes["name_size"] = name_sizes
+
+    prefix_size = _TUPLE_PREFIX.itemsize
+    starts = np.zeros(batch.num_rows, dtype=np.int64)
+    np.cumsum(name_sizes[:-1] + prefix_size, out=starts[1:])
+    data = np.empty(batch.num_rows * prefix_size + len(heap), dtype=np.uint8)
+    data[(starts[:, None] + np.arange(prefix_size)).ravel()] = prefixes.view(np.uint8)
+    data[np.arange(len(heap)) + np.repeat(starts + prefix_size - (offsets[:-1] - offsets[0]), name_sizes)] = heap
+    return data.tobytes()
+
+
+class DataCompiler:
+    """
+    Компилирует JSON-файлы комнат и студентов в компактные столбцовые файлы для повторных загрузок.
+
+    Студенты проверяются так же, как при загрузке (validate_students, комнаты — из файла комнат),
+    и записываются столбцами: id и room_id (int32), дата рождения в днях от 1970-01-01 (int32),
+    пол (однобайтовый код) и имена в общей куче строк. DataLoader отображает такие файлы в память
+    и передаёт их в базу данных двоичным COPY, не разбирая JSON и даты.
+
+    Args:
+        batch_size (int): Количество студентов в одном пакете файла.
+        rejects_file (str): Файл JSON Lines для отклонённых записей о студентах.
+
+    Attributes:
+        rejected_count (int): Количество отклонённых записей о студентах.
+
+    Methods:
+        compile_rooms(rooms_file_path: str, output_file: str) -> Collection[int]:
+            Компилирует файл комнат и возвращает идентификаторы комнат.
+
+        compile_students(students_file_path: str, output_file: str, room_ids: Collection[int]) -> int:
+            Компилирует файл студентов и возвращает количество записанных студентов.
+
+        compile_data(rooms_file_path: str, students_file_path: str, output_dir: str = '.') -> Dict[str, str]:
+            Компилирует оба файла в output_dir.
+    """
+
+    def __init__(self, batch_size: int = LOAD_BATCH_SIZE, rejects_file: str = LOAD_REJECTS_FILE):
+        """
+        Инициализирует экземпляр класса DataCompiler.
+
+        Args:
+            batch_size (int): Количество студентов в одном пакете файла.
+            rejects_file (str): Файл JSON Lines для отклонённых записей о студентах.
+        """
+        self.batch_size = batch_size
+        self.rejects_file = rejects_file
+        self.rejected_count = 0
+
+    @staticmethod
+    def _write_batches(output_file: str, schema: pa.Schema, batches: Iterator[pa.RecordBatch]) -> int:
+        """
+        Записывает пакеты во временный файл и заменяет им output_file.
+
+        Returns:
+            int: Количество записанных строк.
+        """
+        rows = 0
+        temp_file = output_file + ".tmp"
+        with pa.OSFile(temp_file, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+            for batch in batches:
+                with METRICS.timer("compile.write"):
+                    writer.write_batch(batch)
+                rows += batch.num_rows
+        os.replace(temp_file, output_file)
+        return rows
+
+    def compile_rooms(self, rooms_file_path: str, output_file: str) -> Collection[int]:
+        """
+        Компилирует JSON-файл комнат.
+
+        Args:
+            rooms_file_path (str): Путь к JSON-файлу с данными о комнатах.
+            output_file (str): Путь к скомпилированному файлу.
+
+        Returns:
+            Collection[int]: Идентификаторы комнат файла.
+        """
+        room_ids = set()
+
+        def batches() -> Iterator[pa.RecordBatch]:
+            for rooms in METRICS.timed("load.parse", batched(iter_json_records(rooms_file_path), self.batch_size)):
+                ids = [room['id'] for room in rooms]
+                room_ids.update(ids)
+                yield pa.RecordBatch.from_arrays([pa.array(ids, pa.int32()),
+                                                  pa.array([room['name'] for room in rooms], pa.string())],
+                                                 schema=COMPILED_ROOMS_SCHEMA)
+
+        rows = self._write_batches(output_file, COMPILED_ROOMS_SCHEMA, batches())
+        logger.info(f"Compiled {rows} rooms to {output_file}")
+        return room_ids
+
+    def compile_students(self, students_file_path: str, output_file: str, room_ids: Collection[int]) -> int:
+        """
+        Проверяет и компилирует JSON-файл студентов. Отклонённые записи дописываются в rejects_file.
+
+        Args:
+            students_file_path (str): Путь к JSON-файлу с данными о студентах.
+            output_file (str): Путь к скомпилированному файлу.
+            room_ids (Collection[int]): Идентификаторы существующих комнат.
+
+        Returns:
+            int: Количество записанных студентов.
+        """
+        def batches() -> Iterator[pa.RecordBatch]:
+            for students in METRICS.timed("load.parse", batched(iter_json_records(students_file_path),
+                                                                self.batch_size)):
+                with METRICS.timer("load.transform"):
+                    rows, rejected = validate_students(students, room_ids)
+                    batch = compiled_students_batch(rows) if rows else None
+                if rejected:
+                    with open(self.rejects_file, 'a') as file:
+                        write_rejected(file, rejected)
+                    self.rejected_count += len(rejected)
+                    METRICS.count("load.rows_rejected", len(rejected))
+                if batch is not None:
+                    yield batch
+
+        rows = self._write_batches(output_file, COMPILED_STUDENTS_SCHEMA, batches())
+        if self.rejected_count:
+            logger.warning(f"Rejected {self.rejected_count} students, see {self.rejects_file}")
+        logger.info(f"Compiled {rows} students to {output_file}")
+        return rows
+
+    def compile_data(self, rooms_file_path: str, students_file_path: str, output_dir: str = '.') -> Dict[str, str]:
+        """
+        Компилирует файлы комнат и студентов в output_dir (rooms.arrow и students.arrow).
+
+        Args:
+            rooms_file_path (str): Путь к JSON-файлу с данными о комнатах.
+            students_file_path (str): Путь к JSON-файлу с данными о студентах.
+            output_dir (str): Каталог для скомпилированных файлов.
+
+        Returns:
+            Dict[str, str]: Пути к скомпилированным файлам по видам данных.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        files = {kind: os.path.join(output_dir, file_name) for kind, file_name in COMPILED_FILES.items()}
+        room_ids = self.compile_rooms(rooms_file_path, files["rooms"])
+        self.compile_students(students_file_path, files["students"], room_ids)
+        return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile rooms and students JSON files into compact binary "
+                                                 "columnar files for repeated loads with data_loader.py.")
+    parser.add_argument("rooms_file", help="Path to the rooms JSON file")
+    parser.add_argument("students_file", help="Path to the students JSON file")
+    parser.add_argument("--output-dir", default=".", help="Directory for rooms.arrow and students.arrow.")
+    parser.add_argument("--batch-size", type=int, default=LOAD_BATCH_SIZE,
+                        help="Number of students per record batch of the compiled file.")
+    parser.add_argument("--rejects-file", default=LOAD_REJECTS_FILE,
+                        help="JSON Lines file that receives students rejected by validation")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    compiler = DataCompiler(args.batch_size, args.rejects_file)
+    with instrumented(args):
+        compiler.compile_data(args.rooms_file, args.students_file, args.output_dir)
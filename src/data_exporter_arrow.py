@@ -0,0 +1,263 @@
+import argparse
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER, SNAPSHOT_BATCH_SIZE
+from database_manager import DatabaseManager
+from json_stream import batched
+from metrics import METRICS, add_metrics_arguments, instrumented
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Расширения файлов снимка по форматам
+SNAPSHOT_FORMATS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+# Пол хранится как словарный (категориальный) столбец с постоянным словарём,
+# одинаковым во всех пакетах файла
+SEX_DICTIONARY = pa.array(["F", "M"], pa.string())
+SEX_CODES = {sex: code for code, sex in enumerate(SEX_DICTIONARY.to_pylist())}
+
+STUDENTS_SCHEMA = pa.schema([
+    pa.field("id", pa.int32(), nullable=False),
+    pa.field("name", pa.string()),
+    pa.field("birthday", pa.date32()),
+    pa.field("sex", pa.dictionary(pa.int8(), pa.string())),
+    pa.field("room_id", pa.int32()),
+    pa.field("room_name", pa.string()),
+])
+
+ROOMS_SCHEMA = pa.schema([
+    pa.field("id", pa.int32(), nullable=False),
+    pa.field("name", pa.string()),
+    pa.field("student_count", pa.int32(), nullable=False),
+    pa.field("birthday_min", pa.date32()),
+    pa.field("birthday_max", pa.date32()),
+    pa.field("birthday_sum", pa.int64()),
+    pa.field("male_count", pa.int32(), nullable=False),
+    pa.field("female_count", pa.int32(), nullable=False),
+])
+
+SNAPSHOT_STUDENTS_QUERY = """
+    SELECT students.id, students.name, students.birthday, students.sex, students.room_id, rooms.name AS room_name
+    FROM students
+    LEFT JOIN rooms ON rooms.id = students.room_id
+    ORDER BY students.id;
+"""
+
+# birthday_sum — сумма дат рождения в днях от 1970-01-01, как в room_stats
+SNAPSHOT_ROOMS_QUERY = """
+    SELECT rooms.id, rooms.name, COUNT(students.id) AS student_count,
+        MIN(students.birthday) AS birthday_min, MAX(students.birthday) AS birthday_max,
+        SUM(students.birthday - DATE '1970-01-01') AS birthday_sum,
+        COUNT(*) FILTER (WHERE students.sex = 'M') AS male_count,
+        COUNT(*) FILTER (WHERE students.sex = 'F') AS female_count
+    FROM rooms
+    LEFT JOIN students ON rooms.id = students.room_id
+    GROUP BY rooms.id, rooms.name
+    ORDER BY rooms.id;
+"""
+
+
+def students_batch(rows: List[Tuple]) -> pa.RecordBatch:
+    """
+    Преобразует строки запроса SNAPSHOT_STUDENTS_QUERY в пакет с типизированными столбцами.
+
+    Args:
+        rows (List[Tuple]): Строки (id, name, birthday, sex, room_id, room_name).
+
+    Returns:
+        pa.RecordBatch: Пакет со схемой STUDENTS_SCHEMA.
+    """
+    ids, names, birthdays, sexes, room_ids, room_names = zip(*rows)
+    sex_codes = pa.array([SEX_CODES.get(sex) for sex in sexes], pa.int8())
+    return pa.RecordBatch.from_arrays([
+        pa.array(ids, pa.int32()),
+        pa.array(names, pa.string()),
+        pa.array(birthdays, pa.date32()),
+        pa.DictionaryArray.from_arrays(sex_codes, SEX_DICTIONARY),
+        pa.array(room_ids, pa.int32()),
+        pa.array(room_names, pa.string()),
+    ], schema=STUDENTS_SCHEMA)
+
+
+def rooms_batch(rows: List[Tuple]) -> pa.RecordBatch:
+    """
+    Преобразует строки запроса SNAPSHOT_ROOMS_QUERY в пакет с типизированными столбцами.
+
+    Args:
+        rows (List[Tuple]): Строки показателей комнат.
+
+    Returns:
+        pa.RecordBatch: Пакет со схемой ROOMS_SCHEMA.
+    """
+    columns = zip(*rows)
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, field.type) for column, field in zip(columns, ROOMS_SCHEMA)],
+        schema=ROOMS_SCHEMA)
+
+
+def read_snapshot(snapshot_file: str) -> pa.Table:
+    """
+    Читает файл снимка. Файл Arrow IPC отображается в память, и столбцы таблицы ссылаются
+    прямо на страницы файла без копирования и разбора.
+
+    Args:
+        snapshot_file (str): Путь к файлу .arrow или .parquet.
+
+    Returns:
+        pa.Table: Таблица снимка.
+    """
+    if snapshot_file.endswith(SNAPSHOT_FORMATS["parquet"]):
+        return pq.read_table(snapshot_file, memory_map=True)
+    with pa.memory_map(snapshot_file, 'r') as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+class DataExporterArrow:
+    """
+    Класс для экспорта колоночного снимка данных в файлы Arrow IPC или Parquet.
+
+    Строки читаются серверным курсором и записываются пакетами по batch_size строк,
+    поэтому память не зависит от числа студентов. Столбцы типизированы: даты рождения
+    хранятся как date32, пол — словарным столбцом, идентификаторы — int32.
+
+    Args:
+        db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+        batch_size (int): Количество строк в одном пакете файла.
+
+    Methods:
+        export_students(output_file: str) -> int:
+            Экспортирует студентов вместе с названиями их комнат.
+
+        export_rooms(output_file: str) -> int:
+            Экспортирует показатели по комнатам.
+
+        export_snapshot(output_dir: str = '.', snapshot_format: str = "arrow") -> Dict[str, str]:
+            Экспортирует студентов и показатели по комнатам в файлы snapshot_<таблица>.<формат>.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, batch_size: int = SNAPSHOT_BATCH_SIZE):
+        """
+        Инициализирует экземпляр класса DataExporterArrow.
+
+        Args:
+            db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+            batch_size (int): Количество строк в одном пакете файла.
+        """
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+
+    def _write_batches(self, output_file: str, schema: pa.Schema, batches: Iterable[pa.RecordBatch]) -> int:
+        """
+        Записывает пакеты в файл Arrow IPC или Parquet в зависимости от расширения файла.
+
+        Args:
+            output_file (str): Путь к файлу с расширением .arrow или .parquet.
+            schema (pa.Schema): Схема файла.
+            batches (Iterable[pa.RecordBatch]): Пакеты строк.
+
+        Returns:
+            int: Количество записанных строк.
+
+        Raises:
+            ValueError: Если расширение файла не .arrow и не .parquet.
+        """
+        extension = os.path.splitext(output_file)[1]
+        if extension == SNAPSHOT_FORMATS["parquet"]:
+            writer = pq.ParquetWriter(output_file, schema)
+        elif extension == SNAPSHOT_FORMATS["arrow"]:
+            writer = pa.ipc.new_file(output_file, schema)
+        else:
+            raise ValueError(f"Unsupported snapshot file extension: {output_file}")
+
+        written = 0
+        with writer:
+            for batch in batches:
+                with METRICS.timer("export.file_write"):
+                    writer.write_batch(batch)
+                written += batch.num_rows
+        METRICS.count("export.rows", written)
+        METRICS.count("export.bytes_written", os.path.getsize(output_file))
+        logger.info(f"Wrote {written} rows to file: {output_file}")
+        return written
+
+    def _stream_batches(self, query: str, to_batch: Any) -> Iterable[pa.RecordBatch]:
+        """
+        Выполняет запрос серверным курсором и возвращает строки пакетами Arrow.
+        """
+        rows_stream = self.db_manager.stream(query, itersize=self.batch_size)
+        for rows in METRICS.timed("export.fetch", batched(rows_stream, self.batch_size)):
+            with METRICS.timer("export.serialize"):
+                batch = to_batch(rows)
+            yield batch
+
+    def export_students(self, output_file: str) -> int:
+        """
+        Экспортирует студентов вместе с названиями их комнат.
+
+        Args:
+            output_file (str): Путь к файлу с расширением .arrow или .parquet.
+
+        Returns:
+            int: Количество экспортированных студентов.
+        """
+        logger.info(f"Exporting students snapshot to file: {output_file}")
+        return self._write_batches(output_file, STUDENTS_SCHEMA,
+                                   self._stream_batches(SNAPSHOT_STUDENTS_QUERY, students_batch))
+
+    def export_rooms(self, output_file: str) -> int:
+        """
+        Экспортирует количество студентов, минимальную, максимальную и суммарную дату рождения
+        и количество студентов каждого пола по каждой комнате.
+
+        Args:
+            output_file (str): Путь к файлу с расширением .arrow или .parquet.
+
+        Returns:
+            int: Количество экспортированных комнат.
+        """
+        logger.info(f"Exporting rooms snapshot to file: {output_file}")
+        return self._write_batches(output_file, ROOMS_SCHEMA,
+                                   self._stream_batches(SNAPSHOT_ROOMS_QUERY, rooms_batch))
+
+    def export_snapshot(self, output_dir: str = '.', snapshot_format: str = "arrow") -> Dict[str, str]:
+        """
+        Экспортирует студентов и показатели по комнатам в файлы snapshot_students и snapshot_rooms.
+
+        Args:
+            output_dir (str): Каталог для сохранения файлов.
+            snapshot_format (str): Формат файлов: arrow или parquet.
+
+        Returns:
+            Dict[str, str]: Пути к файлам снимка: students и rooms.
+        """
+        extension = SNAPSHOT_FORMATS[snapshot_format]
+        output_files = {
+            "students": os.path.join(output_dir, f"snapshot_students{extension}"),
+            "rooms": os.path.join(output_dir, f"snapshot_rooms{extension}"),
+        }
+        self.export_students(output_files["students"])
+        self.export_rooms(output_files["rooms"])
+        return output_files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a columnar snapshot of students and rooms.")
+    parser.add_argument("--output-dir", default=".", help="Directory for the snapshot files.")
+    parser.add_argument("--format", choices=SNAPSHOT_FORMATS, default="arrow", help="Snapshot file format.")
+    parser.add_argument("--batch-size", type=int, default=SNAPSHOT_BATCH_SIZE, help="Rows per record batch.")
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
+    exporter = DataExporterArrow(db_manager, args.batch_size)
+    with instrumented(args):
+        exporter.export_snapshot(args.output_dir, args.format)
+
+    logger.info(f"Connection pool usage: {db_manager.pool_stats()}")
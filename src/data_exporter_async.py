@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import logging
+import os
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from config import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER, QUERY_CACHE_DIR, TOP_ROOMS_LIMIT
+from database_manager import DatabaseManager
+from export_engine import RECORD_WRITERS, write_records
+from metrics import METRICS, add_metrics_arguments, instrumented
+from query_cache import QueryCache
+from room_reports import REPORT_FIELDS, REPORT_QUERIES, ROOM_STATS_REPORT_QUERIES, report_params
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("json", "xml")
+ASYNC_POOL_SIZE = len(REPORT_QUERIES)
+
+
+async def wait_connection(conn: psycopg2.extensions.connection) -> None:
+    """
+    Дожидается завершения операции асинхронного соединения psycopg2, не блокируя цикл событий.
+
+    Args:
+        conn (psycopg2.extensions.connection): Соединение, открытое с async_=True.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        state = conn.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            return
+        ready = loop.create_future()
+        if state == psycopg2.extensions.POLL_READ:
+            loop.add_reader(conn.fileno(), ready.set_result, None)
+            try:
+                await ready
+            finally:
+                loop.remove_reader(conn.fileno())
+        elif state == psycopg2.extensions.POLL_WRITE:
+            loop.add_writer(conn.fileno(), ready.set_result, None)
+            try:
+                await ready
+            finally:
+                loop.remove_writer(conn.fileno())
+        else:
+            raise psycopg2.OperationalError(f"unexpected poll state {state}")
+
+
+class AsyncDataExporter:
+    """
+    Асинхронный экспорт отчётов по комнатам в JSON и XML.
+
+    Запросы отчётов выполняются одновременно через небольшой пул асинхронных соединений
+    psycopg2, а файлы записываются в потоках, не блокируя цикл событий. Поэтому время
+    экспорта всех отчётов близко ко времени самого медленного запроса, а не к их сумме.
+
+    Args:
+        db_manager (DatabaseManager): Менеджер базы данных, параметры подключения которого используются.
+        pool_size (int): Максимальное количество одновременно открытых соединений.
+        compact (bool): Записывать файлы без отступов.
+        use_room_stats (bool): Читать отчёты из сводной таблицы room_stats вместо агрегации students.
+        cache (Optional[QueryCache]): Кеш результатов запросов.
+        as_of (Optional[date]): Дата, на которую вычисляется возраст; по умолчанию текущая.
+        top (int): Количество комнат в отчётах о самом маленьком среднем возрасте и самой большой разнице в возрасте.
+        building (Optional[int]): Номер корпуса, которым ограничены отчёты; None означает все комнаты.
+
+    Methods:
+        export_rooms_with_student_count(output_file: str) -> None:
+            Экспортирует данные о комнатах с количеством студентов в файл JSON или XML.
+
+        export_rooms_with_average_age(output_file: str) -> None:
+            Экспортирует данные о комнатах с средним возрастом студентов в файл JSON или XML.
+
+        export_rooms_with_age_difference(output_file: str) -> None:
+            Экспортирует данные о комнатах с разницей возраста студентов в файл JSON или XML.
+
+        export_rooms_with_multiple_sex(output_file: str) -> None:
+            Экспортирует данные о комнатах с разными полами студентов в файл JSON или XML.
+
+        export_all(output_dir: str = '.', formats: Sequence[str] = EXPORT_FORMATS) -> None:
+            Экспортирует все четыре отчёта во всех форматах одновременно.
+
+        close() -> None:
+            Закрывает соединения пула.
+
+    Usage:
+        async with AsyncDataExporter(db_manager) as exporter:
+            await exporter.export_all(output_dir)
+    """
+
+    def __init__(self, db_manager: DatabaseManager, pool_size: int = ASYNC_POOL_SIZE,
+                 compact: bool = False, use_room_stats: bool = False, cache: Optional[QueryCache] = None,
+                 as_of: Optional[date] = None, top: int = TOP_ROOMS_LIMIT, building: Optional[int] = None):
+        """
+        Инициализирует экземпляр класса AsyncDataExporter.
+
+        Args:
+            db_manager (DatabaseManager): Менеджер базы данных, параметры подключения которого используются.
+            pool_size (int): Максимальное количество одновременно открытых соединений.
+            compact (bool): Записывать файлы без отступов.
+            use_room_stats (bool): Читать отчёты из сводной таблицы room_stats вместо агрегации students.
+            cache (Optional[QueryCache]): Кеш результатов запросов.
+            as_of (Optional[date]): Дата, на которую вычисляется возраст; по умолчанию текущая.
+            top (int): Количество комнат в отчётах о возрасте.
+            building (Optional[int]): Номер корпуса; None означает все комнаты.
+        """
+        self.db_manager = db_manager
+        self.pool_size = pool_size
+        self.compact = compact
+        self.use_room_stats = use_room_stats
+        self.cache = cache
+        self.params = report_params(as_of or date.today(), top, building)
+        self._idle: List[psycopg2.extensions.connection] = []
+        self._opened = 0
+        self._available = asyncio.Condition()
+
+    async def __aenter__(self) -> 'AsyncDataExporter':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _acquire(self) -> psycopg2.extensions.connection:
+        """
+        Выдаёт свободное соединение, открывая новое, пока их меньше pool_size.
+        """
+        async with self._available:
+            await self._available.wait_for(lambda: self._idle or self._opened < self.pool_size)
+            if self._idle:
+                return self._idle.pop()
+            self._opened += 1
+
+        try:
+            conn = psycopg2.connect(dbname=self.db_manager.dbname, user=self.db_manager.user,
+                                    password=self.db_manager.password, host=self.db_manager.host,
+                                    port=self.db_manager.port, async_=True)
+            await wait_connection(conn)
+        except BaseException:
+            async with self._available:
+                self._opened -= 1
+                self._available.notify()
+            raise
+        return conn
+
+    async def _release(self, conn: psycopg2.extensions.connection) -> None:
+        """
+        Возвращает соединение в пул; закрытое соединение освобождает место для нового.
+        """
+        async with self._available:
+            if conn.closed:
+                self._opened -= 1
+            else:
+                self._idle.append(conn)
+            self._available.notify()
+
+    async def close(self) -> None:
+        """
+        Закрывает соединения пула.
+        """
+        async with self._available:
+            while self._idle:
+                self._idle.pop().close()
+                self._opened -= 1
+
+    async def _fetch_report(self, report_name: str) -> List[Tuple]:
+        """
+        Возвращает строки отчёта из кеша или выполняет его запрос в свободном соединении пула.
+
+        Args:
+            report_name (str): Имя отчёта в REPORT_QUERIES или ROOM_STATS_REPORT_QUERIES.
+
+        Returns:
+            List[Tuple]: Строки результата.
+        """
+        queries = ROOM_STATS_REPORT_QUERIES if self.use_room_stats else REPORT_QUERIES
+        query = queries[report_name]
+        if self.cache is None:
+            return await self._query(query, self.params)
+
+        version = self.cache.data_version()
+        rows = self.cache.get(query, self.params, version)
+        if rows is None:
+            rows = await self._query(query, self.params)
+            self.cache.put(query, self.params, rows, version)
+        return rows
+
+    async def _query(self, query: str, params: Optional[Dict[str, Any]] = None) -> List[Tuple]:
+        """
+        Выполняет запрос с параметрами в свободном соединении пула.
+
+        Если запрос прерван ошибкой, отменой задачи или таймаутом, выполняющийся запрос
+        отменяется на сервере, а соединение закрывается и в пул не возвращается.
+        """
+        conn = await self._acquire()
+        try:
+            cursor = conn.cursor()
+            try:
+                with METRICS.timer("export.query"):
+                    cursor.execute(query, params)
+                    await wait_connection(conn)
+                with METRICS.timer("export.fetch"):
+                    return cursor.fetchall()
+            finally:
+                cursor.close()
+        except BaseException:
+            try:
+                if conn.isexecuting():
+                    conn.cancel()
+            finally:
+                conn.close()
+            raise
+        finally:
+            await self._release(conn)
+
+    def _write_file(self, report_name: str, rows: List[Tuple], output_file: str) -> None:
+        """
+        Записывает строки отчёта в файл, формат которого определяется расширением файла.
+
+        Args:
+            report_name (str): Имя отчёта; для XML — имя корневого элемента.
+            rows (List[Tuple]): Строки результата запроса.
+            output_file (str): Путь к файлу с расширением одного из форматов RECORD_WRITERS.
+
+        Raises:
+            ValueError: Если формат файла не зарегистрирован в RECORD_WRITERS.
+        """
+        fields = REPORT_FIELDS[report_name]
+        rooms_data = (dict(zip(fields, room)) for room in rows)
+        export_format = os.path.splitext(output_file)[1].lstrip('.')
+        if export_format not in RECORD_WRITERS:
+            raise ValueError(f"Unsupported export file extension: {output_file}")
+
+        write_records(report_name, rooms_data, {export_format: output_file}, self.compact)
+        logger.info(f"Exported {report_name} to file: {output_file}")
+
+    async def _export_report(self, report_name: str, output_files: Sequence[str]) -> None:
+        """
+        Выполняет запрос отчёта и одновременно записывает результат во все переданные файлы.
+
+        Args:
+            report_name (str): Имя отчёта.
+            output_files (Sequence[str]): Пути к файлам форматов из RECORD_WRITERS.
+        """
+        rows = await self._fetch_report(report_name)
+        await asyncio.gather(*(
+            asyncio.to_thread(self._write_file, report_name, rows, output_file)
+            for output_file in output_files
+        ))
+
+    async def export_rooms_with_student_count(self, output_file: str) -> None:
+        """
+        Экспортирует данные о комнатах с количеством студентов в файл JSON или XML.
+
+        Args:
+            output_file (str): Путь к файлу с расширением .json или .xml.
+        """
+        await self._export_report("rooms_with_student_count", [output_file])
+
+    async def export_rooms_with_average_age(self, output_file: str) -> None:
+        """
+        Экспортирует данные о комнатах с средним возрастом студентов в файл JSON или XML.
+
+        Args:
+            output_file (str): Путь к файлу с расширением .json или .xml.
+        """
+        await self._export_report("rooms_with_average_age", [output_file])
+
+    async def export_rooms_with_age_difference(self, output_file: str) -> None:
+        """
+        Экспортирует данные о комнатах с разницей возраста студентов в файл JSON или XML.
+
+        Args:
+            output_file (str): Путь к файлу с расширением .json или .xml.
+        """
+        await self._export_report("rooms_with_age_difference", [output_file])
+
+    async def export_rooms_with_multiple_sex(self, output_file: str) -> None:
+        """
+        Экспортирует данные о комнатах с разными полами студентов в файл JSON или XML.
+
+        Args:
+            output_file (str): Путь к файлу с расширением .json или .xml.
+        """
+        await self._export_report("rooms_with_multiple_sex", [output_file])
+
+    async def export_all(self, output_dir: str = '.', formats: Sequence[str] = EXPORT_FORMATS) -> None:
+        """
+        Экспортирует все четыре отчёта в файлы output_<отчёт>.<формат> одновременно.
+
+        Каждый запрос выполняется один раз, его результат записывается во все форматы.
+
+        Args:
+            output_dir (str): Каталог для сохранения файлов.
+            formats (Sequence[str]): Форматы файлов из RECORD_WRITERS.
+        """
+        logger.info(f"Exporting all room reports to directory: {output_dir}")
+        await asyncio.gather(*(
+            self._export_report(report_name, [
+                os.path.join(output_dir, f"output_{report_name}.{export_format}") for export_format in formats
+            ])
+            for report_name in REPORT_QUERIES
+        ))
+        logger.info("Data export completed.")
+
+
+async def main(args: argparse.Namespace) -> None:
+    """
+    Выполняет экспорт всех отчётов с параметрами командной строки.
+
+    Args:
+        args (argparse.Namespace): Разобранные аргументы командной строки.
+    """
+    db_manager = DatabaseManager(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
+    cache = QueryCache(args.cache_dir) if args.cache else None
+    async with AsyncDataExporter(db_manager, args.pool_size, args.compact, args.room_stats, cache,
+                                 args.as_of, args.top, args.building) as exporter:
+        await exporter.export_all(args.output_dir, args.format)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export all room reports to JSON and XML concurrently.")
+    parser.add_argument("--output-dir", default=".", help="Directory for the output files.")
+    parser.add_argument("--format", nargs="+", choices=RECORD_WRITERS, default=list(EXPORT_FORMATS),
+                        help="Output formats.")
+    parser.add_argument("--pool-size", type=int, default=ASYNC_POOL_SIZE,
+                        help="Maximum number of concurrent database connections.")
+    parser.add_argument("--room-stats", action="store_true",
+                        help="Read the four reports from the room_stats summary table maintained by the loader.")
+    parser.add_argument("--compact", action="store_true", help="Write files without indentation.")
+    parser.add_argument("--cache", action="store_true",
+                        help="Serve query results from the on-disk cache while the data has not been reloaded.")
+    parser.add_argument("--cache-dir", default=QUERY_CACHE_DIR, help="Directory of the query result cache.")
+    parser.add_argument("--as-of", type=date.fromisoformat,
+                        help="Date (YYYY-MM-DD) as of which ages are computed; today by default.")
+    parser.add_argument("--top", type=int, default=TOP_ROOMS_LIMIT,
+                        help="Number of rooms in the average age and age difference reports.")
+    parser.add_argument("--building", type=int,
+                        help="Export only the rooms of this building (ROOMS_PER_BUILDING consecutive room ids); "
+                             "on a partitioned schema only its students partition is scanned.")
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+    with instrumented(args):
+        asyncio.run(main(args))
@@ -1,9 +1,12 @@
 import argparse
 import logging
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+from datetime import date
+from typing import Any, Dict, List, Optional
 from database_manager import DatabaseManager
-from config import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+from config import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, EXPORT_ITERSIZE, TOP_ROOMS_LIMIT
+from export_engine import ExportEngine, add_export_arguments
+from metrics import instrumented
+from query_cache import QueryCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -11,46 +14,65 @@ logger = logging.getLogger(__name__)
 
 class DataExporterXml:
     """
-       Класс для экспорта данных из базы данных в формат XML.
-
-       Args:
-           db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
-
-       Methods:
-           export_rooms_with_student_count(output_file: str) -> None:
-               Экспортирует данные о комнатах с количеством студентов в файл XML.
-
-           export_rooms_with_average_age(output_file: str) -> None:
-               Экспортирует данные о комнатах с средним возрастом студентов в файл XML.
-
-           export_rooms_with_age_difference(output_file: str) -> None:
-               Экспортирует данные о комнатах с разницей возраста студентов в файл XML.
+    Класс для экспорта данных из базы данных в формат XML.
+
+    Запросы и чтение строк выполняет общий движок ExportEngine, этот класс задаёт формат XML.
+    Элементы room записываются в файл по мере получения строк, без построения документа
+    в памяти. В потоковом режиме списки комнат читаются серверным курсором порциями
+    по itersize строк.
+
+    Args:
+        db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+        stream (bool): Читать списки комнат серверным курсором.
+        itersize (int): Количество строк, получаемых серверным курсором за один запрос.
+        compact (bool): Записывать XML без отступов и переводов строк.
+        use_room_stats (bool): Читать отчёты из сводной таблицы room_stats вместо агрегации students.
+        cache (Optional[QueryCache]): Кеш результатов запросов; с ним повторный экспорт без изменения
+            данных не обращается к базе данных, а списки комнат читаются целиком и при stream.
+        as_of (Optional[date]): Дата, на которую вычисляется возраст; по умолчанию текущая.
+        top (int): Количество комнат в отчётах о самом маленьком среднем возрасте и самой большой разнице в возрасте.
+        building (Optional[int]): Номер корпуса, которым ограничены отчёты; None означает все комнаты.
+        workers (int): Количество соединений, в которых export_all параллельно агрегирует комнаты по корпусам.
+
+    Methods:
+        export_rooms_with_student_count(output_file: str) -> None:
+            Экспортирует данные о комнатах с количеством студентов в файл XML.
+
+        export_rooms_with_average_age(output_file: str) -> None:
+            Экспортирует данные о комнатах с средним возрастом студентов в файл XML.
+
+        export_rooms_with_age_difference(output_file: str) -> None:
+            Экспортирует данные о комнатах с разницей возраста студентов в файл XML.
+
+        export_rooms_with_multiple_sex(output_file: str) -> None:
+            Экспортирует данные о комнатах с разными полами студентов в файл XML.
+
+        export_all(output_dir: str = '.', reports: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> None:
+            Экспортирует все четыре отчёта, вычисленные за один запрос к базе данных.
+    """
 
-           export_rooms_with_multiple_sex(output_file: str) -> None:
-               Экспортирует данные о комнатах с разными полами студентов в файл XML.
-       """
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, stream: bool = False,
+                 itersize: int = EXPORT_ITERSIZE, compact: bool = False, use_room_stats: bool = False,
+                 cache: Optional[QueryCache] = None, as_of: Optional[date] = None, top: int = TOP_ROOMS_LIMIT,
+                 building: Optional[int] = None, workers: int = 1):
         """
         Инициализирует экземпляр класса DataExporterXml.
 
         Args:
             db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+            stream (bool): Читать списки комнат серверным курсором.
+            itersize (int): Количество строк, получаемых серверным курсором за один запрос.
+            compact (bool): Записывать XML без отступов и переводов строк.
+            use_room_stats (bool): Читать отчёты из сводной таблицы room_stats вместо агрегации students.
+            cache (Optional[QueryCache]): Кеш результатов запросов.
+            as_of (Optional[date]): Дата, на которую вычисляется возраст; по умолчанию текущая.
+            top (int): Количество комнат в отчётах о возрасте.
+            building (Optional[int]): Номер корпуса; None означает все комнаты.
+            workers (int): Количество соединений для параллельной агрегации в export_all.
         """
         self.db_manager = db_manager
-
-    def prettify(self, elem):
-        """
-        Возвращает красиво отформатированную XML-строку для элемента.
-
-        Args:
-            elem: Элемент XML.
-
-        Returns:
-            str: Красиво отформатированная XML-строка.
-        """
-        rough_string = ET.tostring(elem, 'utf-8')
-        reparsed = minidom.parseString(rough_string)
-        return reparsed.toprettyxml(indent="    ")
+        self.engine = ExportEngine(db_manager, stream, itersize, compact, use_room_stats, cache, as_of, top,
+                                   building, workers)
 
     def export_rooms_with_student_count(self, output_file: str) -> None:
         """
@@ -60,155 +82,84 @@ class DataExporterXml:
             output_file (str): Путь к файлу для сохранения данных.
         """
         logger.info(f"Exporting rooms with student count to file: {output_file}")
-        with self.db_manager as db:
-            with db.conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT rooms.id, rooms.name, COUNT(students.id) AS student_count
-                    FROM rooms
-                    LEFT JOIN students ON rooms.id = students.room_id
-                    GROUP BY rooms.id, rooms.name
-                    ORDER BY rooms.id;
-                """)
-                rooms_data = cursor.fetchall()
-
-        root = ET.Element("rooms_with_student_count")
-        for room in rooms_data:
-            room_element = ET.SubElement(root, "room")
-            id_element = ET.SubElement(room_element, "id")
-            id_element.text = str(room[0])
-            name_element = ET.SubElement(room_element, "name")
-            name_element.text = room[1]
-            student_count_element = ET.SubElement(room_element, "student_count")
-            student_count_element.text = str(room[2])
-
-        with open(output_file, 'w') as file:
-            file.write(self.prettify(root))
-            logger.info("Data export completed.")
+        self.engine.export_report("rooms_with_student_count", {"xml": output_file})
 
     def export_rooms_with_average_age(self, output_file: str) -> None:
         """
-        Экспортирует данные о комнатах со средним возрастом студентов в файл XML.
+        Экспортирует данные о комнатах с средним возрастом студентов в файл XML.
+
         Args:
             output_file (str): Путь к файлу для сохранения данных.
         """
         logger.info(f"Exporting rooms with average age to file: {output_file}")
-        with self.db_manager as db:
-            with db.conn.cursor() as cursor:
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_students_birthday ON students(birthday);
-                    SELECT rooms.id, rooms.name, AVG(EXTRACT(YEAR FROM AGE(NOW(), students.birthday))) AS average_age
-                    FROM rooms
-                    LEFT JOIN students ON rooms.id = students.room_id
-                    GROUP BY rooms.id, rooms.name
-                    ORDER BY average_age ASC
-                    LIMIT 5;
-                """)
-                rooms_data = cursor.fetchall()
-        root = ET.Element("rooms_with_average_age")
-        for room in rooms_data:
-            room_element = ET.SubElement(root, "room")
-            id_element = ET.SubElement(room_element, "id")
-            id_element.text = str(room[0])
-            name_element = ET.SubElement(room_element, "name")
-            name_element.text = room[1]
-            average_age_element = ET.SubElement(room_element, "average_age")
-            average_age_element.text = str(room[2])
-        with open(output_file, 'w') as file:
-            file.write(self.prettify(root))
-            logger.info("Data export completed.")
+        self.engine.export_report("rooms_with_average_age", {"xml": output_file})
 
     def export_rooms_with_age_difference(self, output_file: str) -> None:
         """
-        Экспортирует данные о комнатах с разницей в возрасте студентов в файл XML.
+        Экспортирует данные о комнатах с разницей возраста студентов в файл XML.
 
         Args:
             output_file (str): Путь к файлу для сохранения данных.
         """
         logger.info(f"Exporting rooms with age difference to file: {output_file}")
-        with self.db_manager as db:
-            with db.conn.cursor() as cursor:
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_students_birthday ON students(birthday);
-                    SELECT rooms.id, rooms.name, 
-                        MAX(EXTRACT(YEAR FROM AGE(NOW(), students.birthday))) -
-                        MIN(EXTRACT(YEAR FROM AGE(NOW(), students.birthday))) AS age_difference
-                    FROM rooms
-                    LEFT JOIN students ON rooms.id = students.room_id
-                    GROUP BY rooms.id, rooms.name
-                    ORDER BY age_difference DESC
-                    LIMIT 5;
-                """)
-                rooms_data = cursor.fetchall()
-
-        root = ET.Element("rooms_with_age_difference")
-        for room in rooms_data:
-            room_element = ET.SubElement(root, "room")
-            id_element = ET.SubElement(room_element, "id")
-            id_element.text = str(room[0])
-            name_element = ET.SubElement(room_element, "name")
-            name_element.text = room[1]
-            age_difference_element = ET.SubElement(room_element, "age_difference")
-            age_difference_element.text = str(room[2])
-
-        with open(output_file, 'w') as file:
-            file.write(self.prettify(root))
-            logger.info("Data export completed.")
-
+        self.engine.export_report("rooms_with_age_difference", {"xml": output_file})
 
     def export_rooms_with_multiple_sex(self, output_file: str) -> None:
         """
-        Экспортирует данные о комнатах с несколькими полами студентов в файл XML.
+        Экспортирует данные о комнатах с разными полами студентов в файл XML.
+
         Args:
             output_file (str): Путь к файлу для сохранения данных.
         """
         logger.info(f"Exporting rooms with multiple sexes to file: {output_file}")
-        with self.db_manager as db:
-            with db.conn.cursor() as cursor:
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_students_sex ON students(sex);
-                    SELECT rooms.id, rooms.name
-                    FROM rooms
-                    INNER JOIN students ON rooms.id = students.room_id
-                    GROUP BY rooms.id, rooms.name
-                    HAVING COUNT(DISTINCT students.sex) > 1;
-                """)
-                rooms_data = cursor.fetchall()
-        root = ET.Element("rooms_with_multiple_sex")
-        for room in rooms_data:
-            room_element = ET.SubElement(root, "room")
-            id_element = ET.SubElement(room_element, "id")
-            id_element.text = str(room[0])
-            name_element = ET.SubElement(room_element, "name")
-            name_element.text = room[1]
-        with open(output_file, 'w') as file:
-            file.write(self.prettify(root))
-            logger.info("Data export completed.")
+        self.engine.export_report("rooms_with_multiple_sex", {"xml": output_file})
+
+    def export_all(self, output_dir: str = '.', reports: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> None:
+        """
+        Экспортирует все четыре отчёта в файлы output_<отчёт>.xml.
+
+        Отчёты строятся из одного агрегирующего запроса по комнатам вместо четырёх отдельных.
+
+        Args:
+            output_dir (str): Каталог для сохранения файлов.
+            reports (Optional[Dict[str, List[Dict[str, Any]]]]): Уже вычисленные отчёты
+                (см. room_reports.derive_reports), например общие с экспортом в JSON.
+        """
+        logger.info(f"Exporting all room reports to directory: {output_dir}")
+        self.engine.export_all(output_dir, ("xml",), reports)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Export data to XML files.")
-    parser.add_argument("--export_rooms_with_student_count", action="store_true", help="Export rooms with student count.")
-    parser.add_argument("--export_rooms_with_average_age", action="store_true", help="Export rooms with average age.")
-    parser.add_argument("--export_rooms_with_age_difference", action="store_true", help="Export rooms with age difference.")
-    parser.add_argument("--export_rooms_with_multiple_sex", action="store_true", help="Export rooms with multiple sexes.")
+    add_export_arguments(parser)
 
     args = parser.parse_args()
 
     db_manager = DatabaseManager(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
-    exporter = DataExporterXml(db_manager)
+    cache = QueryCache(args.cache_dir) if args.cache else None
+    exporter = DataExporterXml(db_manager, args.stream, args.itersize, args.compact, args.room_stats, cache,
+                               args.as_of, args.top, args.building, args.workers)
+
+    with instrumented(args):
+        if args.all:
+            exporter.export_all()
+
+        if args.export_rooms_with_student_count:
+            output_file = "output_rooms_with_student_count.xml"
+            exporter.export_rooms_with_student_count(output_file)
 
-    if args.export_rooms_with_student_count:
-        output_file = "output_rooms_with_student_count.xml"
-        exporter.export_rooms_with_student_count(output_file)
+        if args.export_rooms_with_average_age:
+            output_file = "output_rooms_with_average_age.xml"
+            exporter.export_rooms_with_average_age(output_file)
 
-    if args.export_rooms_with_average_age:
-        output_file = "output_rooms_with_average_age.xml"
-        exporter.export_rooms_with_average_age(output_file)
+        if args.export_rooms_with_age_difference:
+            output_file = "output_rooms_with_age_difference.xml"
+            exporter.export_rooms_with_age_difference(output_file)
 
-    if args.export_rooms_with_age_difference:
-        output_file = "output_rooms_with_age_difference.xml"
-        exporter.export_rooms_with_age_difference(output_file)
+        if args.export_rooms_with_multiple_sex:
+            output_file = "output_rooms_with_multiple_sex.xml"
+            exporter.export_rooms_with_multiple_sex(output_file)
 
-    if args.export_rooms_with_multiple_sex:
-        output_file = "output_rooms_with_multiple_sex.xml"
-        exporter.export_rooms_with_multiple_sex(output_file)
\ No newline at end of file
+    logger.info(f"Connection pool usage: {db_manager.pool_stats()}")
+    if cache is not None:
+        logger.info(f"Query cache: {cache.hits} hits, {cache.misses} misses")
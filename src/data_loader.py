@@ -1,120 +1,1157 @@
 import argparse
-import json
+import csv
+import io
 import logging
-from datetime import datetime
-from typing import Any, Dict, List
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from config import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
+import numpy as np
+import psycopg2
+import pyarrow as pa
+
+from config import (COPY_MIN_ROWS, DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER, LOAD_BATCH_SIZE,
+                    LOAD_COMMIT_BYTES, LOAD_COMMIT_ROWS, LOAD_COMMIT_TIMEOUT, LOAD_REJECTS_FILE, QUERY_CACHE_DIR)
+from data_compiler import (BINARY_COPY_COLUMNS, COMPILED_STUDENTS_SCHEMA, PGCOPY_HEADER, PGCOPY_TRAILER, is_compiled,
+                           iter_compiled_batches, iter_room_records, students_copy_data)
 from database_manager import DatabaseManager
+from json_stream import batched, iter_json_records
+from load_checkpoint import LoadCheckpoint
+from metrics import METRICS, add_metrics_arguments, instrumented
+from query_cache import QueryCache
+from room_reports import refresh_room_stats
+from schema import (DEFER_ROOM_CHANGES_SQL, STUDENTS_LOAD_TABLE, check_unlogged_load_target, create_students_load_table,
+                    ensure_student_partitions, notify_room_changes, swap_loaded_students)
+from student_validation import STUDENT_FIELDS, validate_students, write_rejected
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+STUDENTS_COPY_SQL = """
+    COPY students (id, name, birthday, sex, room_id)
+    FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (name, sex));
+"""
+
+# Скомпилированные файлы (data_compiler.py) передаются двоичным COPY
+STUDENTS_BINARY_COPY_SQL = f"""
+    COPY students {BINARY_COPY_COLUMNS}
+    FROM STDIN WITH (FORMAT binary);
+"""
+
+# Загрузка с --unlogged пишет студентов в нежурналируемую таблицу STUDENTS_LOAD_TABLE (см. schema.py)
+STUDENTS_LOAD_COPY_SQL = f"""
+    COPY {STUDENTS_LOAD_TABLE} (id, name, birthday, sex, room_id)
+    FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (name, sex));
+"""
+
+STUDENTS_LOAD_BINARY_COPY_SQL = f"""
+    COPY {STUDENTS_LOAD_TABLE} {BINARY_COPY_COLUMNS}
+    FROM STDIN WITH (FORMAT binary);
+"""
+
+# Сервер читает текстовые поля двоичного COPY в кодировке клиента, а имена в скомпилированных
+# файлах хранятся в UTF-8
+BINARY_COPY_ENCODINGS = frozenset({'UTF8', 'SQLASCII'})
+
+# Размер блока, который psycopg2 запрашивает у потока двоичного COPY за один вызов read
+BINARY_COPY_READ_SIZE = 1 << 20
+
+# Синхронизация (delta-загрузка): файл загружается во временную таблицу, а в students
+# применяются только отличия, найденные по content_hash
+CREATE_STUDENTS_STAGING_SQL = """
+    CREATE TEMPORARY TABLE students_staging (LIKE students INCLUDING GENERATED) ON COMMIT DROP;
+"""
+
+STUDENTS_STAGING_COPY_SQL = """
+    COPY students_staging (id, name, birthday, sex, room_id)
+    FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (name, sex));
+"""
+
+STUDENTS_STAGING_BINARY_COPY_SQL = f"""
+    COPY students_staging {BINARY_COPY_COLUMNS}
+    FROM STDIN WITH (FORMAT binary);
+"""
+
+CHANGED_STUDENTS_ROOMS_SQL = """
+    SELECT DISTINCT students.room_id
+    FROM students
+    JOIN students_staging ON students_staging.id = students.id
+    WHERE students.content_hash IS DISTINCT FROM students_staging.content_hash;
+"""
+
+# Изменения применяются через UPDATE и INSERT, а не INSERT ... ON CONFLICT (id): у секционированной
+# students (schema.py partition) нет уникального индекса по одному id. Глобальную уникальность id там
+# обеспечивает student_ids: студент, которого одновременно вставил другой загрузчик, в том числе
+# в другом корпусе, отвергается ошибкой уникальности. Студент, переселённый в другой корпус,
+# переносится в секцию этого корпуса
+UPDATE_STUDENTS_SQL = """
+    UPDATE students SET
+        name = staging.name,
+        birthday = staging.birthday,
+        sex = staging.sex,
+        room_id = staging.room_id
+    FROM students_staging AS staging
+    WHERE students.id = staging.id
+        AND students.content_hash IS DISTINCT FROM staging.content_hash
+    RETURNING students.room_id;
+"""
+
+INSERT_NEW_STUDENTS_SQL = """
+    INSERT INTO students (id, name, birthday, sex, room_id)
+    SELECT staging.id, staging.name, staging.birthday, staging.sex, staging.room_id
+    FROM students_staging AS staging
+    WHERE NOT EXISTS (SELECT 1 FROM students WHERE students.id = staging.id)
+    RETURNING room_id;
+"""
+
+DELETE_MISSING_STUDENTS_SQL = """
+    DELETE FROM students
+    WHERE NOT EXISTS (SELECT 1 FROM students_staging WHERE students_staging.id = students.id)
+        AND students.id <> ALL(%s::int[])
+    RETURNING room_id;
+"""
+
+# Комнаты вставляются пачкой одной командой: триггер уведомлений (миграция 7) срабатывает
+# один раз на команду, а не на каждую комнату
+INSERT_ROOMS_SQL = """
+    INSERT INTO rooms (id, name)
+    SELECT * FROM unnest(%s::int[], %s::varchar[]);
+"""
+
+UPSERT_ROOMS_SQL = """
+    INSERT INTO rooms (id, name)
+    SELECT * FROM unnest(%s::int[], %s::varchar[])
+    ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name
+    WHERE rooms.name IS DISTINCT FROM EXCLUDED.name
+    RETURNING id;
+"""
+
+# Идентификаторы комнат в дочернем процессе параллельной загрузки, см. init_csv_worker
+_worker_room_ids: Collection[int] = frozenset()
+
+
+def init_csv_worker(room_ids: Collection[int]) -> None:
+    """
+    Запоминает идентификаторы существующих комнат в дочернем процессе параллельной загрузки.
+
+    Args:
+        room_ids (Collection[int]): Идентификаторы существующих комнат.
+    """
+    global _worker_room_ids
+    _worker_room_ids = room_ids
+
+
+def students_csv_chunk(students_data: List[Dict[str, Any]]) -> Tuple[str, int, List[Dict[str, Any]], float]:
+    """
+    Проверяет пачку студентов и преобразует корректные записи в CSV-блок для COPY ... FROM STDIN.
+
+    Вызывается в дочерних процессах параллельной загрузки, поэтому принимает и возвращает
+    только сериализуемые значения.
+
+    Args:
+        students_data (List[Dict[str, Any]]): Пачка словарей с данными о студентах.
+
+    Returns:
+        Tuple[str, int, List[Dict[str, Any]], float]: CSV-данные пачки, количество строк в них,
+            отклонённые записи и время преобразования в секундах (для метрик основного процесса).
+    """
+    started = time.perf_counter()
+    rows, rejected = validate_students(students_data, _worker_room_ids)
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue(), len(rows), rejected, time.perf_counter() - started
+
+
+class CsvCopyStream:
+    """
+    Файлоподобный объект, который лениво превращает строки в CSV для COPY ... FROM STDIN.
+
+    Строки сериализуются по мере чтения, поэтому в памяти держится только текущий блок.
+
+    Args:
+        rows (Iterable[Tuple]): Строки для записи.
+
+    Attributes:
+        rows_written (int): Количество уже сериализованных строк.
+        bytes_written (int): Объём уже переданных данных (в символах; для ASCII совпадает с байтами).
+    """
+
+    def __init__(self, rows: Iterable[Tuple]):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+        self.rows_written = 0
+        self.bytes_written = 0
+
+    def read(self, size: int = -1) -> str:
+        """
+        Возвращает очередной блок CSV-данных размером не более size символов.
+
+        Args:
+            size (int): Максимальный размер блока; отрицательное значение означает все данные.
+
+        Returns:
+            str: Блок CSV-данных или пустая строка, если строки закончились.
+        """
+        while size < 0 or self._buffer.tell() < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow(row)
+            self.rows_written += 1
+
+        data = self._buffer.getvalue()
+        if size < 0:
+            chunk, rest = data, ''
+        else:
+            chunk, rest = data[:size], data[size:]
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._buffer.write(rest)
+        self.bytes_written += len(chunk)
+        return chunk
+
+
+class BinaryCopyStream:
+    """
+    Файлоподобный объект, который лениво кодирует пакеты скомпилированного файла
+    в двоичный формат COPY ... FROM STDIN.
+
+    Args:
+        batches (Iterable[pa.RecordBatch]): Пакеты со схемой COMPILED_STUDENTS_SCHEMA.
+
+    Attributes:
+        rows_written (int): Количество уже закодированных строк.
+        bytes_written (int): Объём уже переданных данных в байтах.
+    """
+
+    def __init__(self, batches: Iterable[pa.RecordBatch]):
+        self._batches = iter(batches)
+        self._chunk = memoryview(PGCOPY_HEADER)
+        self._finished = False
+        self.rows_written = 0
+        self.bytes_written = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Возвращает очередной блок данных размером не более size байт.
+
+        Args:
+            size (int): Максимальный размер блока; отрицательное значение означает остаток текущего пакета.
+
+        Returns:
+            bytes: Блок данных или пустая строка байтов, если данные закончились.
+        """
+        while not self._chunk:
+            if self._finished:
+                return b''
+            batch = next(self._batches, None)
+            if batch is None:
+                self._finished = True
+                self._chunk = memoryview(PGCOPY_TRAILER)
+            else:
+                self._chunk = memoryview(students_copy_data(batch))
+                self.rows_written += batch.num_rows
+        if size < 0:
+            size = len(self._chunk)
+        chunk, self._chunk = self._chunk[:size], self._chunk[size:]
+        self.bytes_written += len(chunk)
+        return bytes(chunk)
+
 
 class DataLoader:
     """
     Класс для загрузки данных из JSON-файлов в базу данных.
 
+    Файлы читаются потоково (JSON-массив или JSON Lines), студенты вставляются пачками
+    по batch_size записей, поэтому потребление памяти не зависит от размера файла.
+    Перед вставкой пачка проверяется по столбцам (дата рождения, пол, существование комнаты);
+    некорректные записи не прерывают загрузку, а дописываются в rejects_file.
+    Вместо JSON-файлов можно передать файлы, скомпилированные data_compiler.py (*.arrow): они
+    отображаются в память и передаются двоичным COPY без разбора JSON и дат.
+    После каждой загрузки сводная таблица room_stats пересчитывается для затронутых комнат,
+    а версия данных в заданном кеше результатов запросов меняется, чтобы экспортёры не читали устаревшие отчёты.
+    Транзакции записи студентов выполняют DEFER_ROOM_CHANGES_SQL, так что триггер уведомлений students
+    молчит, и перед фиксацией сами уведомляют наблюдателей о затронутых комнатах.
+
     Args:
         db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+        batch_size (int): Количество студентов в одной пачке вставки.
+        rejects_file (str): Файл JSON Lines для отклонённых записей о студентах.
+        cache (Optional[QueryCache]): Кеш результатов запросов экспортёров; None — без кеша.
+        commit_rows (Optional[int]): Фиксировать загрузку студентов после стольких строк; None — одной транзакцией.
+        commit_bytes (Optional[int]): Фиксировать загрузку студентов после стольких байт данных.
+        unlogged (bool): Загружать студентов через нежурналируемую таблицу, заменяющую students.
+
+    Attributes:
+        rejected_count (int): Количество отклонённых записей за время жизни загрузчика.
+        bytes_written (int): Объём данных студентов, переданных в базу данных, в байтах.
 
     Methods:
-        insert_rooms_data(rooms_data: List[Dict[str, Any]]) -> None:
+        insert_rooms_data(rooms_data: Iterable[Dict[str, Any]], students_file_path: Optional[str] = None) -> None:
             Вставляет данные о комнатах в базу данных.
 
-        insert_students_data(students_data: List[Dict[str, Any]]) -> None:
-            Вставляет данные о студентах в базу данных.
+        insert_students_data(students_data: List[Dict[str, Any]], use_copy: Optional[bool] = None) -> None:
+            Вставляет данные о студентах в базу данных через COPY или построчными INSERT.
 
-        load_rooms_data(rooms_file_path: str) -> None:
+        load_rooms_data(rooms_file_path: str, students_file_path: Optional[str] = None) -> None:
             Загружает данные о комнатах из JSON-файла и вставляет их в базу данных.
 
-        load_students_data(students_file_path: str) -> None:
-            Загружает данные о студентах из JSON-файла и вставляет их в базу данных.
+        load_students_data(students_file_path: str, use_copy: Optional[bool] = None) -> None:
+            Загружает данные о студентах из файла, при пакетной фиксации — с контрольными точками.
 
-        load_data_to_db(rooms_file_path: str, students_file_path: str) -> None:
+        load_students_data_parallel(students_file_path: str, workers: int) -> None:
+            Загружает данные о студентах параллельно в нескольких процессах и соединениях.
+
+        load_data_to_db(rooms_file_path: str, students_file_path: str, use_copy: Optional[bool] = None,
+                        workers: int = 1) -> None:
             Загружает данные о комнатах и студентах из JSON-файлов в базу данных.
+
+        sync_rooms_data(rooms_file_path: str) -> int:
+            Добавляет новые комнаты и переименовывает изменившиеся.
+
+        sync_students_data(students_file_path: str) -> Dict[str, int]:
+            Приводит таблицу students в соответствие с JSON-файлом, изменяя только отличающиеся строки.
+
+        sync_data_to_db(rooms_file_path: str, students_file_path: str) -> Dict[str, int]:
+            Синхронизирует комнаты и студентов с JSON-файлами.
     """
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, batch_size: int = LOAD_BATCH_SIZE,
+                 rejects_file: str = LOAD_REJECTS_FILE, cache: Optional[QueryCache] = None,
+                 commit_rows: Optional[int] = LOAD_COMMIT_ROWS, commit_bytes: Optional[int] = LOAD_COMMIT_BYTES,
+                 unlogged: bool = False):
         """
         Инициализирует экземпляр класса DataLoader.
 
         Args:
             db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+            batch_size (int): Количество студентов в одной пачке вставки.
+            rejects_file (str): Файл JSON Lines для отклонённых записей о студентах.
+            cache (Optional[QueryCache]): Кеш результатов запросов экспортёров; None — без кеша.
+            commit_rows (Optional[int]): Фиксировать загрузку студентов после стольких строк.
+            commit_bytes (Optional[int]): Фиксировать загрузку студентов после стольких байт данных.
+            unlogged (bool): Загружать студентов через нежурналируемую таблицу.
         """
         self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.rejects_file = rejects_file
+        self.cache = cache
+        self.commit_rows = commit_rows
+        self.commit_bytes = commit_bytes
+        self.checkpoint = LoadCheckpoint()
+        self.unlogged = unlogged
+        self.rejected_count = 0
+        self.bytes_written = 0
 
-    def insert_rooms_data(self, rooms_data: List[Dict[str, Any]]) -> None:
+    def _bump_cache_version(self) -> None:
+        """
+        Меняет версию данных в кеше результатов запросов, если кеш задан.
+        """
+        if self.cache is not None:
+            self.cache.bump_version()
+
+    def insert_rooms_data(self, rooms_data: Iterable[Dict[str, Any]], students_file_path: Optional[str] = None) -> None:
         """
         Вставляет данные о комнатах в базу данных.
 
+        Если таблица students секционирована, для новых корпусов создаются секции.
+
         Args:
-            rooms_data (List[Dict[str, Any]]): Список словарей, представляющих данные о комнатах.
+            rooms_data (Iterable[Dict[str, Any]]): Список или поток словарей, представляющих данные о комнатах.
+            students_file_path (Optional[str]): Файл студентов пакетной загрузки, начальная контрольная
+                точка которой записывается в одной транзакции с комнатами.
         """
+        room_ids = set()
         with self.db_manager as db:
             with db.conn.cursor() as cursor:
-                for room in rooms_data:
-                    cursor.execute("""
-                        INSERT INTO rooms (id, name)
-                        VALUES (%s, %s);
-                    """, (room['id'], room['name']))
-            db.conn.commit()
+                for batch in batched(rooms_data, self.batch_size):
+                    ids = [room['id'] for room in batch]
+                    with METRICS.timer("load.write"):
+                        cursor.execute(INSERT_ROOMS_SQL, (ids, [room['name'] for room in batch]))
+                    room_ids.update(ids)
+                ensure_student_partitions(cursor, room_ids)
+                refresh_room_stats(cursor, room_ids)
+                if students_file_path is not None:
+                    self.checkpoint.save(cursor, students_file_path, 0, 0, self.unlogged)
+            with METRICS.timer("load.commit"):
+                db.conn.commit()
+        self._bump_cache_version()
 
-    def insert_students_data(self, students_data: List[Dict[str, Any]]) -> None:
+    def insert_students_data(self, students_data: List[Dict[str, Any]], use_copy: Optional[bool] = None) -> None:
         """
         Вставляет данные о студентах в базу данных.
 
+        Большие объёмы передаются одним потоком COPY ... FROM STDIN, небольшие вставляются
+        построчными INSERT.
+
         Args:
             students_data (List[Dict[str, Any]]): Список словарей, представляющих данные о студентах.
+            use_copy (Optional[bool]): Использовать COPY (True), построчные INSERT (False)
+                или выбрать автоматически по количеству строк (None).
         """
+        if use_copy is None:
+            use_copy = len(students_data) >= COPY_MIN_ROWS
+
+        started = time.perf_counter()
         with self.db_manager as db:
             with db.conn.cursor() as cursor:
-                for student in students_data:
-                    birthday_str = student.get('birthday', '')  # Handle missing birthday field
-                    birthday = datetime.strptime(birthday_str, "%Y-%m-%dT%H:%M:%S.%f") if birthday_str else None
-                    cursor.execute("""
-                        INSERT INTO students (id, name, birthday, sex, room_id)
-                        VALUES (%s, %s, %s, %s, %s);
-                    """, (student['id'], student['name'], birthday, student['sex'], student['room']))
-            db.conn.commit()
+                cursor.execute(DEFER_ROOM_CHANGES_SQL)
+                room_ids = self._fetch_room_ids(cursor, [student.get('room') for student in students_data])
+                inserted = self._write_students_batch(cursor, students_data, use_copy, room_ids)
+                refresh_room_stats(cursor, room_ids)
+                notify_room_changes(cursor, room_ids)
+            with METRICS.timer("load.commit"):
+                db.conn.commit()
+        self._bump_cache_version()
+        self._log_throughput(inserted, time.perf_counter() - started, 'COPY' if use_copy else 'INSERT')
 
-    def load_rooms_data(self, rooms_file_path: str) -> None:
+    @staticmethod
+    def _fetch_room_ids(cursor, room_ids: Optional[List[Any]] = None) -> Set[int]:
         """
-        Загружает данные о комнатах из JSON-файла и вставляет их в базу данных.
+        Возвращает идентификаторы существующих комнат.
 
         Args:
-            rooms_file_path (str): Путь к JSON-файлу с данными о комнатах.
+            cursor: Курсор базы данных.
+            room_ids (Optional[List[Any]]): Проверяемые идентификаторы; None означает все комнаты.
+
+        Returns:
+            Set[int]: Идентификаторы существующих комнат (из числа room_ids, если они переданы).
+        """
+        if room_ids is None:
+            cursor.execute("SELECT id FROM rooms;")
+        else:
+            cursor.execute("SELECT id FROM rooms WHERE id = ANY(%s);",
+                           ([room_id for room_id in set(room_ids) if isinstance(room_id, int)],))
+        return {row[0] for row in cursor.fetchall()}
+
+    def _write_students_batch(self, cursor, students_data: List[Dict[str, Any]], use_copy: bool,
+                              room_ids: Collection[int], copy_sql: str = STUDENTS_COPY_SQL) -> int:
+        """
+        Проверяет пачку студентов и вставляет корректные записи выбранным способом
+        в рамках текущей транзакции.
+
+        Args:
+            cursor: Курсор базы данных.
+            students_data (List[Dict[str, Any]]): Пачка словарей с данными о студентах.
+            use_copy (bool): Использовать COPY вместо построчных INSERT.
+            room_ids (Collection[int]): Идентификаторы существующих комнат.
+            copy_sql (str): Команда COPY, определяющая целевую таблицу.
+
+        Returns:
+            int: Количество вставленных строк.
+        """
+        with METRICS.timer("load.transform"):
+            rows, rejected = validate_students(students_data, room_ids)
+        self._reject(rejected)
+        if use_copy:
+            return self._copy_students_rows(cursor, iter(rows), copy_sql)
+        return self._insert_students_rows(cursor, iter(rows))
+
+    def _reject(self, rejected: List[Dict[str, Any]]) -> None:
+        """
+        Дописывает отклонённые записи в rejects_file.
+
+        Args:
+            rejected (List[Dict[str, Any]]): Отклонённые записи с причиной отказа.
+        """
+        if not rejected:
+            return
+        with open(self.rejects_file, 'a') as file:
+            write_rejected(file, rejected)
+        self.rejected_count += len(rejected)
+        METRICS.count("load.rows_rejected", len(rejected))
+        logger.warning(f"Rejected {len(rejected)} students, see {self.rejects_file}")
+
+    def _copy_students_rows(self, cursor, rows: Iterator[Tuple], copy_sql: str = STUDENTS_COPY_SQL) -> int:
+        """
+        Передаёт строки студентов в базу данных через COPY ... FROM STDIN.
+
+        Args:
+            cursor: Курсор базы данных.
+            rows (Iterator[Tuple]): Строки для вставки.
+            copy_sql (str): Команда COPY, определяющая целевую таблицу.
+
+        Returns:
+            int: Количество вставленных строк.
+        """
+        stream = CsvCopyStream(rows)
+        with METRICS.timer("load.write"):
+            cursor.copy_expert(copy_sql, stream)
+        self._count_written(stream.rows_written, stream.bytes_written)
+        return stream.rows_written
+
+    def _insert_students_rows(self, cursor, rows: Iterator[Tuple]) -> int:
+        """
+        Вставляет строки студентов в базу данных построчными INSERT.
+
+        Args:
+            cursor: Курсор базы данных.
+            rows (Iterator[Tuple]): Строки для вставки.
+
+        Returns:
+            int: Количество вставленных строк.
+        """
+        inserted = 0
+        sent = 0
+        with METRICS.timer("load.write"):
+            for row in rows:
+                cursor.execute("""
+                    INSERT INTO students (id, name, birthday, sex, room_id)
+                    VALUES (%s, %s, %s, %s, %s);
+                """, row)
+                inserted += 1
+                sent += len(cursor.query)
+        self._count_written(inserted, sent)
+        return inserted
+
+    def _copy_binary(self, cursor, batches: Iterable[pa.RecordBatch], copy_sql: str) -> int:
+        """
+        Передаёт пакеты скомпилированного файла одним двоичным COPY в рамках текущей транзакции.
+
+        Args:
+            cursor: Курсор базы данных.
+            batches (Iterable[pa.RecordBatch]): Пакеты со схемой COMPILED_STUDENTS_SCHEMA.
+            copy_sql (str): Команда COPY, определяющая целевую таблицу.
+
+        Returns:
+            int: Количество переданных строк.
+
+        Raises:
+            ValueError: Если кодировка клиента не позволяет передать имена в UTF-8.
+        """
+        if cursor.connection.encoding not in BINARY_COPY_ENCODINGS:
+            raise ValueError(f"Compiled files require the UTF8 client encoding, not {cursor.connection.encoding}")
+        stream = BinaryCopyStream(batches)
+        with METRICS.timer("load.write"):
+            cursor.copy_expert(copy_sql, stream, size=BINARY_COPY_READ_SIZE)
+        self._count_written(stream.rows_written, stream.bytes_written)
+        return stream.rows_written
+
+    def _filter_compiled_batches(self, batches: Iterable[pa.RecordBatch], known_room_ids: Collection[int],
+                                 rejected_ids: List[int]) -> Iterator[pa.RecordBatch]:
+        """
+        Отклоняет студентов скомпилированного файла, комнат которых нет в базе данных.
+
+        Записи скомпилированного файла проверены при компиляции, поэтому при загрузке проверяется
+        только существование комнат. Отклонённые записи дописываются в rejects_file.
+
+        Args:
+            batches (Iterable[pa.RecordBatch]): Пакеты со схемой COMPILED_STUDENTS_SCHEMA.
+            known_room_ids (Collection[int]): Идентификаторы существующих комнат.
+            rejected_ids (List[int]): Список, в который добавляются идентификаторы отклонённых студентов.
+
+        Yields:
+            pa.RecordBatch: Пакет без отклонённых студентов.
+        """
+        known = np.fromiter(known_room_ids, dtype=np.int64, count=len(known_room_ids))
+        for batch in batches:
+            valid = np.isin(batch.column(4).to_numpy(), known)
+            if not valid.all():
+                unknown = batch.filter(pa.array(~valid))
+                self._reject([{"reason": f"unknown room {student['room_id']!r}",
+                               "record": dict(zip(STUDENT_FIELDS, student.values()))}
+                              for student in unknown.to_pylist()])
+                rejected_ids.extend(unknown.column(0).to_pylist())
+                batch = batch.filter(pa.array(valid))
+            yield batch
+
+    def _count_written(self, rows: int, sent: int) -> None:
+        """
+        Учитывает переданные в базу данных строки и их объём в метриках и в bytes_written.
+        """
+        self.bytes_written += sent
+        METRICS.count("load.rows_written", rows)
+        METRICS.count("load.bytes_written", sent)
+
+    @staticmethod
+    def _log_throughput(rows: int, elapsed: float, method: str) -> None:
+        """
+        Записывает в журнал количество вставленных строк и скорость вставки.
+
+        Args:
+            rows (int): Количество вставленных строк.
+            elapsed (float): Затраченное время в секундах.
+            method (str): Способ вставки.
+        """
+        rate = rows / elapsed if elapsed > 0 else float(rows)
+        logger.info(f"Inserted {rows} students via {method} in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+
+    def load_rooms_data(self, rooms_file_path: str, students_file_path: Optional[str] = None) -> None:
+        """
+        Загружает данные о комнатах из JSON-файла или скомпилированного файла и вставляет их в базу данных.
+
+        Args:
+            rooms_file_path (str): Путь к файлу с данными о комнатах.
+            students_file_path (Optional[str]): Файл студентов пакетной загрузки, см. insert_rooms_data.
         """
         logger.info(f"Loading rooms data from file: {rooms_file_path}")
-        with open(rooms_file_path, 'r') as rooms_file:
-            rooms_data = json.load(rooms_file)
-        self.insert_rooms_data(rooms_data)
+        self.insert_rooms_data(METRICS.timed("load.parse", iter_room_records(rooms_file_path)), students_file_path)
 
-    def load_students_data(self, students_file_path: str) -> None:
+    @property
+    def batched_commits(self) -> bool:
         """
-        Загружает данные о студентах из JSON-файла и вставляет их в базу данных.
+        Фиксируется ли загрузка студентов по частям (задан commit_rows или commit_bytes).
+        """
+        return self.commit_rows is not None or self.commit_bytes is not None
+
+    def load_students_data(self, students_file_path: str, use_copy: Optional[bool] = None) -> None:
+        """
+        Загружает данные о студентах из JSON-файла или скомпилированного файла и вставляет их в базу данных.
+
+        JSON-файл читается потоково и вставляется пачками по batch_size записей, скомпилированный —
+        двоичным COPY по пакетам файла. При автоматическом выборе COPY используется, если уже
+        первая пачка содержит не менее COPY_MIN_ROWS студентов.
+
+        По умолчанию загрузка идёт одной транзакцией. Если задан commit_rows или commit_bytes,
+        транзакция фиксируется после пачки, на которой записано не меньше стольких строк или байт,
+        а количество загруженных записей файла сохраняется в контрольной точке в той же транзакции
+        (см. LoadCheckpoint), так что она не расходится с зафиксированными строками. Повторный запуск
+        после сбоя пропускает эти записи без проверки и записи и продолжает загрузку; отклонённые
+        записи незафиксированной части при этом могут попасть в rejects_file повторно.
+        room_stats пересчитывается один раз, в последней транзакции.
+
+        С unlogged студенты пишутся через COPY в нежурналируемую таблицу без индексов, которая
+        в последней транзакции заменяет пустую students (см. schema.swap_loaded_students).
 
         Args:
-            students_file_path (str): Путь к JSON-файлу с данными о студентах.
+            students_file_path (str): Путь к JSON-файлу или скомпилированному файлу с данными о студентах.
+            use_copy (Optional[bool]): Способ вставки, см. insert_students_data; для скомпилированного
+                файла и с unlogged всегда COPY.
         """
         logger.info(f"Loading students data from file: {students_file_path}")
-        with open(students_file_path, 'r') as students_file:
-            students_data = json.load(students_file)
-        self.insert_students_data(students_data)
+        compiled = is_compiled(students_file_path)
+        if self.unlogged:
+            use_copy = True
+        copy_sql = STUDENTS_LOAD_COPY_SQL if self.unlogged else STUDENTS_COPY_SQL
+        binary_copy_sql = STUDENTS_LOAD_BINARY_COPY_SQL if self.unlogged else STUDENTS_BINARY_COPY_SQL
+        started = time.perf_counter()
+        with self.db_manager as db:
+            with db.conn.cursor() as cursor:
+                known_room_ids = self._fetch_room_ids(cursor)
+                records, inserted = self._start_students_load(db, cursor, students_file_path)
+                cursor.execute(DEFER_ROOM_CHANGES_SQL)
+                resumed = inserted
+                batches, room_ids = self._resume_student_batches(students_file_path, records)
+                window_rows, window_start = 0, self.bytes_written
+                for batch in batches:
+                    if compiled:
+                        rows = self._copy_binary(cursor, self._filter_compiled_batches([batch], known_room_ids, []),
+                                                 binary_copy_sql)
+                        room_ids.update(np.unique(batch.column(4).to_numpy()).tolist())
+                        records += batch.num_rows
+                    else:
+                        if use_copy is None:
+                            use_copy = len(batch) >= COPY_MIN_ROWS
+                        rows = self._write_students_batch(cursor, batch, use_copy, known_room_ids, copy_sql)
+                        room_ids.update(student.get('room') for student in batch)
+                        records += len(batch)
+                    inserted += rows
+                    window_rows += rows
+                    if self._commit_due(window_rows, self.bytes_written - window_start):
+                        self._commit_students_window(db, cursor, students_file_path, records, inserted)
+                        window_rows, window_start = 0, self.bytes_written
 
-    def load_data_to_db(self, rooms_file_path: str, students_file_path: str) -> None:
+                room_ids &= known_room_ids
+                if self.unlogged:
+                    with METRICS.timer("load.swap"):
+                        swap_loaded_students(cursor)
+                refresh_room_stats(cursor, room_ids)
+                notify_room_changes(cursor, room_ids)
+                if self.batched_commits:
+                    self.checkpoint.clear(cursor, students_file_path)
+            with METRICS.timer("load.commit"):
+                db.conn.commit()
+        self._bump_cache_version()
+        self._log_throughput(inserted - resumed, time.perf_counter() - started,
+                             'binary COPY' if compiled else 'COPY' if use_copy else 'INSERT')
+
+    def _start_students_load(self, db: DatabaseManager, cursor, students_file_path: str) -> Tuple[int, int]:
         """
-        Загружает данные о комнатах и студентах из JSON-файлов в базу данных.
+        Продолжает загрузку с контрольной точки или начинает новую; с unlogged создаёт таблицу загрузки.
+
+        Args:
+            db (DatabaseManager): Менеджер базы данных с открытой транзакцией.
+            cursor: Курсор базы данных.
+            students_file_path (str): Путь к файлу студентов.
+
+        Returns:
+            Tuple[int, int]: Количество уже загруженных записей файла и вставленных строк.
+
+        Raises:
+            ValueError: Если контрольная точка не соответствует режиму загрузки, students секционирована
+                или таблица загрузки потеряна (нежурналируемые таблицы очищаются после аварийного перезапуска сервера).
+        """
+        state = self.checkpoint.load(cursor, students_file_path) if self.batched_commits else None
+        if state is not None and state["unlogged"] != self.unlogged:
+            raise ValueError(f"Checkpoint of {students_file_path} was written by a load "
+                             f"{'with' if state['unlogged'] else 'without'} --unlogged; resume it the same way")
+        records, inserted = (state["records"], state["rows_written"]) if state is not None else (0, 0)
+
+        if self.unlogged and not inserted:
+            create_students_load_table(cursor)
+            db.conn.commit()
+        elif self.unlogged:
+            check_unlogged_load_target(cursor)
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (STUDENTS_LOAD_TABLE,))
+            staged = cursor.fetchone()[0] and self._count_rows(cursor, STUDENTS_LOAD_TABLE)
+            if staged != inserted:
+                raise ValueError(f"Table {STUDENTS_LOAD_TABLE} holds {staged or 0} of {inserted} committed students; "
+                                 f"delete the checkpoint of {students_file_path} from load_checkpoints "
+                                 f"to start the load over")
+        if records:
+            logger.info(f"Resuming load of {students_file_path} after {records} records "
+                        f"({inserted} students already committed)")
+        return records, inserted
+
+    @staticmethod
+    def _count_rows(cursor, table: str) -> int:
+        """
+        Возвращает количество строк таблицы.
+        """
+        cursor.execute(f"SELECT COUNT(*) FROM {table};")
+        return cursor.fetchone()[0]
+
+    def _resume_student_batches(self, students_file_path: str,
+                                records: int) -> Tuple[Iterator[Any], Set[Any]]:
+        """
+        Открывает файл студентов и пропускает первые records записей, уже загруженных до прерывания.
+
+        JSON-записи пропускаются без проверки, пакеты скомпилированного файла — целиком.
+
+        Args:
+            students_file_path (str): Путь к файлу студентов.
+            records (int): Количество пропускаемых записей.
+
+        Returns:
+            Tuple[Iterator[Any], Set[Any]]: Оставшиеся пачки (списки словарей или пакеты Arrow)
+                и комнаты пропущенных записей, для которых нужно пересчитать room_stats.
+
+        Raises:
+            ValueError: Если records не совпадает с границей пакетов скомпилированного файла.
+        """
+        room_ids = set()
+        if is_compiled(students_file_path):
+            batches = iter_compiled_batches(students_file_path, COMPILED_STUDENTS_SCHEMA)
+            skipped = 0
+            while skipped < records:
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                skipped += batch.num_rows
+                room_ids.update(np.unique(batch.column(4).to_numpy()).tolist())
+            if skipped != records:
+                raise ValueError(f"Checkpoint offset {records} is not at a record batch boundary "
+                                 f"of {students_file_path}")
+            return batches, room_ids
+
+        students = iter_json_records(students_file_path)
+        for student in METRICS.timed("load.parse", islice(students, records)):
+            room_ids.add(student.get('room'))
+        return METRICS.timed("load.parse", batched(students, self.batch_size)), room_ids
+
+    def _commit_due(self, rows: int, sent: int) -> bool:
+        """
+        Проверяет, набралось ли в текущей транзакции commit_rows строк или commit_bytes байт.
+        """
+        return ((self.commit_rows is not None and rows >= self.commit_rows)
+                or (self.commit_bytes is not None and sent >= self.commit_bytes))
+
+    def _commit_students_window(self, db: DatabaseManager, cursor, students_file_path: str, records: int,
+                                inserted: int) -> None:
+        """
+        Записывает контрольную точку и фиксирует её вместе с текущей транзакцией загрузки.
+
+        Args:
+            db (DatabaseManager): Менеджер базы данных с открытой транзакцией.
+            cursor: Курсор базы данных.
+            students_file_path (str): Путь к файлу студентов.
+            records (int): Количество загруженных записей файла.
+            inserted (int): Количество вставленных строк.
+        """
+        self.checkpoint.save(cursor, students_file_path, records, inserted, self.unlogged)
+        with METRICS.timer("load.commit"):
+            db.conn.commit()
+        cursor.execute(DEFER_ROOM_CHANGES_SQL)
+        if not self.unlogged:
+            self._bump_cache_version()
+        logger.info(f"Committed {inserted} students ({records} records of {students_file_path})")
+
+    def load_students_data_parallel(self, students_file_path: str, workers: int) -> None:
+        """
+        Загружает данные о студентах параллельно.
+
+        Основной процесс читает файл пачками, пул из workers процессов проверяет записи
+        (см. validate_students) и сериализует пачки в CSV, а workers потоков записывают
+        готовые блоки через COPY, каждый в своём соединении. Фиксация двухфазная: каждое
+        соединение подготавливает транзакцию (PREPARE TRANSACTION), и COMMIT PREPARED выполняется
+        только после успешной подготовки всех. При ошибке любого участника разбор файла
+        прекращается, а транзакции всех соединений откатываются. Если max_prepared_transactions
+        сервера меньше workers, пачки записываются одним соединением в одной транзакции, и
+        параллельной остаётся только подготовка. Триггер уведомлений в транзакциях записи молчит,
+        а загруженные комнаты уведомляются при пересчёте room_stats. Сводная таблица room_stats
+        пересчитывается отдельной транзакцией после фиксации.
 
         Args:
-            rooms_file_path (str): Путь к JSON-файлу с данными о комнатах.
             students_file_path (str): Путь к JSON-файлу с данными о студентах.
+            workers (int): Количество процессов подготовки и соединений записи.
+
+        Raises:
+            ValueError: Если workers больше размера пула соединений.
+            Exception: Первая ошибка, возникшая при подготовке, записи или фиксации пачек.
+        """
+        if workers > self.db_manager.pool.max_size:
+            raise ValueError(f"workers ({workers}) must not exceed the connection pool size "
+                             f"({self.db_manager.pool.max_size})")
+
+        logger.info(f"Loading students data from file: {students_file_path} with {workers} workers")
+        with self.db_manager as db:
+            with db.conn.cursor() as cursor:
+                known_room_ids = self._fetch_room_ids(cursor)
+                cursor.execute("SELECT current_setting('max_prepared_transactions')::int;")
+                two_phase = cursor.fetchone()[0] >= workers
+            db.conn.rollback()
+        writer_count = workers if two_phase else 1
+        if not two_phase:
+            logger.warning(f"max_prepared_transactions is lower than {workers}: students are written "
+                           f"through a single connection so that the load commits atomically")
+
+        started = time.perf_counter()
+        inserted = 0
+        room_ids = set()
+        chunks = queue.Queue(maxsize=workers * 2)
+        barrier = threading.Barrier(writer_count)
+        failed = threading.Event()
+        errors = []
+        load_id = f"students-load-{uuid.uuid4()}"
+        writers = [
+            threading.Thread(target=self._copy_chunks_worker,
+                             args=(chunks, barrier, failed, errors, (load_id, str(index)) if two_phase else None))
+            for index in range(writer_count)
+        ]
+        for writer in writers:
+            writer.start()
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_csv_worker,
+                                     initargs=(known_room_ids,)) as pool:
+                pending = deque()
+                try:
+                    for batch in METRICS.timed("load.parse", batched(iter_json_records(students_file_path),
+                                                                     self.batch_size)):
+                        if failed.is_set():
+                            break
+                        pending.append(pool.submit(students_csv_chunk, batch))
+                        room_ids.update(student.get('room') for student in batch)
+                        while len(pending) >= workers * 2 or (pending and pending[0].done()):
+                            inserted += self._put_chunk(chunks, pending.popleft().result())
+                    while pending and not failed.is_set():
+                        inserted += self._put_chunk(chunks, pending.popleft().result())
+                finally:
+                    for future in pending:
+                        future.cancel()
+        except Exception as error:
+            errors.insert(0, error)
+            failed.set()
+        finally:
+            for _ in writers:
+                chunks.put(None)
+            for writer in writers:
+                writer.join()
+
+        if errors:
+            raise errors[0]
+
+        # Студенты уже зафиксированы, поэтому версия кеша меняется даже при ошибке пересчёта room_stats
+        try:
+            with self.db_manager as db:
+                with db.conn.cursor() as cursor:
+                    refresh_room_stats(cursor, room_ids & known_room_ids)
+                    notify_room_changes(cursor, room_ids & known_room_ids)
+                with METRICS.timer("load.commit"):
+                    db.conn.commit()
+        finally:
+            self._bump_cache_version()
+        self._log_throughput(inserted, time.perf_counter() - started, f'COPY x{workers}')
+
+    def _put_chunk(self, chunks: queue.Queue, result: Tuple[str, int, List[Dict[str, Any]]]) -> int:
+        """
+        Передаёт подготовленный CSV-блок потокам записи, а отклонённые записи — в rejects_file.
+
+        Args:
+            chunks (queue.Queue): Очередь CSV-блоков.
+            result (Tuple[str, int, List[Dict[str, Any]], float]): Результат students_csv_chunk.
+
+        Returns:
+            int: Количество строк в блоке.
+        """
+        chunk, rows, rejected, elapsed = result
+        METRICS.observe("load.transform", elapsed)
+        self._reject(rejected)
+        if rows:
+            chunks.put(chunk)
+        return rows
+
+    def _copy_chunks_worker(self, chunks: queue.Queue, barrier: threading.Barrier, failed: threading.Event,
+                            errors: List[Exception], xid: Optional[Tuple[str, str]] = None) -> None:
+        """
+        Записывает CSV-блоки из очереди через COPY в собственном соединении.
+
+        Работает до получения None. С xid транзакция двухфазная и после записи подготавливается.
+        Затем поток дожидается остальных потоков записи (не дольше LOAD_COMMIT_TIMEOUT секунд)
+        и фиксирует транзакцию, если ни один из них не завершился ошибкой, иначе откатывает её.
+        Поток, не дошедший до барьера, разрушает его (Barrier.abort), и ожидающие его потоки
+        получают BrokenBarrierError и откатывают свои транзакции.
+
+        Args:
+            chunks (queue.Queue): Очередь CSV-блоков.
+            barrier (threading.Barrier): Барьер, синхронизирующий фиксацию транзакций.
+            failed (threading.Event): Признак ошибки в любом из участников загрузки.
+            errors (List[Exception]): Список, в который добавляются возникшие ошибки.
+            xid (Optional[Tuple[str, str]]): Глобальный идентификатор загрузки и номер соединения
+                для двухфазной фиксации; None — обычная фиксация.
+        """
+        db_manager = DatabaseManager(self.db_manager.dbname, self.db_manager.user, self.db_manager.password,
+                                     self.db_manager.host, self.db_manager.port)
+        drained = passed = False
+        try:
+            with db_manager as db:
+                if db.conn is None:
+                    raise psycopg2.OperationalError("Could not connect a students writer to the database")
+                try:
+                    with db.conn.cursor() as cursor:
+                        if xid is not None:
+                            db.conn.tpc_begin(db.conn.xid(0, *xid))
+                        cursor.execute(DEFER_ROOM_CHANGES_SQL)
+                        for chunk in iter(chunks.get, None):
+                            if not failed.is_set():
+                                with METRICS.timer("load.write"):
+                                    cursor.copy_expert(STUDENTS_COPY_SQL, io.StringIO(chunk))
+                                METRICS.count("load.rows_written", cursor.rowcount)
+                        drained = True
+                except Exception as error:
+                    errors.append(error)
+                    failed.set()
+                    if not drained:
+                        for _ in iter(chunks.get, None):
+                            pass
+                        drained = True
+
+                if xid is not None and not failed.is_set():
+                    try:
+                        db.conn.tpc_prepare()
+                    except Exception as error:
+                        errors.append(error)
+                        failed.set()
+                try:
+                    barrier.wait(LOAD_COMMIT_TIMEOUT)
+                    passed = True
+                except threading.BrokenBarrierError as error:
+                    errors.append(error)
+                    failed.set()
+                if failed.is_set():
+                    db.conn.tpc_rollback() if xid is not None else db.conn.rollback()
+                else:
+                    with METRICS.timer("load.commit"):
+                        db.conn.tpc_commit() if xid is not None else db.conn.commit()
+        except Exception as error:
+            errors.append(error)
+            failed.set()
+        finally:
+            # После прохода барьера его не разрушают: ещё не проснувшиеся участники получили бы
+            # BrokenBarrierError и откатились, хотя остальные уже фиксируют свои транзакции
+            if not passed:
+                barrier.abort()
+            if not drained:
+                for _ in iter(chunks.get, None):
+                    pass
+
+    def load_data_to_db(self, rooms_file_path: str, students_file_path: str,
+                        use_copy: Optional[bool] = None, workers: int = 1) -> None:
+        """
+        Загружает данные о комнатах и студентах из JSON-файлов в базу данных.
+
+        Комнаты фиксируются до начала загрузки студентов, поэтому внешний ключ room_id
+        выполняется и при параллельной загрузке. Скомпилированный файл студентов загружается
+        двоичным COPY, use_copy и workers к нему не применяются. При пакетной фиксации
+        (commit_rows, commit_bytes) вместе с комнатами записывается контрольная точка, и при продолжении
+        прерванной загрузки комнаты повторно не загружаются.
+
+        Args:
+            rooms_file_path (str): Путь к JSON-файлу или скомпилированному файлу с данными о комнатах.
+            students_file_path (str): Путь к JSON-файлу или скомпилированному файлу с данными о студентах.
+            use_copy (Optional[bool]): Способ вставки студентов, см. insert_students_data.
+            workers (int): Количество параллельных процессов и соединений; 1 означает
+                последовательную загрузку.
+
+        Raises:
+            ValueError: Если пакетная фиксация или unlogged сочетаются с параллельной загрузкой.
         """
+        parallel = workers > 1 and not is_compiled(students_file_path)
+        if parallel and (self.batched_commits or self.unlogged):
+            raise ValueError("Batch commits and unlogged loads are not supported with several workers")
+
         logger.info("Loading data to the database...")
-        self.load_rooms_data(rooms_file_path)
-        self.load_students_data(students_file_path)
+        resuming = False
+        if self.batched_commits:
+            with self.db_manager as db:
+                with db.conn.cursor() as cursor:
+                    resuming = self.checkpoint.load(cursor, students_file_path) is not None
+                db.conn.rollback()
+        if resuming:
+            logger.info(f"Rooms were loaded before the interruption of the load of {students_file_path}")
+        else:
+            self.load_rooms_data(rooms_file_path, students_file_path if self.batched_commits else None)
+        if parallel:
+            self.load_students_data_parallel(students_file_path, workers)
+        else:
+            self.load_students_data(students_file_path, use_copy)
         logger.info("Data loading completed.")
 
+    def sync_rooms_data(self, rooms_file_path: str) -> int:
+        """
+        Добавляет новые комнаты из JSON-файла или скомпилированного файла и переименовывает изменившиеся.
+
+        Комнаты, отсутствующие в файле, не удаляются: на них могут ссылаться студенты.
+
+        Args:
+            rooms_file_path (str): Путь к файлу с данными о комнатах.
+
+        Returns:
+            int: Количество добавленных или изменённых комнат.
+        """
+        logger.info(f"Syncing rooms data from file: {rooms_file_path}")
+        room_ids = set()
+        with self.db_manager as db:
+            with db.conn.cursor() as cursor:
+                for batch in METRICS.timed("load.parse", batched(iter_room_records(rooms_file_path),
+                                                                 self.batch_size)):
+                    # ON CONFLICT не допускает повторного id в одной команде, остаётся последнее имя
+                    names = {room['id']: room['name'] for room in batch}
+                    with METRICS.timer("load.write"):
+                        cursor.execute(UPSERT_ROOMS_SQL, (list(names), list(names.values())))
+                        room_ids.update(room_id for room_id, in cursor.fetchall())
+                ensure_student_partitions(cursor, room_ids)
+                refresh_room_stats(cursor, room_ids)
+            with METRICS.timer("load.commit"):
+                db.conn.commit()
+        self._bump_cache_version()
+        return len(room_ids)
+
+    def sync_students_data(self, students_file_path: str) -> Dict[str, int]:
+        """
+        Приводит таблицу students в соответствие с JSON-файлом.
+
+        Файл (JSON или скомпилированный) загружается через COPY во временную таблицу, после чего одной транзакцией
+        изменившиеся студенты обновляются, новые добавляются, а отсутствующие в файле удаляются.
+        Неизменившиеся строки определяются по content_hash и не перезаписываются. Студенты, отклонённые проверкой,
+        не удаляются, а сохраняют прежнее состояние. room_stats пересчитывается только для затронутых комнат.
+
+        Args:
+            students_file_path (str): Путь к JSON-файлу с данными о студентах.
+
+        Returns:
+            Dict[str, int]: Количество добавленных, изменённых, удалённых и неизменившихся студентов.
+        """
+        logger.info(f"Syncing students data from file: {students_file_path}")
+        started = time.perf_counter()
+        with self.db_manager as db:
+            with db.conn.cursor() as cursor:
+                cursor.execute(DEFER_ROOM_CHANGES_SQL)
+                cursor.execute(CREATE_STUDENTS_STAGING_SQL)
+                known_room_ids = self._fetch_room_ids(cursor)
+                if is_compiled(students_file_path):
+                    rejected_ids = []
+                    batches = iter_compiled_batches(students_file_path, COMPILED_STUDENTS_SCHEMA)
+                    staged = self._copy_binary(cursor, self._filter_compiled_batches(batches, known_room_ids,
+                                                                                     rejected_ids),
+                                               STUDENTS_STAGING_BINARY_COPY_SQL)
+                else:
+                    staged, rejected_ids = self._copy_students_file(cursor, students_file_path, known_room_ids,
+                                                                    STUDENTS_STAGING_COPY_SQL)
+                with METRICS.timer("load.merge"):
+                    cursor.execute("ALTER TABLE students_staging ADD PRIMARY KEY (id);")
+                    cursor.execute("ANALYZE students_staging;")
+
+                    cursor.execute(CHANGED_STUDENTS_ROOMS_SQL)
+                    room_ids = {row[0] for row in cursor.fetchall()}
+                    cursor.execute(UPDATE_STUDENTS_SQL)
+                    updated = cursor.fetchall()
+                    cursor.execute(INSERT_NEW_STUDENTS_SQL)
+                    inserted = cursor.fetchall()
+                    room_ids.update(room_id for room_id, in updated + inserted)
+                    cursor.execute(DELETE_MISSING_STUDENTS_SQL, (rejected_ids,))
+                    deleted = cursor.fetchall()
+                room_ids.update(room_id for room_id, in deleted)
+                room_ids.discard(None)
+                refresh_room_stats(cursor, room_ids)
+                notify_room_changes(cursor, room_ids)
+            with METRICS.timer("load.commit"):
+                db.conn.commit()
+        self._bump_cache_version()
+
+        counts = {
+            "inserted": len(inserted),
+            "updated": len(updated),
+            "deleted": len(deleted),
+            "unchanged": staged - len(updated) - len(inserted),
+        }
+        logger.info(f"Synced students in {time.perf_counter() - started:.2f}s: {counts}")
+        return counts
+
+    def _copy_students_file(self, cursor, students_file_path: str, known_room_ids: Collection[int],
+                            copy_sql: str) -> Tuple[int, List[int]]:
+        """
+        Проверяет студентов JSON-файла и передаёт корректные записи через COPY в рамках текущей транзакции.
+
+        Args:
+            cursor: Курсор базы данных.
+            students_file_path (str): Путь к JSON-файлу с данными о студентах.
+            known_room_ids (Collection[int]): Идентификаторы существующих комнат.
+            copy_sql (str): Команда COPY, определяющая целевую таблицу.
+
+        Returns:
+            Tuple[int, List[int]]: Количество переданных строк и идентификаторы отклонённых студентов.
+        """
+        copied = 0
+        rejected_ids = []
+        for batch in METRICS.timed("load.parse", batched(iter_json_records(students_file_path), self.batch_size)):
+            with METRICS.timer("load.transform"):
+                rows, rejected = validate_students(batch, known_room_ids)
+            self._reject(rejected)
+            rejected_ids.extend(item['record']['id'] for item in rejected
+                                if isinstance(item['record'].get('id'), int))
+            copied += self._copy_students_rows(cursor, iter(rows), copy_sql)
+        return copied, rejected_ids
+
+    def sync_data_to_db(self, rooms_file_path: str, students_file_path: str) -> Dict[str, int]:
+        """
+        Синхронизирует комнаты и студентов с JSON-файлами.
+
+        В отличие от load_data_to_db, повторный запуск на обновлённых файлах не приводит
+        к конфликтам первичных ключей.
+
+        Args:
+            rooms_file_path (str): Путь к JSON-файлу с данными о комнатах.
+            students_file_path (str): Путь к JSON-файлу с данными о студентах.
+
+        Returns:
+            Dict[str, int]: Количество добавленных, изменённых, удалённых и неизменившихся студентов.
+        """
+        logger.info("Syncing data to the database...")
+        self.sync_rooms_data(rooms_file_path)
+        counts = self.sync_students_data(students_file_path)
+        logger.info("Data sync completed.")
+        return counts
+
+
+INSERT_MODES = {'auto': None, 'copy': True, 'insert': False}
+
 
 def parse_args():
     """
@@ -124,8 +1161,33 @@ def parse_args():
         argparse.Namespace: Разобранные аргументы командной строки.
     """
     parser = argparse.ArgumentParser(description='Load data from JSON files to a database.')
-    parser.add_argument('rooms_file', help='Path to the rooms JSON file')
-    parser.add_argument('students_file', help='Path to the students JSON file')
+    parser.add_argument('rooms_file', help='Path to the rooms JSON file or compiled .arrow file (data_compiler.py)')
+    parser.add_argument('students_file', help='Path to the students JSON file or compiled .arrow file')
+    parser.add_argument('--insert-mode', choices=INSERT_MODES, default='auto',
+                        help='How to insert students: COPY, row-by-row INSERT or chosen by row count')
+    parser.add_argument('--batch-size', type=int, default=LOAD_BATCH_SIZE,
+                        help='Number of students read and inserted per batch')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes and database connections used to load students (always COPY)')
+    parser.add_argument('--sync', action='store_true',
+                        help='Apply only the differences between the files and the database '
+                             '(upsert changed students, delete missing ones)')
+    parser.add_argument('--rejects-file', default=LOAD_REJECTS_FILE,
+                        help='JSON Lines file that receives students rejected by validation')
+    parser.add_argument('--commit-rows', type=int, default=LOAD_COMMIT_ROWS,
+                        help='Commit the students load after every N rows (at batch boundaries) together with '
+                             'a checkpoint in load_checkpoints; an interrupted load of the same file resumes from '
+                             'it. By default the whole load is one transaction')
+    parser.add_argument('--commit-bytes', type=int, default=LOAD_COMMIT_BYTES,
+                        help='Commit the students load after every N bytes sent to the database and record '
+                             'a checkpoint')
+    parser.add_argument('--unlogged', action='store_true',
+                        help='Load students into an UNLOGGED table without indexes and swap it in for the empty '
+                             'students table at the end')
+    parser.add_argument('--cache-dir',
+                        help=f'Query result cache of the exporters to invalidate after the load, '
+                             f'e.g. {QUERY_CACHE_DIR}; without it the cache is left alone')
+    add_metrics_arguments(parser)
     return parser.parse_args()
 
 
@@ -140,9 +1202,17 @@ if __name__ == "__main__":
 
     db_manager = DatabaseManager(dbname, user, password, host, port)
 
-    data_loader = DataLoader(db_manager)
+    cache = QueryCache(args.cache_dir) if args.cache_dir else None
+    data_loader = DataLoader(db_manager, args.batch_size, args.rejects_file, cache,
+                             args.commit_rows, args.commit_bytes, args.unlogged)
 
     rooms_file_path = args.rooms_file
     students_file_path = args.students_file
 
-    data_loader.load_data_to_db(rooms_file_path, students_file_path)
+    with instrumented(args):
+        if args.sync:
+            data_loader.sync_data_to_db(rooms_file_path, students_file_path)
+        else:
+            data_loader.load_data_to_db(rooms_file_path, students_file_path, INSERT_MODES[args.insert_mode],
+                                        args.workers)
+    logger.info(f"Connection pool usage: {db_manager.pool_stats()}")
@@ -1,12 +1,184 @@
 import logging
-from typing import Union
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+from config import EXPORT_ITERSIZE, POOL_HEALTH_CHECK_INTERVAL, POOL_IDLE_TIMEOUT, POOL_MAX_SIZE, POOL_MIN_SIZE, POOL_TIMEOUT
+from metrics import METRICS
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений с PostgreSQL.
+
+    Соединения открываются лениво, по мере спроса, и после возврата переиспользуются.
+    Соединение, простаивавшее дольше health_check_interval, перед выдачей проверяется
+    запросом SELECT 1; закрытые и неисправные соединения отбрасываются. Простаивающие
+    дольше idle_timeout соединения закрываются, пока их больше min_size.
+
+    Args:
+        connect (Callable[[], psycopg2.extensions.connection]): Функция, открывающая новое соединение.
+        min_size (int): Сколько простаивающих соединений держать открытыми несмотря на таймаут.
+        max_size (int): Максимальное количество одновременно открытых соединений.
+        idle_timeout (float): Время простоя в секундах, после которого лишнее соединение закрывается.
+        health_check_interval (float): Время простоя в секундах, после которого соединение
+            проверяется перед выдачей.
+        timeout (float): Сколько секунд ждать свободного соединения, если пул исчерпан.
+
+    Attributes:
+        hits (int): Количество выдач уже открытого соединения.
+        misses (int): Количество выдач, потребовавших открытия нового соединения.
+    """
+
+    def __init__(self, connect: Callable[[], psycopg2.extensions.connection],
+                 min_size: int = POOL_MIN_SIZE, max_size: int = POOL_MAX_SIZE,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT,
+                 health_check_interval: float = POOL_HEALTH_CHECK_INTERVAL,
+                 timeout: float = POOL_TIMEOUT):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._idle = deque()
+        self._in_use = 0
+        self._condition = threading.Condition()
+
+    def getconn(self) -> psycopg2.extensions.connection:
+        """
+        Выдаёт соединение из пула, при необходимости открывая новое.
+
+        Returns:
+            psycopg2.extensions.connection: Соединение с базой данных.
+
+        Raises:
+            psycopg2.pool.PoolError: Если свободное соединение не появилось за timeout секунд.
+            psycopg2.Error: Если не удалось открыть новое соединение.
+        """
+        while True:
+            with self._condition:
+                self._close_expired()
+                if not self._condition.wait_for(self._can_borrow, self.timeout):
+                    raise psycopg2.pool.PoolError("connection pool exhausted")
+                self._in_use += 1
+                conn, returned_at = self._idle.pop() if self._idle else (None, None)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except BaseException:
+                    self._release()
+                    raise
+                with self._condition:
+                    self.misses += 1
+                return conn
+
+            if self._is_healthy(conn, returned_at):
+                with self._condition:
+                    self.hits += 1
+                return conn
+            self._release(conn)
+
+    def putconn(self, conn: psycopg2.extensions.connection) -> None:
+        """
+        Возвращает соединение в пул, откатывая незавершённую транзакцию.
+
+        Args:
+            conn (psycopg2.extensions.connection): Ранее выданное соединение.
+        """
+        if conn.closed == 0 and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                conn.close()
+
+        if conn.closed != 0:
+            self._release()
+            return
+        with self._condition:
+            self._in_use -= 1
+            self._idle.append((conn, time.monotonic()))
+            self._close_expired()
+            self._condition.notify()
+
+    def closeall(self) -> None:
+        """
+        Закрывает все простаивающие соединения пула.
+        """
+        with self._condition:
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Возвращает счётчики использования пула.
+
+        Returns:
+            Dict[str, int]: Количество попаданий и промахов, простаивающих и выданных соединений.
+        """
+        with self._condition:
+            return {"hits": self.hits, "misses": self.misses, "idle": len(self._idle), "in_use": self._in_use}
+
+    def _can_borrow(self) -> bool:
+        return bool(self._idle) or self._in_use < self.max_size
+
+    def _is_healthy(self, conn: psycopg2.extensions.connection, returned_at: float) -> bool:
+        """
+        Проверяет, что соединение открыто и, если оно долго простаивало, отвечает на запросы.
+        """
+        if conn.closed != 0:
+            return False
+        if time.monotonic() - returned_at < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _release(self, conn: Optional[psycopg2.extensions.connection] = None) -> None:
+        """
+        Освобождает место в пуле, закрывая переданное соединение.
+        """
+        if conn is not None and conn.closed == 0:
+            conn.close()
+        with self._condition:
+            self._in_use -= 1
+            self._condition.notify()
+
+    def _close_expired(self) -> None:
+        """
+        Закрывает соединения, простаивающие дольше idle_timeout, сверх min_size.
+        Вызывается под блокировкой пула.
+        """
+        now = time.monotonic()
+        while len(self._idle) > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            conn.close()
 
 
 class DatabaseManager:
     """
     Менеджер базы данных для управления подключением к PostgreSQL.
 
+    Соединения берутся из пула ConnectionPool, общего для всех менеджеров с одинаковыми
+    параметрами подключения, поэтому повторный вход в контекст не открывает новое соединение.
+    Взятые соединения хранятся в стеке отдельно для каждого потока: вложенный вход в контекст
+    берёт ещё одно соединение, а выход возвращает в пул только его, и conn снова указывает
+    на соединение внешнего контекста. Один менеджер можно использовать из нескольких потоков.
+
     Args:
         dbname (str): Имя базы данных.
         user (str): Имя пользователя базы данных.
@@ -20,20 +192,28 @@ class DatabaseManager:
         password (str): Пароль для доступа к базе данных.
         host (str): Адрес хоста базы данных.
         port (Union[int, str]): Номер порта для подключения к базе данных.
-        conn (psycopg2.extensions.connection): Объект подключения к базе данных.
+        conn (Optional[psycopg2.extensions.connection]): Соединение текущего потока, взятое последним
+            входом в контекст; None вне контекста.
+        pool (ConnectionPool): Пул соединений для этих параметров подключения.
 
     Methods:
         __enter__() -> 'DatabaseManager':
             Возвращает сам объект менеджера при использовании в контексте.
 
         __exit__(exc_type, exc_value, traceback):
-            Закрывает соединение с базой данных при завершении работы с контекстом.
+            Возвращает соединение в пул при завершении работы с контекстом.
 
         connect() -> None:
-            Устанавливает соединение с базой данных.
+            Берёт соединение с базой данных из пула и кладёт его на стек текущего потока.
 
         close() -> None:
-            Закрывает соединение с базой данных.
+            Возвращает в пул соединение с вершины стека текущего потока.
+
+        pool_stats() -> Dict[str, int]:
+            Возвращает счётчики использования пула соединений.
+
+        stream(query: str, params: Optional[Sequence[Any]] = None, itersize: int = EXPORT_ITERSIZE) -> Iterator[Tuple]:
+            Выполняет запрос через серверный курсор и возвращает строки по мере получения.
 
     Usage:
         # Пример использования в контексте
@@ -41,6 +221,9 @@ class DatabaseManager:
             # Выполнение операций с базой данных внутри контекста
     """
 
+    _pools: Dict[Tuple, ConnectionPool] = {}
+    _pools_lock = threading.Lock()
+
     def __init__(self, dbname: str, user: str, password: str, host: str, port: Union[int, str]):
         """
         Инициализирует экземпляр класса DatabaseManager.
@@ -57,7 +240,29 @@ class DatabaseManager:
         self.password = password
         self.host = host
         self.port = port
-        self.conn = None
+        self._local = threading.local()
+
+        key = (dbname, user, password, host, str(port))
+        with self._pools_lock:
+            if key not in self._pools:
+                self._pools[key] = ConnectionPool(self._open_connection)
+            self.pool = self._pools[key]
+
+    @property
+    def conn(self) -> Optional[psycopg2.extensions.connection]:
+        """
+        Соединение текущего потока, взятое последним входом в контекст, или None.
+        """
+        stack = self._connections()
+        return stack[-1] if stack else None
+
+    def _connections(self) -> List[Optional[psycopg2.extensions.connection]]:
+        """
+        Возвращает стек соединений, взятых текущим потоком.
+        """
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
 
     def __enter__(self) -> 'DatabaseManager':
         """
@@ -71,7 +276,7 @@ class DatabaseManager:
 
     def __exit__(self, exc_type, exc_value, traceback):
         """
-        Закрывает соединение с базой данных при завершении работы с контекстом.
+        Возвращает соединение в пул при завершении работы с контекстом.
 
         Args:
             exc_type: Тип исключения (если есть).
@@ -80,28 +285,81 @@ class DatabaseManager:
         """
         self.close()
 
-    def connect(self) -> None:
+    def _open_connection(self) -> psycopg2.extensions.connection:
         """
-        Устанавливает соединение с базой данных.
+        Открывает новое физическое соединение с базой данных.
 
-        Raises:
-            psycopg2.Error: Если произошла ошибка при подключении к базе данных.
+        Returns:
+            psycopg2.extensions.connection: Новое соединение.
         """
-        try:
-            self.conn = psycopg2.connect(
+        with METRICS.timer("db.connect"):
+            conn = psycopg2.connect(
                 dbname=self.dbname,
                 user=self.user,
                 password=self.password,
                 host=self.host,
                 port=self.port
             )
-            logging.info("Successfully connected to the database")
+        logging.info("Successfully connected to the database")
+        return conn
+
+    def connect(self) -> None:
+        """
+        Берёт соединение с базой данных из пула.
+
+        Raises:
+            psycopg2.Error: Если произошла ошибка при подключении к базе данных.
+        """
+        conn = None
+        try:
+            conn = self.pool.getconn()
         except psycopg2.Error as e:
             logging.exception(f"Error connecting to the database {e}")
+        # None кладётся на стек тоже, чтобы close() парного выхода из контекста снял именно его
+        self._connections().append(conn)
 
     def close(self) -> None:
         """
-        Закрывает соединение с базой данных.
+        Возвращает в пул соединение с вершины стека текущего потока.
+        """
+        stack = self._connections()
+        if not stack:
+            return
+        conn = stack.pop()
+        if conn is not None:
+            self.pool.putconn(conn)
+
+    def pool_stats(self) -> Dict[str, int]:
+        """
+        Возвращает счётчики использования пула соединений.
+
+        Returns:
+            Dict[str, int]: Количество попаданий и промахов, простаивающих и выданных соединений.
+        """
+        return self.pool.stats()
+
+    def stream(self, query: str, params: Optional[Sequence[Any]] = None,
+               itersize: int = EXPORT_ITERSIZE) -> Iterator[Tuple]:
+        """
+        Выполняет запрос через именованный (серверный) курсор и возвращает строки по мере получения.
+
+        Клиент держит в памяти не более itersize строк. Поток берёт из пула собственное соединение
+        и курсор с уникальным именем, поэтому не меняет conn и может выполняться одновременно
+        с другими потоками и контекстами. Соединение занято, пока итерация не завершена.
+
+        Args:
+            query (str): Один SQL-запрос SELECT.
+            params (Optional[Sequence[Any]]): Параметры запроса.
+            itersize (int): Количество строк, получаемых с сервера за один запрос.
+
+        Yields:
+            Tuple: Очередная строка результата.
         """
-        if self.conn and self.conn.closed == 0:
-            self.conn.close()
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = itersize
+                cursor.execute(query, params)
+                yield from cursor
+        finally:
+            self.pool.putconn(conn)
@@ -0,0 +1,332 @@
+import argparse
+import csv
+import logging
+import os
+import time
+from contextlib import ExitStack
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, TextIO, Tuple
+
+from config import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER, EXPORT_ITERSIZE, QUERY_CACHE_DIR, TOP_ROOMS_LIMIT
+from database_manager import DatabaseManager
+from json_stream import JsonArrayWriter, JsonLinesWriter
+from metrics import METRICS, add_metrics_arguments, instrumented
+from query_cache import QueryCache
+from room_reports import (REPORT_FIELDS, REPORT_QUERIES, ROOM_STATS_REPORT_QUERIES, derive_reports, fetch_room_aggregates,
+                          report_params)
+from xml_stream import XmlRecordWriter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CsvRecordWriter:
+    """
+    Записывает записи в файл CSV со строкой заголовка.
+
+    Args:
+        file (TextIO): Файл, открытый на запись.
+        fields (Sequence[str]): Имена столбцов.
+
+    Attributes:
+        written (int): Количество записанных строк без заголовка.
+    """
+
+    def __init__(self, file: TextIO, fields: Sequence[str]):
+        self._writer = csv.DictWriter(file, fields, lineterminator='\n')
+        self._writer.writeheader()
+        self.written = 0
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """
+        Записывает очередную строку.
+
+        Args:
+            record (Dict[str, Any]): Запись.
+        """
+        self._writer.writerow(record)
+        self.written += 1
+
+    def close(self) -> int:
+        """
+        Возвращает количество записанных строк. Файл не закрывается.
+
+        Returns:
+            int: Количество записанных строк.
+        """
+        return self.written
+
+
+# Фабрики записи по форматам: (файл, имя отчёта, поля, compact) -> объект с методами write(record) и close().
+# Новый формат добавляется в этот словарь и сразу доступен всем экспортёрам и флагу --format.
+RECORD_WRITERS: Dict[str, Callable[[TextIO, str, Sequence[str], bool], Any]] = {
+    "json": lambda file, report_name, fields, compact: JsonArrayWriter(file, None if compact else 2),
+    "xml": lambda file, report_name, fields, compact: XmlRecordWriter(file, report_name,
+                                                                      indent=None if compact else "    "),
+    "csv": lambda file, report_name, fields, compact: CsvRecordWriter(file, fields),
+    "ndjson": lambda file, report_name, fields, compact: JsonLinesWriter(file),
+}
+
+# Флаги командной строки отдельных отчётов
+REPORT_FLAGS = {f"export_{report_name}": report_name for report_name in REPORT_QUERIES}
+
+
+def write_records(report_name: str, records: Iterable[Dict[str, Any]], output_files: Dict[str, str],
+                  compact: bool = False) -> int:
+    """
+    Записывает поток строк отчёта сразу в несколько файлов разных форматов.
+
+    Каждая строка читается из потока один раз и передаётся всем писателям, поэтому
+    один запрос к базе данных даёт файлы во всех форматах.
+
+    Args:
+        report_name (str): Имя отчёта в REPORT_FIELDS; для XML — имя корневого элемента.
+        records (Iterable[Dict[str, Any]]): Поток строк отчёта.
+        output_files (Dict[str, str]): Путь к файлу для каждого формата из RECORD_WRITERS.
+        compact (bool): Записывать файлы без отступов.
+
+    Returns:
+        int: Количество записанных строк.
+
+    Raises:
+        ValueError: Если формат не зарегистрирован в RECORD_WRITERS.
+    """
+    unknown = set(output_files) - set(RECORD_WRITERS)
+    if unknown:
+        raise ValueError(f"Unsupported export format(s): {', '.join(sorted(unknown))}")
+
+    fields = REPORT_FIELDS[report_name]
+    serialize_time = 0.0
+    with ExitStack() as stack:
+        writers = [
+            RECORD_WRITERS[export_format](stack.enter_context(open(output_file, 'w')),
+                                          report_name, fields, compact)
+            for export_format, output_file in output_files.items()
+        ]
+        # Время получения строк (export.fetch) не входит во время сериализации
+        for record in records:
+            started = time.perf_counter()
+            for writer in writers:
+                writer.write(record)
+            serialize_time += time.perf_counter() - started
+        written = [writer.close() for writer in writers]
+        METRICS.observe("export.serialize", serialize_time)
+        with METRICS.timer("export.file_write"):
+            stack.close()
+
+    rows = written[0] if written else 0
+    METRICS.count("export.rows", rows)
+    METRICS.count("export.bytes_written", sum(os.path.getsize(output_file) for output_file in output_files.values()))
+    logger.info("Data export completed.")
+    return rows
+
+
+class ExportEngine:
+    """
+    Общий движок экспорта отчётов по комнатам.
+
+    Отвечает за получение строк отчёта (запрос, серверный курсор, кеш) и передаёт их
+    писателям форматов из RECORD_WRITERS. Каждый отчёт запрашивается один раз, сколько бы
+    форматов ни было запрошено.
+
+    Args:
+        db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+        stream (bool): Читать списки комнат серверным курсором и писать файлы потоково.
+        itersize (int): Количество строк, получаемых серверным курсором за один запрос.
+        compact (bool): Записывать файлы без отступов.
+        use_room_stats (bool): Читать отчёты из сводной таблицы room_stats вместо агрегации students.
+        cache (Optional[QueryCache]): Кеш результатов запросов; с ним списки комнат читаются целиком и при stream.
+        as_of (Optional[date]): Дата, на которую вычисляется возраст; по умолчанию текущая. Повторный
+            экспорт на ту же дату даёт те же файлы и может быть взят из кеша.
+        top (int): Количество комнат в отчётах о самом маленьком среднем возрасте и самой большой разнице в возрасте.
+        building (Optional[int]): Номер корпуса, которым ограничены отчёты; None означает все комнаты.
+        workers (int): Количество соединений, в которых export_all параллельно агрегирует комнаты по корпусам.
+
+    Methods:
+        fetch_report(report_name: str) -> Iterable[Tuple]:
+            Возвращает строки результата запроса отчёта.
+
+        export_report(report_name: str, output_files: Dict[str, str]) -> int:
+            Экспортирует один отчёт во все переданные файлы за один запрос.
+
+        export_all(output_dir: str = '.', formats: Sequence[str] = ("json",),
+                   reports: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, List[Dict[str, Any]]]:
+            Экспортирует все четыре отчёта, вычисленные за один запрос к базе данных.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, stream: bool = False,
+                 itersize: int = EXPORT_ITERSIZE, compact: bool = False, use_room_stats: bool = False,
+                 cache: Optional[QueryCache] = None, as_of: Optional[date] = None, top: int = TOP_ROOMS_LIMIT,
+                 building: Optional[int] = None, workers: int = 1):
+        """
+        Инициализирует экземпляр класса ExportEngine.
+
+        Args:
+            db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+            stream (bool): Читать списки комнат серверным курсором и писать файлы потоково.
+            itersize (int): Количество строк, получаемых серверным курсором за один запрос.
+            compact (bool): Записывать файлы без отступов.
+            use_room_stats (bool): Читать отчёты из сводной таблицы room_stats вместо агрегации students.
+            cache (Optional[QueryCache]): Кеш результатов запросов.
+            as_of (Optional[date]): Дата, на которую вычисляется возраст; по умолчанию текущая.
+            top (int): Количество комнат в отчётах о возрасте.
+            building (Optional[int]): Номер корпуса; None означает все комнаты.
+            workers (int): Количество соединений для параллельной агрегации в export_all.
+        """
+        self.db_manager = db_manager
+        self.stream = stream
+        self.itersize = itersize
+        self.compact = compact
+        self.use_room_stats = use_room_stats
+        self.cache = cache
+        self.as_of = as_of or date.today()
+        self.top = top
+        self.building = building
+        self.workers = workers
+        self.params = report_params(self.as_of, top, building)
+
+    def fetch_report(self, report_name: str) -> Iterable[Tuple]:
+        """
+        Выполняет запрос отчёта: в потоковом режиме без кеша возвращает ленивый поток строк
+        серверного курсора, иначе — список всех строк, из кеша, если он задан.
+
+        Args:
+            report_name (str): Имя отчёта в REPORT_QUERIES или ROOM_STATS_REPORT_QUERIES.
+
+        Returns:
+            Iterable[Tuple]: Строки результата.
+        """
+        queries = ROOM_STATS_REPORT_QUERIES if self.use_room_stats else REPORT_QUERIES
+        query = queries[report_name]
+        if self.cache is not None:
+            return self.cache.fetch(query, lambda: self._fetch_all(query), self.params)
+        if self.stream:
+            return METRICS.timed("export.fetch", self.db_manager.stream(query, self.params, self.itersize))
+        return self._fetch_all(query)
+
+    def _fetch_all(self, query: str) -> List[Tuple]:
+        """
+        Выполняет запрос и возвращает все строки результата.
+        """
+        with self.db_manager as db:
+            with db.conn.cursor() as cursor:
+                with METRICS.timer("export.query"):
+                    cursor.execute(query, self.params)
+                with METRICS.timer("export.fetch"):
+                    return cursor.fetchall()
+
+    def export_report(self, report_name: str, output_files: Dict[str, str]) -> int:
+        """
+        Экспортирует один отчёт во все переданные файлы за один запрос к базе данных.
+
+        Args:
+            report_name (str): Имя отчёта.
+            output_files (Dict[str, str]): Путь к файлу для каждого формата из RECORD_WRITERS.
+
+        Returns:
+            int: Количество экспортированных строк.
+        """
+        fields = REPORT_FIELDS[report_name]
+        records = (dict(zip(fields, row)) for row in self.fetch_report(report_name))
+        return write_records(report_name, records, output_files, self.compact)
+
+    def export_all(self, output_dir: str = '.', formats: Sequence[str] = ("json",),
+                   reports: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Экспортирует все четыре отчёта в файлы output_<отчёт>.<формат>.
+
+        Отчёты строятся из одного агрегирующего запроса по комнатам вместо четырёх отдельных.
+        С use_room_stats они читаются запросами ROOM_STATS_REPORT_QUERIES, как и при экспорте
+        отдельного отчёта, и workers не применяется.
+
+        Args:
+            output_dir (str): Каталог для сохранения файлов.
+            formats (Sequence[str]): Форматы из RECORD_WRITERS.
+            reports (Optional[Dict[str, List[Dict[str, Any]]]]): Уже вычисленные отчёты
+                (см. room_reports.derive_reports).
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Экспортированные отчёты.
+        """
+        if reports is None and self.use_room_stats:
+            reports = {
+                report_name: [dict(zip(fields, row)) for row in self.fetch_report(report_name)]
+                for report_name, fields in REPORT_FIELDS.items()
+            }
+        elif reports is None:
+            aggregates = fetch_room_aggregates(self.db_manager, self.cache, self.as_of, self.building, self.workers)
+            reports = derive_reports(aggregates, self.top)
+        for report_name, rooms_data in reports.items():
+            write_records(report_name, rooms_data, {
+                export_format: os.path.join(output_dir, f"output_{report_name}.{export_format}")
+                for export_format in formats
+            }, self.compact)
+        return reports
+
+
+def add_export_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Добавляет в парсер общие флаги экспортёров.
+
+    Args:
+        parser (argparse.ArgumentParser): Парсер аргументов командной строки.
+    """
+    parser.add_argument("--export_rooms_with_student_count", action="store_true", help="Export rooms with student count.")
+    parser.add_argument("--export_rooms_with_average_age", action="store_true", help="Export rooms with average age.")
+    parser.add_argument("--export_rooms_with_age_difference", action="store_true", help="Export rooms with age difference.")
+    parser.add_argument("--export_rooms_with_multiple_sex", action="store_true", help="Export rooms with multiple sexes.")
+    parser.add_argument("--all", action="store_true",
+                        help="Export all four reports from a single aggregate query (with --room-stats: from "
+                             "room_stats).")
+    parser.add_argument("--stream", action="store_true",
+                        help="Fetch room lists with a server-side cursor and write files as rows arrive.")
+    parser.add_argument("--itersize", type=int, default=EXPORT_ITERSIZE,
+                        help="Rows fetched per round trip by the server-side cursor.")
+    parser.add_argument("--room-stats", action="store_true",
+                        help="Read the four reports from the room_stats summary table maintained by the loader.")
+    parser.add_argument("--compact", action="store_true", help="Write files without indentation.")
+    parser.add_argument("--cache", action="store_true",
+                        help="Serve query results from the on-disk cache while the data has not been reloaded.")
+    parser.add_argument("--cache-dir", default=QUERY_CACHE_DIR, help="Directory of the query result cache.")
+    parser.add_argument("--as-of", type=date.fromisoformat,
+                        help="Date (YYYY-MM-DD) as of which ages are computed; today by default.")
+    parser.add_argument("--top", type=int, default=TOP_ROOMS_LIMIT,
+                        help="Number of rooms in the average age and age difference reports.")
+    parser.add_argument("--building", type=int,
+                        help="Export only the rooms of this building (ROOMS_PER_BUILDING consecutive room ids); "
+                             "on a partitioned schema only its students partition is scanned.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="With --all: aggregate rooms building by building over this many connections in parallel "
+                             "(not used with --room-stats).")
+    add_metrics_arguments(parser)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export room reports to several formats with one query per report.")
+    add_export_arguments(parser)
+    parser.add_argument("--format", nargs="+", choices=RECORD_WRITERS, default=["json"], help="Output formats.")
+    parser.add_argument("--output-dir", default=".", help="Directory for the output files.")
+
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
+    cache = QueryCache(args.cache_dir) if args.cache else None
+    engine = ExportEngine(db_manager, args.stream, args.itersize, args.compact, args.room_stats, cache, args.as_of,
+                          args.top, args.building, args.workers)
+
+    with instrumented(args):
+        if args.all:
+            logger.info(f"Exporting all room reports to directory: {args.output_dir}")
+            engine.export_all(args.output_dir, args.format)
+
+        for flag, report_name in REPORT_FLAGS.items():
+            if getattr(args, flag):
+                logger.info(f"Exporting {report_name} to directory: {args.output_dir}")
+                engine.export_report(report_name, {
+                    export_format: os.path.join(args.output_dir, f"output_{report_name}.{export_format}")
+                    for export_format in args.format
+                })
+
+    logger.info(f"Connection pool usage: {db_manager.pool_stats()}")
+    if cache is not None:
+        logger.info(f"Query cache: {cache.hits} hits, {cache.misses} misses")
@@ -0,0 +1,343 @@
+import json
+import re
+from decimal import Decimal
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+READ_CHUNK_SIZE = 64 * 1024
+# Наибольший размер одного элемента JSON-массива в символах: дальше буфер не растёт, а разбор прерывается
+MAX_RECORD_SIZE = 8 * 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_SCALAR_END = re.compile(r'[\s,\]]')
+
+
+def iter_json_records(file_path: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Лениво читает записи из JSON-файла по одной.
+
+    Поддерживаются файлы с массивом верхнего уровня (как в data/*.json) и файлы
+    в формате JSON Lines (одна запись на строку). Формат определяется по первому
+    значащему символу файла: файл, начинающийся не с '[', читается как JSON Lines,
+    как и файл, в первом блоке которого за законченным значением с новой строки
+    следует следующее (JSON Lines с массивами в качестве записей).
+
+    Args:
+        file_path (str): Путь к файлу.
+        chunk_size (int): Размер блока чтения в символах.
+
+    Yields:
+        Any: Очередная запись.
+
+    Raises:
+        ValueError: Если файл не является корректным JSON-массивом или JSON Lines
+            или элемент массива длиннее MAX_RECORD_SIZE символов.
+    """
+    with open(file_path, 'r') as file:
+        raw_head = file.read(chunk_size)
+        head = raw_head.lstrip(_WHITESPACE)
+        while not head and raw_head:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            raw_head += chunk
+            head = chunk.lstrip(_WHITESPACE)
+        if _is_json_lines(head):
+            file.seek(0)
+            yield from _iter_lines(file)
+        else:
+            offset = len(raw_head[:len(raw_head) - len(head) + 1].encode(file.encoding))
+            yield from _iter_array(file, head[1:], chunk_size, offset)
+
+
+def batched(records: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Разбивает поток записей на списки фиксированного размера.
+
+    Args:
+        records (Iterable[Any]): Поток записей.
+        size (int): Размер пачки; последняя пачка может быть меньше.
+
+    Yields:
+        List[Any]: Очередная пачка записей.
+    """
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def json_default(value: Any) -> Any:
+    """
+    Сериализует значения, которые json не умеет записывать сам: Decimal записывается как число.
+
+    Args:
+        value (Any): Значение, не поддерживаемое json.
+
+    Returns:
+        Any: Значение, поддерживаемое json.
+
+    Raises:
+        TypeError: Если тип значения не поддерживается.
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+
+class JsonArrayWriter:
+    """
+    Записывает JSON-массив в файл по одной записи.
+
+    С отступом результат совпадает с json.dump(records, file, indent=indent),
+    без отступа массив записывается компактно, без пробелов и переводов строк.
+
+    Args:
+        file (TextIO): Файл, открытый на запись.
+        indent (Optional[int]): Отступ или None для компактной записи.
+
+    Attributes:
+        written (int): Количество записанных элементов.
+    """
+
+    def __init__(self, file: TextIO, indent: Optional[int] = 2):
+        self.file = file
+        self.written = 0
+        if indent is None:
+            self._separator, self._prefix, self._opening, self._closing = ',', '', '[', ']'
+            self._encoder = json.JSONEncoder(separators=(',', ':'), default=json_default)
+        else:
+            self._separator, self._prefix, self._opening, self._closing = ',\n', ' ' * indent, '[\n', '\n]'
+            self._encoder = json.JSONEncoder(indent=indent, default=json_default)
+
+    def write(self, record: Any) -> None:
+        """
+        Записывает очередной элемент массива.
+
+        Args:
+            record (Any): Запись.
+        """
+        self.file.write(self._separator if self.written else self._opening)
+        self.file.write(self._prefix + self._encoder.encode(record).replace('\n', '\n' + self._prefix))
+        self.written += 1
+
+    def close(self) -> int:
+        """
+        Завершает массив. Файл не закрывается.
+
+        Returns:
+            int: Количество записанных элементов.
+        """
+        self.file.write(self._closing if self.written else '[]')
+        return self.written
+
+
+class JsonLinesWriter:
+    """
+    Записывает записи в файл в формате JSON Lines (NDJSON): по одному JSON-объекту в строке.
+
+    Args:
+        file (TextIO): Файл, открытый на запись.
+
+    Attributes:
+        written (int): Количество записанных строк.
+    """
+
+    def __init__(self, file: TextIO):
+        self.file = file
+        self.written = 0
+        self._encoder = json.JSONEncoder(default=json_default)
+
+    def write(self, record: Any) -> None:
+        """
+        Записывает очередную запись отдельной строкой.
+
+        Args:
+            record (Any): Запись.
+        """
+        self.file.write(self._encoder.encode(record) + '\n')
+        self.written += 1
+
+    def close(self) -> int:
+        """
+        Возвращает количество записанных строк. Файл не закрывается.
+
+        Returns:
+            int: Количество записанных строк.
+        """
+        return self.written
+
+
+def write_json_array(file: TextIO, records: Iterable[Any], indent: Optional[int] = 2) -> int:
+    """
+    Записывает записи в файл как JSON-массив по мере их поступления.
+
+    С отступом результат совпадает с json.dump(list(records), file, indent=indent),
+    без отступа массив записывается компактно, без пробелов и переводов строк.
+
+    Args:
+        file (TextIO): Файл, открытый на запись.
+        records (Iterable[Any]): Поток записей.
+        indent (Optional[int]): Отступ или None для компактной записи.
+
+    Returns:
+        int: Количество записанных элементов.
+    """
+    writer = JsonArrayWriter(file, indent)
+    for record in records:
+        writer.write(record)
+    return writer.close()
+
+
+def _is_json_lines(head: str) -> bool:
+    """
+    Проверяет, похоже ли начало файла на JSON Lines, а не на JSON-массив.
+
+    Args:
+        head (str): Первый блок файла без начальных пробелов.
+
+    Returns:
+        bool: True, если файл начинается не с '[' или первое значение заканчивается
+            в этом блоке и за ним с новой строки идёт следующее.
+    """
+    if not head.startswith('['):
+        return True
+    try:
+        _, end = _decoder.raw_decode(head)
+    except json.JSONDecodeError:
+        return False
+    rest = head[end:].lstrip(' \t\r')
+    return rest.startswith('\n') and bool(rest.strip(_WHITESPACE))
+
+
+def _iter_lines(file: TextIO) -> Iterator[Any]:
+    """
+    Читает записи из файла в формате JSON Lines, пропуская пустые строки.
+
+    Args:
+        file (TextIO): Файл, открытый на чтение.
+
+    Yields:
+        Any: Очередная запись.
+    """
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _iter_array(file: TextIO, buffer: str, chunk_size: int, offset: int = 0) -> Iterator[Any]:
+    """
+    Разбирает элементы JSON-массива, открывающая скобка которого уже прочитана.
+
+    В памяти держится только текущий блок файла и недочитанный остаток элемента, не длиннее
+    MAX_RECORD_SIZE символов. Пока элемент не дочитан, блоки чтения удваиваются, поэтому
+    повторный разбор растущего остатка занимает линейное время.
+
+    Args:
+        file (TextIO): Файл, из которого дочитываются данные.
+        buffer (str): Уже прочитанные данные после открывающей скобки.
+        chunk_size (int): Размер блока чтения в символах.
+        offset (int): Смещение начала buffer в файле в байтах, для сообщений об ошибках.
+
+    Yields:
+        Any: Очередной элемент массива.
+
+    Raises:
+        ValueError: Если массив некорректен или элемент длиннее MAX_RECORD_SIZE символов.
+    """
+    pos = 0
+    eof = False
+    expect_comma = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise ValueError("Unexpected end of JSON array")
+            buffer, pos, eof, offset = _refill(file, buffer, pos, chunk_size, offset)
+            continue
+
+        char = buffer[pos]
+        if char == ']':
+            return
+        if expect_comma:
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' in JSON array at byte "
+                                 f"{_byte_offset(file, buffer, pos, offset)}, got {char!r}")
+            pos += 1
+            expect_comma = False
+            continue
+
+        if not eof and char not in '{["' and not _SCALAR_END.search(buffer, pos):
+            # Число или литерал на границе блока может продолжаться в следующем блоке
+            buffer, pos, eof, offset = _refill_record(file, buffer, pos, chunk_size, offset)
+            continue
+
+        try:
+            record, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as error:
+            if eof:
+                raise ValueError(f"Invalid JSON array element at byte {_byte_offset(file, buffer, pos, offset)}: "
+                                 f"{error.msg}") from None
+            buffer, pos, eof, offset = _refill_record(file, buffer, pos, chunk_size, offset)
+            continue
+
+        yield record
+        pos = end
+        expect_comma = True
+
+
+def _byte_offset(file: TextIO, buffer: str, pos: int, offset: int) -> int:
+    """
+    Возвращает смещение позиции pos буфера в файле в байтах.
+    """
+    return offset + len(buffer[:pos].encode(file.encoding))
+
+
+def _refill_record(file: TextIO, buffer: str, pos: int, chunk_size: int,
+                   offset: int) -> Tuple[str, int, bool, int]:
+    """
+    Дочитывает файл для элемента, не поместившегося в буфер.
+
+    Блок чтения не меньше уже прочитанной части элемента, поэтому при каждом повторе размер
+    буфера как минимум удваивается.
+
+    Args:
+        file (TextIO): Файл, из которого дочитываются данные.
+        buffer (str): Текущий буфер.
+        pos (int): Позиция начала элемента.
+        chunk_size (int): Размер блока чтения в символах.
+        offset (int): Смещение начала буфера в файле в байтах.
+
+    Returns:
+        Tuple[str, int, bool, int]: Новый буфер, позиция в нём, признак конца файла и смещение буфера.
+
+    Raises:
+        ValueError: Если элемент длиннее MAX_RECORD_SIZE символов.
+    """
+    if len(buffer) - pos > MAX_RECORD_SIZE:
+        raise ValueError(f"JSON array element at byte {_byte_offset(file, buffer, pos, offset)} is malformed "
+                         f"or longer than {MAX_RECORD_SIZE} characters")
+    return _refill(file, buffer, pos, max(chunk_size, len(buffer) - pos), offset)
+
+
+def _refill(file: TextIO, buffer: str, pos: int, chunk_size: int, offset: int) -> Tuple[str, int, bool, int]:
+    """
+    Отбрасывает разобранную часть буфера и дочитывает следующий блок файла.
+
+    Args:
+        file (TextIO): Файл, из которого дочитываются данные.
+        buffer (str): Текущий буфер.
+        pos (int): Позиция начала неразобранных данных.
+        chunk_size (int): Размер блока чтения в символах.
+        offset (int): Смещение начала буфера в файле в байтах.
+
+    Returns:
+        Tuple[str, int, bool, int]: Новый буфер, позиция в нём, признак конца файла и смещение буфера.
+    """
+    chunk = file.read(chunk_size)
+    return buffer[pos:] + chunk, 0, not chunk, _byte_offset(file, buffer, pos, offset)
@@ -0,0 +1,102 @@
+import logging
+import os
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+LOAD_CHECKPOINT_QUERY = """
+    SELECT size, mtime_ns, records, rows_written, unlogged FROM load_checkpoints WHERE source = %s;
+"""
+
+SAVE_LOAD_CHECKPOINT_SQL = """
+    INSERT INTO load_checkpoints (source, size, mtime_ns, records, rows_written, unlogged)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (source) DO UPDATE SET size = EXCLUDED.size, mtime_ns = EXCLUDED.mtime_ns,
+        records = EXCLUDED.records, rows_written = EXCLUDED.rows_written, unlogged = EXCLUDED.unlogged,
+        updated_at = now();
+"""
+
+CLEAR_LOAD_CHECKPOINT_SQL = "DELETE FROM load_checkpoints WHERE source = %s;"
+
+
+class LoadCheckpoint:
+    """
+    Контрольная точка пакетной загрузки студентов в таблице load_checkpoints.
+
+    Загрузчик записывает, сколько записей входного файла уже загружено, тем же курсором и в той же
+    транзакции, что и сами записи, поэтому после сбоя контрольная точка всегда соответствует
+    зафиксированным строкам. Прерванная загрузка того же файла продолжается с этой записи, а не
+    с начала. Файл источника определяется по абсолютному пути, размеру и времени изменения,
+    поэтому контрольная точка изменившегося файла не применяется. Методы не фиксируют транзакцию.
+
+    Methods:
+        load(cursor, students_file_path: str) -> Optional[Dict[str, Any]]:
+            Возвращает состояние прерванной загрузки файла или None.
+
+        save(cursor, students_file_path: str, records: int, rows_written: int, unlogged: bool) -> None:
+            Записывает состояние загрузки файла.
+
+        clear(cursor, students_file_path: str) -> None:
+            Удаляет контрольную точку после завершения загрузки.
+    """
+
+    @staticmethod
+    def _source(students_file_path: str) -> Dict[str, Any]:
+        """
+        Возвращает признаки файла источника: абсолютный путь, размер и время изменения.
+        """
+        stat = os.stat(students_file_path)
+        return {"path": os.path.abspath(students_file_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def load(self, cursor, students_file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает состояние прерванной загрузки файла.
+
+        Args:
+            cursor: Курсор базы данных.
+            students_file_path (str): Путь к загружаемому файлу студентов.
+
+        Returns:
+            Optional[Dict[str, Any]]: Состояние (records, rows_written, unlogged) или None,
+                если контрольной точки нет.
+
+        Raises:
+            ValueError: Если файл изменился после записи контрольной точки.
+        """
+        source = self._source(students_file_path)
+        cursor.execute(LOAD_CHECKPOINT_QUERY, (source["path"],))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        size, mtime_ns, records, rows_written, unlogged = row
+        if (size, mtime_ns) != (source["size"], source["mtime_ns"]):
+            raise ValueError(f"Checkpoint of {source['path']} was written before the file changed; delete its row "
+                             f"from load_checkpoints and clear the loaded tables to start the load over")
+        return {"records": records, "rows_written": rows_written, "unlogged": unlogged}
+
+    def save(self, cursor, students_file_path: str, records: int, rows_written: int, unlogged: bool) -> None:
+        """
+        Записывает состояние загрузки файла в текущей транзакции.
+
+        Args:
+            cursor: Курсор базы данных.
+            students_file_path (str): Путь к загружаемому файлу студентов.
+            records (int): Количество загруженных записей файла.
+            rows_written (int): Количество вставленных строк.
+            unlogged (bool): Загружаются ли студенты в нежурналируемую таблицу.
+        """
+        source = self._source(students_file_path)
+        cursor.execute(SAVE_LOAD_CHECKPOINT_SQL, (source["path"], source["size"], source["mtime_ns"],
+                                                  records, rows_written, unlogged))
+
+    def clear(self, cursor, students_file_path: str) -> None:
+        """
+        Удаляет контрольную точку файла в текущей транзакции.
+
+        Args:
+            cursor: Курсор базы данных.
+            students_file_path (str): Путь к загруженному файлу студентов.
+        """
+        cursor.execute(CLEAR_LOAD_CHECKPOINT_SQL, (os.path.abspath(students_file_path),))
+        if cursor.rowcount:
+            logger.info(f"Removed load checkpoint of {students_file_path}")
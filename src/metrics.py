@@ -0,0 +1,267 @@
+import argparse
+import cProfile
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Префикс имён метрик в формате Prometheus
+METRICS_PREFIX = "dormitory"
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+# Файлы результатов профилирования по умолчанию
+PROFILE_FILES = {"cprofile": "profile.pstats", "tracemalloc": "tracemalloc.txt"}
+
+
+class Metrics:
+    """
+    Реестр метрик процесса: суммарное время и число вызовов по фазам и счётчики.
+
+    Фазы называются "<область>.<фаза>", например load.parse или export.fetch; время фазы
+    суммируется по всем её вызовам, в том числе из разных потоков. Счётчики — количество
+    строк и байт, например export.rows или export.bytes_written.
+
+    Methods:
+        timer(phase: str) -> ContextManager[None]:
+            Измеряет время выполнения блока и добавляет его к фазе.
+
+        observe(phase: str, seconds: float, calls: int = 1) -> None:
+            Добавляет измеренное время к фазе.
+
+        timed(phase: str, iterable: Iterable[Any]) -> Iterator[Any]:
+            Возвращает элементы iterable, добавляя время получения каждого к фазе.
+
+        count(name: str, value: int = 1) -> None:
+            Увеличивает счётчик.
+
+        snapshot() -> Dict[str, Any]:
+            Возвращает текущие значения метрик.
+
+        reset() -> None:
+            Обнуляет все метрики.
+
+        write(metrics_file: str) -> None:
+            Записывает метрики в файл Prometheus (.prom) или JSON.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings: Dict[str, list] = {}
+        self._counters: Dict[str, int] = {}
+
+    @contextmanager
+    def timer(self, phase: str) -> Iterator[None]:
+        """
+        Измеряет время выполнения блока и добавляет его к фазе.
+
+        Args:
+            phase (str): Имя фазы.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - started)
+
+    def observe(self, phase: str, seconds: float, calls: int = 1) -> None:
+        """
+        Добавляет измеренное время к фазе.
+
+        Args:
+            phase (str): Имя фазы.
+            seconds (float): Время в секундах.
+            calls (int): Количество измеренных вызовов.
+        """
+        with self._lock:
+            timing = self._timings.setdefault(phase, [0.0, 0])
+            timing[0] += seconds
+            timing[1] += calls
+
+    def timed(self, phase: str, iterable: Iterable[Any]) -> Iterator[Any]:
+        """
+        Возвращает элементы iterable, добавляя к фазе только время их получения,
+        но не время обработки элементов вызывающим кодом.
+
+        Args:
+            phase (str): Имя фазы.
+            iterable (Iterable[Any]): Поток элементов, например пачек разобранных записей.
+
+        Yields:
+            Any: Очередной элемент.
+        """
+        iterator = iter(iterable)
+        elapsed = 0.0
+        calls = 0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                    calls += 1
+                yield item
+        finally:
+            self.observe(phase, elapsed, calls)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """
+        Увеличивает счётчик.
+
+        Args:
+            name (str): Имя счётчика.
+            value (int): Приращение.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Возвращает текущие значения метрик.
+
+        Returns:
+            Dict[str, Any]: {"phases": {фаза: {"seconds", "calls"}}, "counters": {счётчик: значение}}.
+        """
+        with self._lock:
+            return {
+                "phases": {phase: {"seconds": seconds, "calls": calls}
+                           for phase, (seconds, calls) in sorted(self._timings.items())},
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def reset(self) -> None:
+        """
+        Обнуляет все метрики.
+        """
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+    def to_prometheus(self) -> str:
+        """
+        Возвращает метрики в текстовом формате Prometheus.
+
+        Returns:
+            str: Текст метрик.
+        """
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {METRICS_PREFIX}_phase_seconds_total Time spent in each phase.",
+            f"# TYPE {METRICS_PREFIX}_phase_seconds_total counter",
+        ]
+        lines += [f'{METRICS_PREFIX}_phase_seconds_total{{phase="{phase}"}} {timing["seconds"]:.6f}'
+                  for phase, timing in snapshot["phases"].items()]
+        lines += [
+            f"# HELP {METRICS_PREFIX}_phase_calls_total Number of timed calls of each phase.",
+            f"# TYPE {METRICS_PREFIX}_phase_calls_total counter",
+        ]
+        lines += [f'{METRICS_PREFIX}_phase_calls_total{{phase="{phase}"}} {timing["calls"]}'
+                  for phase, timing in snapshot["phases"].items()]
+        for name, value in snapshot["counters"].items():
+            metric = f"{METRICS_PREFIX}_{name.replace('.', '_')}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self, metrics_file: str) -> None:
+        """
+        Записывает метрики в файл: в формате Prometheus, если расширение .prom, иначе в JSON.
+
+        Args:
+            metrics_file (str): Путь к файлу метрик.
+        """
+        with open(metrics_file, 'w') as file:
+            if metrics_file.endswith(".prom"):
+                file.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), file, indent=2)
+        logger.info(f"Metrics written to file: {metrics_file}")
+
+
+# Метрики текущего процесса
+METRICS = Metrics()
+
+
+@contextmanager
+def profiling(mode: Optional[str], output_file: Optional[str] = None) -> Iterator[None]:
+    """
+    Профилирует блок через cProfile или tracemalloc.
+
+    cProfile сохраняет статистику в формате pstats и выводит в журнал самые затратные функции;
+    tracemalloc записывает в файл места с наибольшим объёмом выделенной памяти и выводит
+    в журнал пиковый объём.
+
+    Args:
+        mode (Optional[str]): "cprofile", "tracemalloc" или None (без профилирования).
+        output_file (Optional[str]): Файл результатов; по умолчанию из PROFILE_FILES.
+    """
+    if mode is None:
+        yield
+        return
+    output_file = output_file or PROFILE_FILES[mode]
+
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(output_file)
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(15)
+            logger.info(f"cProfile stats written to file: {output_file}\n{report.getvalue()}")
+    elif mode == "tracemalloc":
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(output_file, 'w') as file:
+                file.write(f"Peak traced memory: {peak} bytes\n")
+                for statistic in snapshot.statistics("lineno")[:25]:
+                    file.write(f"{statistic}\n")
+            logger.info(f"Peak traced memory {peak / 1024 / 1024:.1f} MiB, allocations written to file: {output_file}")
+    else:
+        raise ValueError(f"Unsupported profile mode: {mode}")
+
+
+def add_metrics_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Добавляет в парсер флаги метрик и профилирования.
+
+    Args:
+        parser (argparse.ArgumentParser): Парсер аргументов командной строки.
+    """
+    parser.add_argument("--metrics-file",
+                        help="Write phase timings, row and byte counts to this file "
+                             "(Prometheus text format if it ends with .prom, JSON otherwise).")
+    parser.add_argument("--profile", choices=PROFILE_MODES, help="Profile the run with cProfile or tracemalloc.")
+    parser.add_argument("--profile-file", help="Output file of the profiler.")
+
+
+@contextmanager
+def instrumented(args: argparse.Namespace) -> Iterator[None]:
+    """
+    Выполняет блок с профилированием и записью метрик по флагам add_metrics_arguments.
+
+    Args:
+        args (argparse.Namespace): Разобранные аргументы командной строки.
+    """
+    try:
+        with profiling(args.profile, args.profile_file):
+            yield
+    finally:
+        if args.metrics_file:
+            METRICS.write(args.metrics_file)
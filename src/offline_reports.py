@@ -0,0 +1,270 @@
+import argparse
+import logging
+import os
+from array import array
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import LOAD_BATCH_SIZE, TOP_ROOMS_LIMIT
+from export_engine import RECORD_WRITERS, write_records
+from json_stream import batched, iter_json_records
+from metrics import METRICS, add_metrics_arguments, instrumented
+from room_reports import RoomAggregate, date_key, derive_reports
+from student_validation import validate_students
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Минимальное количество значащих цифр частного numeric в PostgreSQL (NUMERIC_MIN_SIG_DIGITS)
+NUMERIC_MIN_SIG_DIGITS = 16
+
+
+def numeric_average(total: int, count: int) -> Decimal:
+    """
+    Делит сумму целых чисел на их количество так же, как AVG(numeric) в PostgreSQL:
+    с тем же числом знаков после запятой и округлением половины от нуля.
+
+    Args:
+        total (int): Неотрицательная сумма.
+        count (int): Положительное количество.
+
+    Returns:
+        Decimal: Среднее значение.
+    """
+    def weight_and_first_digit(value: int):
+        # Вес старшей цифры и сама цифра в представлении numeric по основанию 10000
+        if value == 0:
+            return 0, 0
+        weight = (len(str(value)) - 1) // 4
+        return weight, value // 10000 ** weight
+
+    weight1, first_digit1 = weight_and_first_digit(total)
+    weight2, first_digit2 = weight_and_first_digit(count)
+    quotient_weight = weight1 - weight2
+    if first_digit1 <= first_digit2:
+        quotient_weight -= 1
+    scale = max(NUMERIC_MIN_SIG_DIGITS - quotient_weight * 4, 0)
+
+    scaled, remainder = divmod(total * 10 ** scale, count)
+    if remainder * 2 >= count:
+        scaled += 1
+    return Decimal(scaled).scaleb(-scale)
+
+
+def ages_in_years(birthdays: np.ndarray, as_of: date) -> np.ndarray:
+    """
+    Вычисляет возраст в полных годах, как (as_of_key - birthday_key) / 10000 в запросах отчётов.
+
+    Args:
+        birthdays (np.ndarray): Даты рождения в днях от 1970-01-01.
+        as_of (date): Дата, на которую вычисляется возраст.
+
+    Returns:
+        np.ndarray: Возраст каждого студента (int64).
+    """
+    days = birthdays.astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    years = days.astype('datetime64[Y]').astype(np.int64) + 1970
+    birthday_keys = years * 10000 + (months.astype(np.int64) % 12 + 1) * 100 + (days - months).astype(np.int64) + 1
+    # Целочисленное деление в PostgreSQL отбрасывает дробную часть и для отрицательных чисел
+    differences = date_key(as_of) - birthday_keys
+    return np.sign(differences) * (np.abs(differences) // 10000)
+
+
+class OfflineRoomReports:
+    """
+    Вычисляет отчёты по комнатам из JSON-файлов в памяти, без базы данных.
+
+    Студенты хранятся компактными столбцами: room_id (int32), дата рождения в днях
+    от 1970-01-01 (int32) и пол (uint8, 1 — M). Показатели комнат считаются векторно
+    (numpy.bincount и ufunc.at) и передаются в room_reports.derive_reports, поэтому
+    отчёты совпадают с DataExporterJson. Записи, не прошедшие validate_students, пропускаются,
+    как при загрузке в базу данных.
+
+    Args:
+        as_of (Optional[date]): Дата, на которую вычисляется возраст; по умолчанию текущая.
+        top (int): Количество комнат в отчётах о самом маленьком среднем возрасте и самой большой разнице в возрасте.
+
+    Attributes:
+        rejected_count (int): Количество пропущенных записей о студентах.
+
+    Methods:
+        load(rooms_file_path: str, students_file_path: str, batch_size: int = LOAD_BATCH_SIZE) -> None:
+            Читает комнаты и студентов из JSON-файлов.
+
+        room_aggregates() -> List[RoomAggregate]:
+            Вычисляет показатели всех комнат.
+
+        reports() -> Dict[str, List[Dict[str, Any]]]:
+            Строит четыре отчёта по комнатам.
+
+        export_all(output_dir: str = '.', formats: Sequence[str] = ("json",)) -> None:
+            Экспортирует четыре отчёта в файлы output_<отчёт>.<формат>.
+    """
+
+    def __init__(self, as_of: Optional[date] = None, top: int = TOP_ROOMS_LIMIT):
+        """
+        Инициализирует экземпляр класса OfflineRoomReports.
+
+        Args:
+            as_of (Optional[date]): Дата, на которую вычисляется возраст; по умолчанию текущая.
+            top (int): Количество комнат в отчётах о возрасте.
+        """
+        self.as_of = as_of or date.today()
+        self.top = top
+        self.room_ids = np.empty(0, dtype=np.int32)
+        self.room_names: List[str] = []
+        self.student_room_ids = np.empty(0, dtype=np.int32)
+        self.student_birthdays = np.empty(0, dtype=np.int32)
+        self.student_sexes = np.empty(0, dtype=np.uint8)
+        self.rejected_count = 0
+
+    def load(self, rooms_file_path: str, students_file_path: str, batch_size: int = LOAD_BATCH_SIZE) -> None:
+        """
+        Читает комнаты и студентов из JSON-файлов (массив или JSON Lines).
+
+        Args:
+            rooms_file_path (str): Путь к файлу с данными о комнатах.
+            students_file_path (str): Путь к файлу с данными о студентах.
+            batch_size (int): Количество студентов, проверяемых за один раз.
+        """
+        logger.info(f"Loading rooms from {rooms_file_path} and students from {students_file_path}")
+        rooms = {room['id']: room['name'] for room in iter_json_records(rooms_file_path)}
+        self.room_ids = np.array(sorted(rooms), dtype=np.int32)
+        self.room_names = [rooms[room_id] for room_id in sorted(rooms)]
+
+        room_ids = set(rooms)
+        student_room_ids = array('i')
+        student_birthdays = array('i')
+        student_sexes = array('B')
+        for batch in METRICS.timed("load.parse", batched(iter_json_records(students_file_path), batch_size)):
+            with METRICS.timer("load.transform"):
+                rows, rejected = validate_students(batch, room_ids)
+                self.rejected_count += len(rejected)
+                student_room_ids.extend(row[4] for row in rows)
+                student_birthdays.extend(row[2].toordinal() - EPOCH_ORDINAL for row in rows)
+                student_sexes.extend(row[3] == 'M' for row in rows)
+
+        self.student_room_ids = np.frombuffer(student_room_ids, dtype=np.int32)
+        self.student_birthdays = np.frombuffer(student_birthdays, dtype=np.int32)
+        self.student_sexes = np.frombuffer(student_sexes, dtype=np.uint8)
+        if self.rejected_count:
+            logger.warning(f"Skipped {self.rejected_count} invalid student records")
+        logger.info(f"Loaded {len(self.room_ids)} rooms and {len(self.student_room_ids)} students")
+
+    def _room_indexes(self) -> np.ndarray:
+        """
+        Возвращает для каждого студента номер его комнаты в self.room_ids.
+
+        При плотных идентификаторах комнат используется таблица соответствия, иначе — двоичный поиск.
+        """
+        if not len(self.room_ids):
+            return np.empty(0, dtype=np.intp)
+        low, high = int(self.room_ids[0]), int(self.room_ids[-1])
+        if high - low > 16 * len(self.room_ids):
+            return np.searchsorted(self.room_ids, self.student_room_ids)
+        lookup = np.zeros(high - low + 1, dtype=np.intp)
+        lookup[self.room_ids - low] = np.arange(len(self.room_ids))
+        return lookup[self.student_room_ids - low]
+
+    def _ages(self) -> np.ndarray:
+        """
+        Возвращает возраст каждого студента. Возраст вычисляется один раз для каждого дня
+        в диапазоне дат рождения и затем выбирается по таблице.
+        """
+        if not len(self.student_birthdays):
+            return np.empty(0, dtype=np.int64)
+        low = int(self.student_birthdays.min())
+        high = int(self.student_birthdays.max())
+        ages = ages_in_years(np.arange(low, high + 1, dtype=np.int32), self.as_of)
+        return ages[self.student_birthdays - low]
+
+    def room_aggregates(self) -> List[RoomAggregate]:
+        """
+        Вычисляет показатели всех комнат, как room_reports.ROOM_AGGREGATES_QUERY.
+
+        Returns:
+            List[RoomAggregate]: Показатели комнат, упорядоченные по id.
+        """
+        room_count = len(self.room_ids)
+        rooms = self._room_indexes()
+
+        counts = np.bincount(rooms, minlength=room_count)
+        male_counts = np.bincount(rooms, weights=self.student_sexes, minlength=room_count).astype(np.int64)
+        age_sums = np.bincount(rooms, weights=self._ages(), minlength=room_count).astype(np.int64)
+
+        # Возраст не растёт с датой рождения: младший в комнате — с самой поздней датой рождения
+        earliest = np.full(room_count, np.iinfo(np.int32).max, dtype=np.int32)
+        latest = np.full(room_count, np.iinfo(np.int32).min, dtype=np.int32)
+        np.minimum.at(earliest, rooms, self.student_birthdays)
+        np.maximum.at(latest, rooms, self.student_birthdays)
+        occupied = counts > 0
+        age_maxs = ages_in_years(np.where(occupied, earliest, 0), self.as_of)
+        age_mins = ages_in_years(np.where(occupied, latest, 0), self.as_of)
+
+        aggregates = []
+        for index, (room_id, name) in enumerate(zip(self.room_ids.tolist(), self.room_names)):
+            count = int(counts[index])
+            if not count:
+                aggregates.append(RoomAggregate(room_id, name, 0, None, None, None, None, 0))
+                continue
+            male_count = int(male_counts[index])
+            age_sum = int(age_sums[index])
+            aggregates.append(RoomAggregate(
+                room_id, name, count, Decimal(age_sum), numeric_average(age_sum, count),
+                Decimal(int(age_mins[index])), Decimal(int(age_maxs[index])),
+                (male_count > 0) + (male_count < count),
+            ))
+        return aggregates
+
+    def reports(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Строит четыре отчёта по комнатам.
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Строки отчётов, как room_reports.derive_reports.
+        """
+        with METRICS.timer("offline.aggregate"):
+            return derive_reports(self.room_aggregates(), self.top)
+
+    def export_all(self, output_dir: str = '.', formats: Sequence[str] = ("json",)) -> None:
+        """
+        Экспортирует четыре отчёта в файлы output_<отчёт>.<формат>.
+
+        Args:
+            output_dir (str): Каталог для сохранения файлов.
+            formats (Sequence[str]): Форматы из RECORD_WRITERS.
+        """
+        logger.info(f"Exporting all room reports to directory: {output_dir}")
+        for report_name, rooms_data in self.reports().items():
+            write_records(report_name, rooms_data, {
+                export_format: os.path.join(output_dir, f"output_{report_name}.{export_format}")
+                for export_format in formats
+            })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the room reports from JSON files without a database.")
+    parser.add_argument("rooms_file", type=str, help="Path to the rooms JSON file.")
+    parser.add_argument("students_file", type=str, help="Path to the students JSON file.")
+    parser.add_argument("--output-dir", default=".", help="Directory for the output files.")
+    parser.add_argument("--format", nargs="+", choices=RECORD_WRITERS, default=["json"], help="Output formats.")
+    parser.add_argument("--batch-size", type=int, default=LOAD_BATCH_SIZE,
+                        help="Number of students validated at once.")
+    parser.add_argument("--as-of", type=date.fromisoformat,
+                        help="Date (YYYY-MM-DD) as of which ages are computed; today by default.")
+    parser.add_argument("--top", type=int, default=TOP_ROOMS_LIMIT,
+                        help="Number of rooms in the average age and age difference reports.")
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+
+    engine = OfflineRoomReports(args.as_of, args.top)
+    with instrumented(args):
+        engine.load(args.rooms_file, args.students_file, args.batch_size)
+        engine.export_all(args.output_dir, args.format)
@@ -0,0 +1,272 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config import QUERY_CACHE_DIR, QUERY_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+_VERSION_FILE = "version"
+_ENTRY_SUFFIX = ".json"
+
+
+def _encode_value(value: Any) -> Dict[str, str]:
+    """
+    Представляет значения, которых нет в JSON, объектом с тегом типа.
+    """
+    if isinstance(value, Decimal):
+        return {"$decimal": str(value)}
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cannot cache a value of type {type(value).__name__}")
+
+
+def _decode_value(obj: Dict[str, Any]) -> Any:
+    """
+    Восстанавливает значение из объекта с тегом типа.
+    """
+    if len(obj) == 1:
+        (tag, value), = obj.items()
+        if tag == "$decimal":
+            return Decimal(value)
+        if tag == "$datetime":
+            return datetime.fromisoformat(value)
+        if tag == "$date":
+            return date.fromisoformat(value)
+    return obj
+
+
+class QueryCache:
+    """
+    Кеш результатов запросов на диске, общий для отдельных запусков экспортёров.
+
+    Ключ записи — текст запроса, его параметры и штамп версии данных. Загрузчик
+    меняет штамп после каждой зафиксированной загрузки (bump_version), поэтому записи,
+    сделанные до загрузки, больше не находятся. Версия хранится в том же каталоге, так что
+    попадание в кеш не требует обращения к базе данных. Размер кеша ограничен max_bytes:
+    при превышении удаляются давно не использованные записи (LRU по времени изменения файла).
+
+    Кеш корректен, только пока данные меняются через DataLoader с тем же cache_dir.
+
+    Записи хранятся в JSON: Decimal, date и datetime сохраняются объектами с тегом типа, поэтому
+    чтение записи не выполняет кода. Каталог создаётся с правами 0700; каталог другого пользователя
+    или доступный на запись группе и остальным отвергается.
+
+    Args:
+        cache_dir (str): Каталог кеша.
+        max_bytes (int): Максимальный суммарный размер записей в байтах.
+
+    Attributes:
+        hits (int): Количество запросов, результат которых найден в кеше.
+        misses (int): Количество запросов, выполненных в базе данных.
+
+    Methods:
+        data_version() -> str:
+            Возвращает текущий штамп версии данных.
+
+        bump_version() -> str:
+            Устанавливает новый штамп версии и удаляет устаревшие записи.
+
+        fetch(query: str, fetch_rows: Callable[[], List[Tuple]], params: Optional[Sequence[Any]] = None) -> List[Tuple]:
+            Возвращает строки результата из кеша или выполняет запрос и сохраняет его результат.
+
+        get(query: str, params: Optional[Sequence[Any]] = None, version: Optional[str] = None) -> Optional[List[Tuple]]:
+            Возвращает закешированные строки результата или None.
+
+        put(query: str, params: Optional[Sequence[Any]], rows: List[Tuple], version: Optional[str] = None) -> None:
+            Сохраняет строки результата запроса.
+    """
+
+    def __init__(self, cache_dir: str = QUERY_CACHE_DIR, max_bytes: int = QUERY_CACHE_MAX_BYTES):
+        """
+        Инициализирует экземпляр класса QueryCache.
+
+        Args:
+            cache_dir (str): Каталог кеша.
+            max_bytes (int): Максимальный суммарный размер записей в байтах.
+
+        Raises:
+            PermissionError: Если каталог принадлежит другому пользователю или доступен на запись другим.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._prepare_dir()
+
+    def _prepare_dir(self) -> None:
+        """
+        Создаёт каталог кеша с правами 0700 и проверяет владельца и права существующего каталога.
+        """
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        stat = os.stat(self.cache_dir)
+        if hasattr(os, "getuid") and stat.st_uid != os.getuid():
+            raise PermissionError(f"Query cache directory {self.cache_dir} is owned by another user")
+        if stat.st_mode & 0o022:
+            raise PermissionError(f"Query cache directory {self.cache_dir} is writable by other users; "
+                                  f"run chmod 700 on it")
+
+    def data_version(self) -> str:
+        """
+        Возвращает текущий штамп версии данных.
+
+        Returns:
+            str: Штамп версии или пустая строка, если загрузок ещё не было.
+        """
+        try:
+            with open(os.path.join(self.cache_dir, _VERSION_FILE), 'r') as file:
+                return file.read().strip()
+        except FileNotFoundError:
+            return ''
+
+    def bump_version(self) -> str:
+        """
+        Устанавливает новый уникальный штамп версии данных и удаляет записи прежних версий.
+
+        Returns:
+            str: Новый штамп версии.
+        """
+        version = uuid.uuid4().hex
+        self._write_atomic(_VERSION_FILE, version.encode())
+        for entry in self._entries():
+            if not entry.name.startswith(version):
+                self._remove(entry.path)
+        logger.info(f"Query cache version bumped to {version}")
+        return version
+
+    def fetch(self, query: str, fetch_rows: Callable[[], List[Tuple]],
+              params: Optional[Sequence[Any]] = None) -> List[Tuple]:
+        """
+        Возвращает строки результата из кеша или выполняет запрос и сохраняет его результат.
+
+        Версия данных читается до выполнения запроса: если загрузка завершится во время
+        запроса, результат будет сохранён под прежней версией и больше не будет найден.
+
+        Args:
+            query (str): Текст запроса.
+            fetch_rows (Callable[[], List[Tuple]]): Функция, выполняющая запрос в базе данных.
+            params (Optional[Sequence[Any]]): Параметры запроса.
+
+        Returns:
+            List[Tuple]: Строки результата.
+        """
+        version = self.data_version()
+        rows = self.get(query, params, version)
+        if rows is None:
+            rows = fetch_rows()
+            self.put(query, params, rows, version)
+        return rows
+
+    def get(self, query: str, params: Optional[Sequence[Any]] = None,
+            version: Optional[str] = None) -> Optional[List[Tuple]]:
+        """
+        Возвращает закешированные строки результата запроса.
+
+        Args:
+            query (str): Текст запроса.
+            params (Optional[Sequence[Any]]): Параметры запроса.
+            version (Optional[str]): Штамп версии данных; по умолчанию текущий.
+
+        Returns:
+            Optional[List[Tuple]]: Строки результата или None, если записи нет.
+        """
+        path = os.path.join(self.cache_dir, self._entry_name(query, params, version))
+        try:
+            with open(path, 'rb') as file:
+                rows = [tuple(row) for row in json.load(file, object_hook=_decode_value)]
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (ValueError, TypeError):
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        # Время изменения файла — время последнего использования для вытеснения LRU
+        os.utime(path)
+        self.hits += 1
+        return rows
+
+    def put(self, query: str, params: Optional[Sequence[Any]], rows: List[Tuple],
+            version: Optional[str] = None) -> None:
+        """
+        Сохраняет строки результата запроса и вытесняет старые записи при превышении max_bytes.
+
+        Args:
+            query (str): Текст запроса.
+            params (Optional[Sequence[Any]]): Параметры запроса.
+            rows (List[Tuple]): Строки результата.
+            version (Optional[str]): Штамп версии данных, для которой получен результат; по умолчанию текущий.
+        """
+        data = json.dumps(rows, default=_encode_value, separators=(',', ':')).encode()
+        if len(data) > self.max_bytes:
+            return
+        self._write_atomic(self._entry_name(query, params, version), data)
+        self._evict()
+
+    def _entry_name(self, query: str, params: Optional[Sequence[Any]], version: Optional[str]) -> str:
+        """
+        Возвращает имя файла записи: штамп версии и хеш запроса с параметрами.
+        """
+        if version is None:
+            version = self.data_version()
+        digest = hashlib.sha256(repr((query, params)).encode()).hexdigest()
+        return f"{version}-{digest}{_ENTRY_SUFFIX}"
+
+    def _entries(self) -> List[os.DirEntry]:
+        """
+        Возвращает файлы записей кеша.
+        """
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                return [entry for entry in entries if entry.name.endswith(_ENTRY_SUFFIX)]
+        except FileNotFoundError:
+            return []
+
+    def _evict(self) -> None:
+        """
+        Удаляет давно не использованные записи, пока суммарный размер превышает max_bytes.
+        """
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _write_atomic(self, name: str, data: bytes) -> None:
+        """
+        Записывает файл в каталог кеша через временный файл, чтобы читатели не видели его частично.
+        """
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, os.path.join(self.cache_dir, name))
+        except BaseException:
+            self._remove(temp_path)
+            raise
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
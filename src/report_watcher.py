@@ -0,0 +1,382 @@
+import argparse
+import logging
+import os
+import select
+import signal
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import psycopg2
+
+from config import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER, TOP_ROOMS_LIMIT, WATCH_DEBOUNCE, WATCH_MAX_DELAY
+from database_manager import DatabaseManager
+from export_engine import RECORD_WRITERS, write_records
+from metrics import METRICS, add_metrics_arguments, instrumented
+from room_reports import (REPORT_BUILDERS, ROOM_AGGREGATES_BY_ID_QUERY, TOP_REPORT_KEYS, RoomAggregate,
+                          building_room_range, fetch_room_aggregates, report_params)
+from schema import ROOM_CHANGES_ALL, ROOM_CHANGES_CHANNEL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько секунд ждать уведомлений, пока изменений нет: с этим интервалом проверяются остановка и смена даты
+WATCH_IDLE_TIMEOUT = 1.0
+
+# Через сколько секунд повторять подключение после разрыва соединения
+WATCH_RECONNECT_DELAY = 1.0
+
+# Показатели комнаты, от которых зависит каждый отчёт: отчёт перестраивается, только если
+# у изменившейся комнаты отличается хотя бы один из них
+REPORT_DEPENDENCIES: Dict[str, Callable[[RoomAggregate], Tuple]] = {
+    "rooms_with_student_count": lambda room: (room.name, room.student_count),
+    "rooms_with_average_age": lambda room: (room.name, room.student_count, room.age_avg),
+    "rooms_with_age_difference": lambda room: (room.name, room.student_count, room.age_min, room.age_max),
+    "rooms_with_multiple_sex": lambda room: (room.name, room.sex_count > 1),
+}
+
+
+class LiveRoomReports:
+    """
+    Отчёты по комнатам в памяти, обновляемые по показателям только изменившихся комнат.
+
+    Отчёт перестраивается, только если у изменившейся комнаты отличаются показатели, от которых
+    он зависит (REPORT_DEPENDENCIES). Отчёт с первыми top комнатами, кроме того, не перестраивается,
+    если комната не входила в него и не может в него войти по своему новому ключу порядка.
+
+    Args:
+        top (int): Количество комнат в отчётах о самом маленьком среднем возрасте и самой большой разнице в возрасте.
+
+    Attributes:
+        rooms (Dict[int, RoomAggregate]): Показатели комнат, упорядоченные по id.
+        reports (Dict[str, List[Dict[str, Any]]]): Текущие строки отчётов.
+
+    Methods:
+        load(aggregates: Iterable[RoomAggregate]) -> None:
+            Заменяет показатели всех комнат и перестраивает все отчёты.
+
+        apply(aggregates: Iterable[RoomAggregate], room_ids: Iterable[int] = ()) -> List[str]:
+            Обновляет показатели изменившихся комнат, удаляет исчезнувшие и возвращает имена изменившихся отчётов.
+    """
+
+    def __init__(self, top: int = TOP_ROOMS_LIMIT):
+        self.top = top
+        self.rooms: Dict[int, RoomAggregate] = {}
+        self.reports: Dict[str, List[Dict[str, Any]]] = {}
+
+    def load(self, aggregates: Iterable[RoomAggregate]) -> None:
+        """
+        Заменяет показатели всех комнат и перестраивает все отчёты.
+
+        Args:
+            aggregates (Iterable[RoomAggregate]): Показатели всех комнат, упорядоченные по id.
+        """
+        self.rooms = {room.id: room for room in aggregates}
+        rooms = list(self.rooms.values())
+        self.reports = {report_name: build(rooms, self.top) for report_name, build in REPORT_BUILDERS.items()}
+
+    def apply(self, aggregates: Iterable[RoomAggregate], room_ids: Iterable[int] = ()) -> List[str]:
+        """
+        Обновляет показатели изменившихся комнат и перестраивает затронутые отчёты.
+
+        Комнаты из room_ids, для которых не переданы показатели, удалены из базы: они убираются,
+        а отчёты, в которые они входили, перестраиваются.
+
+        Args:
+            aggregates (Iterable[RoomAggregate]): Новые показатели изменившихся комнат.
+            room_ids (Iterable[int]): Идентификаторы комнат, показатели которых перечитывались.
+
+        Returns:
+            List[str]: Имена отчётов, строки которых изменились.
+        """
+        aggregates = list(aggregates)
+        removed = set(room_ids).difference(room.id for room in aggregates)
+        stale: Set[str] = set()
+        for room_id in removed:
+            if self.rooms.pop(room_id, None) is None:
+                continue
+            for report_name, rows in self.reports.items():
+                if report_name not in stale and any(row["id"] == room_id for row in rows):
+                    stale.add(report_name)
+        for room in aggregates:
+            previous = self.rooms.get(room.id)
+            if previous == room:
+                continue
+            for report_name, dependency in REPORT_DEPENDENCIES.items():
+                if report_name in stale or (previous is not None and dependency(previous) == dependency(room)):
+                    continue
+                if report_name not in TOP_REPORT_KEYS or self._may_change_top(report_name, room):
+                    stale.add(report_name)
+            self._store(room)
+
+        changed = []
+        rooms = list(self.rooms.values()) if stale else []
+        for report_name, build in REPORT_BUILDERS.items():
+            if report_name in stale:
+                rows = build(rooms, self.top)
+                if rows != self.reports[report_name]:
+                    self.reports[report_name] = rows
+                    changed.append(report_name)
+        return changed
+
+    def _store(self, room: RoomAggregate) -> None:
+        """
+        Сохраняет показатели комнаты, поддерживая порядок комнат по id.
+        """
+        in_order = room.id in self.rooms or not self.rooms or room.id > next(reversed(self.rooms))
+        self.rooms[room.id] = room
+        if not in_order:
+            self.rooms = dict(sorted(self.rooms.items()))
+
+    def _may_change_top(self, report_name: str, room: RoomAggregate) -> bool:
+        """
+        Проверяет, может ли изменение комнаты изменить отчёт с первыми top комнатами.
+
+        Комнаты отчёта ещё не изменены в текущем пакете: иначе отчёт уже помечен для перестроения.
+        """
+        rows = self.reports[report_name]
+        if len(rows) < self.top or any(row["id"] == room.id for row in rows):
+            return True
+        if not room.student_count:
+            return False
+        key = TOP_REPORT_KEYS[report_name]
+        return key(room) < key(self.rooms[rows[-1]["id"]])
+
+
+class ReportWatcher:
+    """
+    Поддерживает файлы отчётов по комнатам актуальными по уведомлениям об изменениях.
+
+    При запуске показатели всех комнат вычисляются одним запросом и записываются все отчёты.
+    Затем watcher слушает канал ROOM_CHANGES_CHANNEL, в который триггеры rooms, загрузчик и заселение
+    после фиксации каждой транзакции отправляют идентификаторы изменившихся комнат. Триггер students
+    отправляет ROOM_CHANGES_ALL (изменения в обход загрузчика), и тогда пересчитываются все отчёты.
+    Уведомления накапливаются до паузы в debounce секунд, но не дольше max_delay секунд после
+    первого. После этого показатели перечитываются только для этих комнат, а перезаписываются
+    только изменившиеся отчёты. Каждый файл записывается во временный рядом с ним и заменяет
+    прежний через os.replace, поэтому читатель видит либо старую, либо новую версию целиком.
+
+    Args:
+        db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+        output_dir (str): Каталог файлов output_<отчёт>.<формат>.
+        formats (Sequence[str]): Форматы из RECORD_WRITERS.
+        compact (bool): Записывать файлы без отступов.
+        as_of (Optional[date]): Дата, на которую вычисляется возраст; по умолчанию текущая,
+            и при смене даты все отчёты пересчитываются.
+        top (int): Количество комнат в отчётах о самом маленьком среднем возрасте и самой большой разнице в возрасте.
+        building (Optional[int]): Номер корпуса, которым ограничены отчёты; None означает все комнаты.
+        debounce (float): Сколько секунд без новых уведомлений ждать перед перезаписью отчётов.
+        max_delay (float): Наибольшая задержка перезаписи после первого уведомления.
+
+    Methods:
+        refresh_all() -> None:
+            Пересчитывает показатели всех комнат и перезаписывает все отчёты.
+
+        apply_changes(room_ids: Iterable[int]) -> List[str]:
+            Пересчитывает показатели переданных комнат и перезаписывает изменившиеся отчёты.
+
+        run(stop: Optional[threading.Event] = None) -> None:
+            Следит за изменениями до установки stop.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, output_dir: str = '.', formats: Sequence[str] = ("json",),
+                 compact: bool = False, as_of: Optional[date] = None, top: int = TOP_ROOMS_LIMIT,
+                 building: Optional[int] = None, debounce: float = WATCH_DEBOUNCE, max_delay: float = WATCH_MAX_DELAY):
+        """
+        Инициализирует экземпляр класса ReportWatcher.
+
+        Args:
+            db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+            output_dir (str): Каталог файлов отчётов.
+            formats (Sequence[str]): Форматы из RECORD_WRITERS.
+            compact (bool): Записывать файлы без отступов.
+            as_of (Optional[date]): Дата, на которую вычисляется возраст; по умолчанию текущая.
+            top (int): Количество комнат в отчётах о возрасте.
+            building (Optional[int]): Номер корпуса; None означает все комнаты.
+            debounce (float): Пауза в уведомлениях перед перезаписью, секунд.
+            max_delay (float): Наибольшая задержка перезаписи, секунд.
+        """
+        self.db_manager = db_manager
+        self.output_dir = output_dir
+        self.formats = formats
+        self.compact = compact
+        self.fixed_as_of = as_of
+        self.top = top
+        self.building = building
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.live = LiveRoomReports(top)
+        self.as_of: Optional[date] = None
+
+    def refresh_all(self) -> None:
+        """
+        Пересчитывает показатели всех комнат и перезаписывает все отчёты.
+        """
+        as_of = self.fixed_as_of or date.today()
+        self.live.load(fetch_room_aggregates(self.db_manager, None, as_of, self.building))
+        self.as_of = as_of
+        for report_name in REPORT_BUILDERS:
+            self._write_report(report_name)
+        logger.info(f"Exported all room reports as of {as_of} for {len(self.live.rooms)} rooms")
+
+    def apply_changes(self, room_ids: Iterable[int]) -> List[str]:
+        """
+        Пересчитывает показатели переданных комнат одним запросом по индексу и перезаписывает
+        отчёты, строки которых изменились.
+
+        Args:
+            room_ids (Iterable[int]): Идентификаторы изменившихся комнат.
+
+        Returns:
+            List[str]: Имена перезаписанных отчётов.
+        """
+        room_id_min, room_id_max = building_room_range(self.building)
+        room_ids = sorted(room_id for room_id in set(room_ids) if room_id_min <= room_id <= room_id_max)
+        if not room_ids:
+            return []
+
+        params = dict(report_params(self.as_of, self.top, self.building), room_ids=room_ids)
+        with self.db_manager as db:
+            with db.conn.cursor() as cursor:
+                with METRICS.timer("watch.query"):
+                    cursor.execute(ROOM_AGGREGATES_BY_ID_QUERY, params)
+                    rows = cursor.fetchall()
+        with METRICS.timer("watch.apply"):
+            changed = self.live.apply((RoomAggregate(*row) for row in rows), room_ids)
+        for report_name in changed:
+            self._write_report(report_name)
+        METRICS.count("watch.rooms_refreshed", len(room_ids))
+        logger.info(f"Refreshed {len(room_ids)} rooms, rewrote: {', '.join(changed) or 'nothing'}")
+        return changed
+
+    def _write_report(self, report_name: str) -> None:
+        """
+        Атомарно перезаписывает файлы отчёта во всех форматах.
+
+        Args:
+            report_name (str): Имя отчёта.
+        """
+        output_files = {
+            export_format: os.path.join(self.output_dir, f"output_{report_name}.{export_format}")
+            for export_format in self.formats
+        }
+        temp_files = {export_format: f"{output_file}.tmp" for export_format, output_file in output_files.items()}
+        try:
+            write_records(report_name, self.live.reports[report_name], temp_files, self.compact)
+        except BaseException:
+            for temp_file in temp_files.values():
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+            raise
+        for export_format, output_file in output_files.items():
+            os.replace(temp_files[export_format], output_file)
+
+    def run(self, stop: Optional[threading.Event] = None) -> None:
+        """
+        Следит за изменениями до установки stop, переподключаясь после разрыва соединения.
+
+        После каждого подключения все отчёты пересчитываются: уведомления, отправленные
+        без подписчика, не сохраняются.
+
+        Args:
+            stop (Optional[threading.Event]): Событие остановки; None означает работу до прерывания.
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self._watch(stop)
+            except psycopg2.OperationalError as error:
+                logger.warning(f"Change feed connection lost: {error}; reconnecting in {WATCH_RECONNECT_DELAY}s")
+                stop.wait(WATCH_RECONNECT_DELAY)
+
+    def _watch(self, stop: threading.Event) -> None:
+        """
+        Подписывается на канал изменений и применяет уведомления до установки stop.
+
+        Args:
+            stop (threading.Event): Событие остановки.
+        """
+        conn = psycopg2.connect(dbname=self.db_manager.dbname, user=self.db_manager.user,
+                                password=self.db_manager.password, host=self.db_manager.host,
+                                port=self.db_manager.port)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {ROOM_CHANGES_CHANNEL};")
+            # Подписка оформлена до чтения показателей, поэтому изменения, зафиксированные
+            # после чтения, придут уведомлениями
+            self.refresh_all()
+
+            pending: Set[int] = set()
+            everything = False
+            first_at = last_at = 0.0
+            while not stop.is_set():
+                if pending or everything:
+                    timeout = max(0.0, min(last_at + self.debounce, first_at + self.max_delay) - time.monotonic())
+                else:
+                    timeout = WATCH_IDLE_TIMEOUT
+                if select.select([conn], [], [], timeout)[0]:
+                    conn.poll()
+                    received = time.monotonic()
+                    METRICS.count("watch.notifications", len(conn.notifies))
+                    if conn.notifies and not pending and not everything:
+                        first_at = received
+                    for notify in conn.notifies:
+                        room_ids = notify.payload.split(',')
+                        if ROOM_CHANGES_ALL in room_ids:
+                            everything = True
+                        pending.update(int(room_id) for room_id in room_ids if room_id and room_id != ROOM_CHANGES_ALL)
+                    conn.notifies.clear()
+                    last_at = received
+
+                if self.fixed_as_of is None and date.today() != self.as_of:
+                    self.refresh_all()
+                    pending.clear()
+                    everything = False
+                elif ((pending or everything)
+                      and time.monotonic() >= min(last_at + self.debounce, first_at + self.max_delay)):
+                    if everything:
+                        self.refresh_all()
+                    else:
+                        self.apply_changes(pending)
+                    METRICS.observe("watch.latency", time.monotonic() - first_at)
+                    pending.clear()
+                    everything = False
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep room report files up to date from the database change feed.")
+    parser.add_argument("--output-dir", default=".", help="Directory for the output files.")
+    parser.add_argument("--format", nargs="+", choices=RECORD_WRITERS, default=["json"], help="Output formats.")
+    parser.add_argument("--compact", action="store_true", help="Write files without indentation.")
+    parser.add_argument("--as-of", type=date.fromisoformat,
+                        help="Date (YYYY-MM-DD) as of which ages are computed; today by default, "
+                             "and all reports are recomputed when the date changes.")
+    parser.add_argument("--top", type=int, default=TOP_ROOMS_LIMIT,
+                        help="Number of rooms in the average age and age difference reports.")
+    parser.add_argument("--building", type=int, help="Watch only the rooms of this building.")
+    parser.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE,
+                        help="Seconds without new notifications to wait before rewriting reports.")
+    parser.add_argument("--max-delay", type=float, default=WATCH_MAX_DELAY,
+                        help="Maximum seconds between the first pending notification and the rewrite.")
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
+    watcher = ReportWatcher(db_manager, args.output_dir, args.format, args.compact, args.as_of, args.top,
+                            args.building, args.debounce, args.max_delay)
+
+    # SIGTERM (остановка службы) завершает работу так же, как Ctrl+C: метрики записываются
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    with instrumented(args):
+        try:
+            watcher.run(stop)
+        except KeyboardInterrupt:
+            pass
+    logger.info("Report watcher stopped.")
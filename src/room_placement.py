@@ -0,0 +1,356 @@
+import argparse
+import heapq
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER, LOAD_BATCH_SIZE, PLACEMENT_MAX_AGE_GAP,
+                    PLACEMENT_UNPLACED_FILE, QUERY_CACHE_DIR, ROOM_CAPACITY)
+from data_loader import STUDENTS_COPY_SQL, CsvCopyStream
+from database_manager import DatabaseManager
+from json_stream import batched, iter_json_records, write_json_array
+from metrics import METRICS, add_metrics_arguments, instrumented
+from query_cache import QueryCache
+from room_reports import date_key, refresh_room_stats
+from schema import DEFER_ROOM_CHANGES_SQL, notify_room_changes
+from student_validation import validate_students, write_rejected
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Заселённость комнат берётся из сводной таблицы room_stats: чтение не зависит от числа студентов
+ROOM_OCCUPANCY_QUERY = """
+    SELECT rooms.id, COALESCE(room_stats.student_count, 0), room_stats.birthday_min, room_stats.birthday_max,
+        COALESCE(room_stats.male_count, 0), COALESCE(room_stats.female_count, 0)
+    FROM rooms
+    LEFT JOIN room_stats ON rooms.id = room_stats.room_id
+    ORDER BY rooms.id;
+"""
+
+# Блокировка не мешает чтению, но до конца транзакции не даёт никому, кроме самого заселения,
+# вставлять, изменять и удалять студентов и строки room_stats: ни загрузчику, ни другому заселению,
+# ни прямым INSERT в students. Заселённость читается из room_stats, поэтому она верна, только
+# если все, кто меняет students, пересчитывают room_stats в той же транзакции, как DataLoader
+LOCK_PLACEMENT_TABLES_SQL = "LOCK TABLE room_stats, students IN SHARE ROW EXCLUSIVE MODE;"
+
+
+class RoomAllocator:
+    """
+    Распределяет студентов по комнатам в памяти.
+
+    Комнаты со студентами хранятся в кучах по группам (пол или одна общая группа без
+    ограничения по полу) и количеству свободных мест; пустые комнаты — в общей куче по id.
+    Студенты заселяются по возрастанию даты рождения, поэтому комнату, в которой самый
+    старший студент уже слишком стар для очередного, можно навсегда убрать из кучи, а комната,
+    в которой самый младший студент пока слишком молод, ждёт в отдельной куче, пока даты
+    рождения заселяемых не приблизятся к нему. Каждый студент заселяется в подходящую комнату
+    с наименьшим числом свободных мест (при равенстве — с самым старшим жильцом, затем с меньшим id),
+    и только если такой нет — в пустую комнату с наименьшим id. Время заселения — O(n log n)
+    без запросов к базе данных на каждого студента.
+
+    Args:
+        capacity (int): Количество мест в комнате.
+        max_age_gap (Optional[int]): Наибольшая разница в возрасте соседей, полных лет; None — без ограничения.
+        same_sex (bool): Заселять в комнату только студентов одного пола.
+
+    Methods:
+        add_room(room_id: int, student_count: int, birthday_min: Optional[date], birthday_max: Optional[date],
+                 male_count: int, female_count: int) -> None:
+            Добавляет комнату с текущими жильцами.
+
+        place(students: List[Tuple]) -> Tuple[List[Tuple], List[Tuple]]:
+            Распределяет студентов по комнатам.
+    """
+
+    def __init__(self, capacity: int = ROOM_CAPACITY, max_age_gap: Optional[int] = PLACEMENT_MAX_AGE_GAP,
+                 same_sex: bool = True):
+        """
+        Инициализирует экземпляр класса RoomAllocator.
+
+        Args:
+            capacity (int): Количество мест в комнате.
+            max_age_gap (Optional[int]): Наибольшая разница в возрасте соседей, полных лет; None — без ограничения.
+            same_sex (bool): Заселять в комнату только студентов одного пола.
+        """
+        self.capacity = capacity
+        self.same_sex = same_sex
+        # Разница в полных годах — (поздний ключ - ранний ключ) // 10000 для ключей YYYYMMDD (см. date_key),
+        # поэтому она не больше max_age_gap, пока разница ключей меньше key_gap
+        self.key_gap = (max_age_gap + 1) * 10000 if max_age_gap is not None else float('inf')
+        self._free: Dict[int, int] = {}
+        self._earliest: Dict[int, int] = {}
+        self._latest: Dict[int, int] = {}
+        self._empty: List[int] = []
+        # Группа -> куча (ключ, начиная с которого комната подходит по возрасту, id комнаты)
+        self._pending: Dict[str, List[Tuple[Any, int]]] = {}
+        # Группа -> кучи (самая ранняя дата рождения, id комнаты) по количеству свободных мест
+        self._buckets: Dict[str, List[List[Tuple[int, int]]]] = {}
+
+    def _group(self, sex: str) -> str:
+        """
+        Возвращает группу комнат, в которые можно заселить студента этого пола.
+        """
+        return sex if self.same_sex else ''
+
+    def _group_buckets(self, group: str) -> List[List[Tuple[int, int]]]:
+        """
+        Возвращает кучи комнат группы по количеству свободных мест.
+        """
+        buckets = self._buckets.get(group)
+        if buckets is None:
+            buckets = self._buckets[group] = [[] for _ in range(self.capacity + 1)]
+        return buckets
+
+    def add_room(self, room_id: int, student_count: int, birthday_min: Optional[date], birthday_max: Optional[date],
+                 male_count: int, female_count: int) -> None:
+        """
+        Добавляет комнату с текущими жильцами. Заполненные комнаты, комнаты с жильцами разного пола
+        (при same_sex) и комнаты, где разница в возрасте уже больше допустимой, не используются.
+
+        Args:
+            room_id (int): Идентификатор комнаты.
+            student_count (int): Количество жильцов.
+            birthday_min (Optional[date]): Самая ранняя дата рождения жильцов.
+            birthday_max (Optional[date]): Самая поздняя дата рождения жильцов.
+            male_count (int): Количество жильцов мужского пола.
+            female_count (int): Количество жильцов женского пола.
+        """
+        free = self.capacity - student_count
+        if free <= 0:
+            return
+        if not student_count:
+            self._free[room_id] = free
+            heapq.heappush(self._empty, room_id)
+            return
+        if self.same_sex and male_count and female_count:
+            return
+
+        earliest, latest = date_key(birthday_min), date_key(birthday_max)
+        if latest - earliest >= self.key_gap:
+            return
+        self._free[room_id] = free
+        self._earliest[room_id] = earliest
+        self._latest[room_id] = latest
+        pending = self._pending.setdefault(self._group('M' if male_count else 'F'), [])
+        heapq.heappush(pending, (latest - self.key_gap, room_id))
+
+    def place(self, students: List[Tuple]) -> Tuple[List[Tuple], List[Tuple]]:
+        """
+        Распределяет студентов по комнатам.
+
+        Args:
+            students (List[Tuple]): Строки id, name, birthday, sex, room_id (room_id не используется).
+
+        Returns:
+            Tuple[List[Tuple], List[Tuple]]: Строки заселённых студентов с назначенным room_id
+                и строки студентов, для которых не нашлось комнаты.
+        """
+        placed = []
+        unplaced = []
+        keyed = sorted(((date_key(student[2]), student) for student in students), key=lambda item: item[0])
+        for key, student in keyed:
+            room_id = self._assign(self._group(student[3]), key)
+            if room_id is None:
+                unplaced.append(student)
+            else:
+                placed.append(student[:4] + (room_id,))
+        return placed, unplaced
+
+    def _assign(self, group: str, key: int) -> Optional[int]:
+        """
+        Выбирает комнату для студента группы group с ключом даты рождения key и занимает в ней место.
+        """
+        buckets = self._group_buckets(group)
+        pending = self._pending.get(group)
+        while pending and pending[0][0] < key:
+            _, room_id = heapq.heappop(pending)
+            heapq.heappush(buckets[self._free[room_id]], (self._earliest[room_id], room_id))
+
+        # Запись в куче устаревает, когда в комнате занимают место: комната переходит в соседнюю кучу
+        oldest_allowed = key - self.key_gap
+        for free in range(1, self.capacity + 1):
+            bucket = buckets[free]
+            while bucket:
+                earliest, room_id = heapq.heappop(bucket)
+                if self._free[room_id] == free and earliest > oldest_allowed:
+                    return self._occupy(buckets, room_id, key)
+
+        if not self._empty:
+            return None
+        room_id = heapq.heappop(self._empty)
+        self._earliest[room_id] = self._latest[room_id] = key
+        return self._occupy(buckets, room_id, key)
+
+    def _occupy(self, buckets: List[List[Tuple[int, int]]], room_id: int, key: int) -> int:
+        """
+        Занимает место в комнате и возвращает комнату в кучу по оставшимся свободным местам.
+        """
+        free = self._free[room_id] - 1
+        self._free[room_id] = free
+        self._earliest[room_id] = min(self._earliest[room_id], key)
+        self._latest[room_id] = max(self._latest[room_id], key)
+        if free:
+            heapq.heappush(buckets[free], (self._earliest[room_id], room_id))
+        return room_id
+
+
+class RoomPlacement:
+    """
+    Класс для заселения прибывающих студентов в комнаты.
+
+    Заселённость комнат читается из room_stats, распределение выполняет RoomAllocator в памяти,
+    заселённые студенты записываются одним COPY, а room_stats пересчитывается только для
+    затронутых комнат — всё в одной транзакции. Студенты с некорректными данными и студенты,
+    для которых не нашлось комнаты, дописываются в unplaced_file с причиной.
+
+    Args:
+        db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+        capacity (int): Количество мест в комнате.
+        max_age_gap (Optional[int]): Наибольшая разница в возрасте соседей, полных лет; None — без ограничения.
+        same_sex (bool): Заселять в комнату только студентов одного пола.
+        batch_size (int): Количество студентов, читаемых из файла и проверяемых за один раз.
+        unplaced_file (str): Файл JSON Lines для студентов, которых не удалось заселить.
+        cache (Optional[QueryCache]): Кеш результатов запросов экспортёров; None — без кеша.
+
+    Methods:
+        place_students(arrivals_file_path: str, output_file: Optional[str] = None,
+                       dry_run: bool = False) -> Dict[str, int]:
+            Заселяет студентов из JSON-файла.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, capacity: int = ROOM_CAPACITY,
+                 max_age_gap: Optional[int] = PLACEMENT_MAX_AGE_GAP, same_sex: bool = True,
+                 batch_size: int = LOAD_BATCH_SIZE, unplaced_file: str = PLACEMENT_UNPLACED_FILE,
+                 cache: Optional[QueryCache] = None):
+        """
+        Инициализирует экземпляр класса RoomPlacement.
+
+        Args:
+            db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+            capacity (int): Количество мест в комнате.
+            max_age_gap (Optional[int]): Наибольшая разница в возрасте соседей, полных лет.
+            same_sex (bool): Заселять в комнату только студентов одного пола.
+            batch_size (int): Количество студентов, читаемых из файла и проверяемых за один раз.
+            unplaced_file (str): Файл JSON Lines для студентов, которых не удалось заселить.
+            cache (Optional[QueryCache]): Кеш результатов запросов экспортёров; None — без кеша.
+        """
+        self.db_manager = db_manager
+        self.capacity = capacity
+        self.max_age_gap = max_age_gap
+        self.same_sex = same_sex
+        self.batch_size = batch_size
+        self.unplaced_file = unplaced_file
+        self.cache = cache
+
+    def _read_arrivals(self, arrivals_file_path: str) -> Tuple[List[Tuple], List[Dict[str, Any]]]:
+        """
+        Читает и проверяет студентов из файла; комната в записях не требуется.
+        """
+        rows = []
+        rejected = []
+        for batch in METRICS.timed("load.parse", batched(iter_json_records(arrivals_file_path), self.batch_size)):
+            with METRICS.timer("load.transform"):
+                batch_rows, batch_rejected = validate_students(batch, None)
+            rows.extend(batch_rows)
+            rejected.extend(batch_rejected)
+        return rows, rejected
+
+    def _allocator(self, cursor) -> RoomAllocator:
+        """
+        Строит RoomAllocator по текущей заселённости комнат.
+        """
+        allocator = RoomAllocator(self.capacity, self.max_age_gap, self.same_sex)
+        with METRICS.timer("placement.rooms"):
+            cursor.execute(ROOM_OCCUPANCY_QUERY)
+            for row in cursor.fetchall():
+                allocator.add_room(*row)
+        return allocator
+
+    def place_students(self, arrivals_file_path: str, output_file: Optional[str] = None,
+                       dry_run: bool = False) -> Dict[str, int]:
+        """
+        Заселяет студентов из JSON-файла (массив или JSON Lines) в комнаты.
+
+        Args:
+            arrivals_file_path (str): Путь к файлу с данными о прибывающих студентах.
+            output_file (Optional[str]): Файл JSON, в который записываются назначения {"id", "room"}.
+            dry_run (bool): Только распределить студентов, не записывая их в базу данных.
+
+        Returns:
+            Dict[str, int]: Количество заселённых ("placed") и незаселённых ("unplaced") студентов
+                и количество затронутых комнат ("rooms").
+        """
+        logger.info(f"Placing students from {arrivals_file_path}")
+        arrivals, rejected = self._read_arrivals(arrivals_file_path)
+
+        with self.db_manager as db:
+            with db.conn.cursor() as cursor:
+                cursor.execute(LOCK_PLACEMENT_TABLES_SQL)
+                cursor.execute(DEFER_ROOM_CHANGES_SQL)
+                allocator = self._allocator(cursor)
+                with METRICS.timer("placement.assign"):
+                    placed, unplaced = allocator.place(arrivals)
+                room_ids = {row[4] for row in placed}
+                if not dry_run:
+                    stream = CsvCopyStream(placed)
+                    with METRICS.timer("load.write"):
+                        cursor.copy_expert(STUDENTS_COPY_SQL, stream)
+                    METRICS.count("load.rows_written", stream.rows_written)
+                    refresh_room_stats(cursor, room_ids)
+                    notify_room_changes(cursor, room_ids)
+            with METRICS.timer("load.commit"):
+                if dry_run:
+                    db.conn.rollback()
+                else:
+                    db.conn.commit()
+        if not dry_run and self.cache is not None:
+            self.cache.bump_version()
+
+        gap = "any age gap" if self.max_age_gap is None else f"age gap of {self.max_age_gap} years"
+        reason = f"no room with a free place, {'same sex and ' if self.same_sex else ''}{gap}"
+        rejected += [{"reason": reason, "record": dict(zip(("id", "name", "birthday", "sex"), row))}
+                     for row in unplaced]
+        if rejected:
+            with open(self.unplaced_file, 'a') as file:
+                write_rejected(file, rejected)
+            METRICS.count("placement.unplaced", len(rejected))
+            logger.warning(f"Could not place {len(rejected)} students, see {self.unplaced_file}")
+        if output_file is not None:
+            with open(output_file, 'w') as file:
+                write_json_array(file, ({"id": row[0], "room": row[4]} for row in placed))
+
+        logger.info(f"Placed {len(placed)} students into {len(room_ids)} rooms"
+                    f"{' (dry run, nothing written)' if dry_run else ''}")
+        return {"placed": len(placed), "unplaced": len(rejected), "rooms": len(room_ids)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Place arriving students into rooms.")
+    parser.add_argument("arrivals_file", type=str, help="Path to the JSON file of arriving students.")
+    parser.add_argument("--capacity", type=int, default=ROOM_CAPACITY, help="Number of places in a room.")
+    parser.add_argument("--max-age-gap", type=int, default=PLACEMENT_MAX_AGE_GAP,
+                        help="Largest age difference between roommates, in whole years.")
+    parser.add_argument("--no-max-age-gap", dest="max_age_gap", action="store_const", const=None,
+                        help="Do not limit the age difference between roommates.")
+    parser.add_argument("--allow-mixed-sex", action="store_true", help="Allow roommates of different sexes.")
+    parser.add_argument("--batch-size", type=int, default=LOAD_BATCH_SIZE,
+                        help="Number of students read and validated per batch.")
+    parser.add_argument("--output-file", help="Write the assignments as a JSON array of {id, room} records.")
+    parser.add_argument("--unplaced-file", default=PLACEMENT_UNPLACED_FILE,
+                        help="JSON Lines file that receives students that could not be placed.")
+    parser.add_argument("--dry-run", action="store_true", help="Compute the assignments without writing them.")
+    parser.add_argument("--cache-dir",
+                        help=f"Query result cache of the exporters to invalidate after the placement, "
+                             f"e.g. {QUERY_CACHE_DIR}; without it the cache is left alone.")
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
+    placement = RoomPlacement(db_manager, args.capacity, args.max_age_gap, not args.allow_mixed_sex,
+                              args.batch_size, args.unplaced_file,
+                              QueryCache(args.cache_dir) if args.cache_dir else None)
+    with instrumented(args):
+        placement.place_students(args.arrivals_file, args.output_file, args.dry_run)
+
+    logger.info(f"Connection pool usage: {db_manager.pool_stats()}")
@@ -0,0 +1,441 @@
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from config import ROOMS_PER_BUILDING, TOP_ROOMS_LIMIT
+from database_manager import DatabaseManager
+from metrics import METRICS
+from query_cache import QueryCache
+
+# Возраст в полных годах на дату as_of вычисляется целочисленно по сгенерированному столбцу
+# students.birthday_key (дата рождения в виде числа YYYYMMDD): (as_of_key - birthday_key) / 10000.
+# Это совпадает с EXTRACT(YEAR FROM AGE(as_of, birthday)), но не вызывает AGE для каждой строки
+# и не зависит от времени выполнения запроса. Параметры запросов — см. report_params.
+# В отчёты с первыми %(top)s комнатами попадают только комнаты со студентами: у пустой комнаты нет возраста.
+#
+# Отчёты строятся по комнатам с идентификаторами от %(room_id_min)s до %(room_id_max)s (см. building_room_range).
+# Условие на диапазон повторено и для rooms.id, и для students.room_id: параметры подставляются в запрос
+# литералами, поэтому при секционировании students по room_id (schema.py partition) планировщик
+# отбрасывает секции других корпусов ещё до выполнения запроса.
+REPORT_QUERIES = {
+    "rooms_with_student_count": """
+        SELECT rooms.id, rooms.name, COUNT(students.id) AS student_count
+        FROM rooms
+        LEFT JOIN students ON rooms.id = students.room_id
+            AND students.room_id BETWEEN %(room_id_min)s AND %(room_id_max)s
+        WHERE rooms.id BETWEEN %(room_id_min)s AND %(room_id_max)s
+        GROUP BY rooms.id, rooms.name
+        ORDER BY rooms.id;
+    """,
+    "rooms_with_average_age": """
+        SELECT rooms.id, rooms.name, AVG((%(as_of_key)s - students.birthday_key) / 10000) AS average_age
+        FROM rooms
+        INNER JOIN students ON rooms.id = students.room_id
+        WHERE rooms.id BETWEEN %(room_id_min)s AND %(room_id_max)s
+            AND students.room_id BETWEEN %(room_id_min)s AND %(room_id_max)s
+        GROUP BY rooms.id, rooms.name
+        ORDER BY average_age ASC, rooms.id
+        LIMIT %(top)s;
+    """,
+    "rooms_with_age_difference": """
+        SELECT rooms.id, rooms.name,
+            ((%(as_of_key)s - MIN(students.birthday_key)) / 10000 -
+             (%(as_of_key)s - MAX(students.birthday_key)) / 10000)::numeric AS age_difference
+        FROM rooms
+        INNER JOIN students ON rooms.id = students.room_id
+        WHERE rooms.id BETWEEN %(room_id_min)s AND %(room_id_max)s
+            AND students.room_id BETWEEN %(room_id_min)s AND %(room_id_max)s
+        GROUP BY rooms.id, rooms.name
+        ORDER BY age_difference DESC, rooms.id
+        LIMIT %(top)s;
+    """,
+    "rooms_with_multiple_sex": """
+        SELECT rooms.id, rooms.name
+        FROM rooms
+        INNER JOIN students ON rooms.id = students.room_id
+        WHERE rooms.id BETWEEN %(room_id_min)s AND %(room_id_max)s
+            AND students.room_id BETWEEN %(room_id_min)s AND %(room_id_max)s
+        GROUP BY rooms.id, rooms.name
+        HAVING COUNT(DISTINCT students.sex) > 1
+        ORDER BY rooms.id;
+    """,
+}
+
+# Поля строк каждого отчёта в порядке столбцов запроса
+REPORT_FIELDS = {
+    "rooms_with_student_count": ("id", "name", "student_count"),
+    "rooms_with_average_age": ("id", "name", "average_age"),
+    "rooms_with_age_difference": ("id", "name", "age_difference"),
+    "rooms_with_multiple_sex": ("id", "name"),
+}
+
+# Те же отчёты по сводной таблице room_stats: без обращения к students.
+# Средний возраст здесь — точный средний возраст в годах, вычисленный по сумме дат рождения,
+# а не среднее от целых лет, поэтому он может отличаться от REPORT_QUERIES в дробной части.
+#
+# Первые %(top)s комнат читаются по частичным индексам room_stats, упорядоченным по показателю,
+# поэтому стоимость отчёта зависит от top, а не от числа комнат и студентов:
+# - средний возраст убывает с ростом средней даты рождения birthday_mean, не зависящей от as_of;
+# - разница в возрасте на любую дату отличается от age_span (полных лет между самой ранней и самой
+#   поздней датой рождения) не больше чем на 1. Поэтому сначала берутся top комнат с наибольшим
+#   age_span, и наименьшая разница среди них — нижняя граница для остальных кандидатов.
+ROOM_STATS_REPORT_QUERIES = {
+    "rooms_with_student_count": """
+        SELECT rooms.id, rooms.name, COALESCE(room_stats.student_count, 0) AS student_count
+        FROM rooms
+        LEFT JOIN room_stats ON rooms.id = room_stats.room_id
+        WHERE rooms.id BETWEEN %(room_id_min)s AND %(room_id_max)s
+        ORDER BY rooms.id;
+    """,
+    "rooms_with_average_age": """
+        SELECT rooms.id, rooms.name,
+            ((%(as_of)s::date - DATE '1970-01-01') - room_stats.birthday_mean) / 365.25 AS average_age
+        FROM room_stats
+        INNER JOIN rooms ON rooms.id = room_stats.room_id
+        WHERE room_stats.student_count > 0
+            AND room_stats.room_id BETWEEN %(room_id_min)s AND %(room_id_max)s
+        ORDER BY room_stats.birthday_mean DESC, room_stats.room_id
+        LIMIT %(top)s;
+    """,
+    "rooms_with_age_difference": """
+        WITH leaders AS (
+            SELECT EXTRACT(YEAR FROM AGE(%(as_of)s::date, room_stats.birthday_min)) -
+                EXTRACT(YEAR FROM AGE(%(as_of)s::date, room_stats.birthday_max)) AS age_difference
+            FROM room_stats
+            WHERE room_stats.student_count > 0
+                AND room_stats.room_id BETWEEN %(room_id_min)s AND %(room_id_max)s
+            ORDER BY room_stats.age_span DESC, room_stats.room_id
+            LIMIT %(top)s
+        )
+        SELECT rooms.id, rooms.name,
+            EXTRACT(YEAR FROM AGE(%(as_of)s::date, room_stats.birthday_min)) -
+            EXTRACT(YEAR FROM AGE(%(as_of)s::date, room_stats.birthday_max)) AS age_difference
+        FROM room_stats
+        INNER JOIN rooms ON rooms.id = room_stats.room_id
+        WHERE room_stats.student_count > 0
+            AND room_stats.room_id BETWEEN %(room_id_min)s AND %(room_id_max)s
+            AND room_stats.age_span >= (SELECT MIN(leaders.age_difference) FROM leaders)::int - 1
+        ORDER BY age_difference DESC, rooms.id
+        LIMIT %(top)s;
+    """,
+    "rooms_with_multiple_sex": """
+        SELECT rooms.id, rooms.name
+        FROM rooms
+        INNER JOIN room_stats ON rooms.id = room_stats.room_id
+        WHERE room_stats.male_count > 0 AND room_stats.female_count > 0
+            AND room_stats.room_id BETWEEN %(room_id_min)s AND %(room_id_max)s
+        ORDER BY rooms.id;
+    """,
+}
+
+REFRESH_ROOM_STATS_QUERY = """
+    INSERT INTO room_stats (room_id, student_count, birthday_min, birthday_max, birthday_sum,
+                            male_count, female_count)
+    SELECT rooms.id, COUNT(students.id), MIN(students.birthday), MAX(students.birthday),
+        SUM(students.birthday - DATE '1970-01-01'),
+        COUNT(*) FILTER (WHERE students.sex = 'M'),
+        COUNT(*) FILTER (WHERE students.sex = 'F')
+    FROM rooms
+    LEFT JOIN students ON rooms.id = students.room_id
+    WHERE rooms.id = ANY(%s)
+    GROUP BY rooms.id
+    ON CONFLICT (room_id) DO UPDATE SET
+        student_count = EXCLUDED.student_count,
+        birthday_min = EXCLUDED.birthday_min,
+        birthday_max = EXCLUDED.birthday_max,
+        birthday_sum = EXCLUDED.birthday_sum,
+        male_count = EXCLUDED.male_count,
+        female_count = EXCLUDED.female_count;
+"""
+
+ROOM_AGGREGATES_QUERY = """
+    SELECT rooms.id, rooms.name,
+        COUNT(ages.id) AS student_count,
+        SUM(ages.age)::numeric AS age_sum,
+        AVG(ages.age) AS age_avg,
+        MIN(ages.age)::numeric AS age_min,
+        MAX(ages.age)::numeric AS age_max,
+        COUNT(DISTINCT ages.sex) AS sex_count
+    FROM rooms
+    LEFT JOIN (
+        SELECT students.id, students.room_id, students.sex,
+            (%(as_of_key)s - students.birthday_key) / 10000 AS age
+        FROM students
+        WHERE students.room_id BETWEEN %(room_id_min)s AND %(room_id_max)s
+    ) AS ages ON rooms.id = ages.room_id
+    WHERE rooms.id BETWEEN %(room_id_min)s AND %(room_id_max)s
+    GROUP BY rooms.id, rooms.name
+    ORDER BY rooms.id;
+"""
+
+# Показатели только перечисленных комнат: по индексу idx_students_room_id_ages, без чтения остальных
+ROOM_AGGREGATES_BY_ID_QUERY = """
+    SELECT rooms.id, rooms.name,
+        COUNT(ages.id) AS student_count,
+        SUM(ages.age)::numeric AS age_sum,
+        AVG(ages.age) AS age_avg,
+        MIN(ages.age)::numeric AS age_min,
+        MAX(ages.age)::numeric AS age_max,
+        COUNT(DISTINCT ages.sex) AS sex_count
+    FROM rooms
+    LEFT JOIN (
+        SELECT students.id, students.room_id, students.sex,
+            (%(as_of_key)s - students.birthday_key) / 10000 AS age
+        FROM students
+        WHERE students.room_id = ANY(%(room_ids)s)
+    ) AS ages ON rooms.id = ages.room_id
+    WHERE rooms.id = ANY(%(room_ids)s)
+    GROUP BY rooms.id, rooms.name
+    ORDER BY rooms.id;
+"""
+
+BUILDINGS_QUERY = """
+    SELECT DISTINCT floor(id / %(rooms_per_building)s::numeric)::int AS building
+    FROM rooms
+    WHERE id BETWEEN %(room_id_min)s AND %(room_id_max)s
+    ORDER BY building;
+"""
+
+# На сколько диапазонов корпусов на одно соединение делится параллельная агрегация:
+# больше одного, чтобы соединения, получившие корпуса поменьше, не простаивали
+PARALLEL_SLICES_PER_WORKER = 4
+
+# Границы типа INT: диапазон комнат отчёта без фильтра по корпусу
+ROOM_ID_MIN = -2 ** 31
+ROOM_ID_MAX = 2 ** 31 - 1
+
+
+def building_of(room_id: int) -> int:
+    """
+    Возвращает номер корпуса, в котором находится комната.
+
+    Args:
+        room_id (int): Идентификатор комнаты.
+
+    Returns:
+        int: Номер корпуса.
+    """
+    return room_id // ROOMS_PER_BUILDING
+
+
+def building_room_range(building: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Возвращает границы идентификаторов комнат корпуса (включительно).
+
+    Args:
+        building (Optional[int]): Номер корпуса; None означает все комнаты.
+
+    Returns:
+        Tuple[int, int]: Наименьший и наибольший идентификатор комнаты.
+    """
+    if building is None:
+        return ROOM_ID_MIN, ROOM_ID_MAX
+    return building * ROOMS_PER_BUILDING, (building + 1) * ROOMS_PER_BUILDING - 1
+
+
+def date_key(value: date) -> int:
+    """
+    Возвращает дату в виде числа YYYYMMDD, как столбец students.birthday_key.
+
+    Args:
+        value (date): Дата.
+
+    Returns:
+        int: Число YYYYMMDD.
+    """
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+def report_params(as_of: date, top: int = TOP_ROOMS_LIMIT, building: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Возвращает параметры запросов отчётов.
+
+    Args:
+        as_of (date): Дата, на которую вычисляется возраст.
+        top (int): Количество комнат в отчётах о самом маленьком среднем возрасте
+            и самой большой разнице в возрасте.
+        building (Optional[int]): Номер корпуса, которым ограничены отчёты; None означает все комнаты.
+
+    Returns:
+        Dict[str, Any]: Параметры as_of, as_of_key, top, room_id_min и room_id_max.
+    """
+    room_id_min, room_id_max = building_room_range(building)
+    return {"as_of": as_of, "as_of_key": date_key(as_of), "top": top,
+            "room_id_min": room_id_min, "room_id_max": room_id_max}
+
+
+class RoomAggregate(NamedTuple):
+    """
+    Агрегированные показатели одной комнаты.
+
+    Для комнаты без студентов все возрастные показатели равны None.
+    """
+    id: int
+    name: str
+    student_count: int
+    age_sum: Optional[Any]
+    age_avg: Optional[Any]
+    age_min: Optional[Any]
+    age_max: Optional[Any]
+    sex_count: int
+
+
+def fetch_room_aggregates(db_manager: DatabaseManager, cache: Optional[QueryCache] = None,
+                          as_of: Optional[date] = None, building: Optional[int] = None,
+                          workers: int = 1) -> List[RoomAggregate]:
+    """
+    Вычисляет показатели комнат за один проход по rooms LEFT JOIN students.
+
+    При workers > 1 показатели вычисляются по корпусам параллельно в нескольких соединениях
+    и склеиваются в порядке корпусов. Все соединения читают один снимок данных
+    (pg_export_snapshot), поэтому результат совпадает с однопроходным.
+
+    Args:
+        db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+        cache (Optional[QueryCache]): Кеш результатов запросов.
+        as_of (Optional[date]): Дата, на которую вычисляется возраст; по умолчанию текущая.
+        building (Optional[int]): Номер корпуса; None означает все комнаты.
+        workers (int): Количество параллельных соединений.
+
+    Returns:
+        List[RoomAggregate]: Показатели комнат, упорядоченные по id.
+    """
+    params = report_params(as_of or date.today(), building=building)
+
+    def fetch_rows() -> List[Tuple]:
+        if workers > 1:
+            return _fetch_rows_by_building(db_manager, params, workers)
+        with db_manager as db:
+            with db.conn.cursor() as cursor:
+                with METRICS.timer("export.query"):
+                    cursor.execute(ROOM_AGGREGATES_QUERY, params)
+                with METRICS.timer("export.fetch"):
+                    return cursor.fetchall()
+
+    rows = cache.fetch(ROOM_AGGREGATES_QUERY, fetch_rows, params) if cache is not None else fetch_rows()
+    return [RoomAggregate(*row) for row in rows]
+
+
+def _fetch_rows_by_building(db_manager: DatabaseManager, params: Dict[str, Any], workers: int) -> List[Tuple]:
+    """
+    Выполняет ROOM_AGGREGATES_QUERY по частям в нескольких соединениях.
+
+    Корпуса делятся на PARALLEL_SLICES_PER_WORKER * workers непрерывных диапазонов, каждый
+    диапазон — отдельный запрос, читающий только секции своих корпусов. Основное соединение
+    открывает транзакцию REPEATABLE READ и экспортирует её снимок; каждый поток берёт собственное
+    соединение из пула и импортирует этот снимок.
+
+    Args:
+        db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+        params (Dict[str, Any]): Параметры запроса (см. report_params).
+        workers (int): Количество параллельных соединений.
+
+    Returns:
+        List[Tuple]: Строки ROOM_AGGREGATES_QUERY, упорядоченные по id комнаты.
+    """
+
+    def fetch_slice(buildings: List[int], snapshot: str) -> List[Tuple]:
+        slice_params = dict(params, room_id_min=max(building_room_range(buildings[0])[0], params["room_id_min"]),
+                            room_id_max=min(building_room_range(buildings[-1])[1], params["room_id_max"]))
+        worker_db = DatabaseManager(db_manager.dbname, db_manager.user, db_manager.password,
+                                    db_manager.host, db_manager.port)
+        with worker_db as db:
+            try:
+                with db.conn.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+                    cursor.execute("SET TRANSACTION SNAPSHOT %s;", (snapshot,))
+                    with METRICS.timer("export.query"):
+                        cursor.execute(ROOM_AGGREGATES_QUERY, slice_params)
+                    with METRICS.timer("export.fetch"):
+                        return cursor.fetchall()
+            finally:
+                db.conn.rollback()
+
+    with db_manager as db:
+        try:
+            with db.conn.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+                cursor.execute("SELECT pg_export_snapshot();")
+                snapshot = cursor.fetchone()[0]
+                cursor.execute(BUILDINGS_QUERY, dict(params, rooms_per_building=ROOMS_PER_BUILDING))
+                buildings = [row[0] for row in cursor.fetchall()]
+            if not buildings:
+                return []
+            slice_size = max(1, -(-len(buildings) // (workers * PARALLEL_SLICES_PER_WORKER)))
+            slices = [buildings[start:start + slice_size] for start in range(0, len(buildings), slice_size)]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                parts = list(executor.map(lambda buildings_slice: fetch_slice(buildings_slice, snapshot), slices))
+        finally:
+            db.conn.rollback()
+    return [row for part in parts for row in part]
+
+
+def _occupied(aggregates: List[RoomAggregate]) -> List[RoomAggregate]:
+    """
+    Возвращает комнаты, в которых есть студенты: у пустой комнаты нет возраста.
+    """
+    return [room for room in aggregates if room.student_count]
+
+
+# Порядок комнат со студентами в отчётах с первыми top комнатами: по возрастанию ключа
+TOP_REPORT_KEYS: Dict[str, Callable[[RoomAggregate], Tuple]] = {
+    "rooms_with_average_age": lambda room: (room.age_avg, room.id),
+    "rooms_with_age_difference": lambda room: (room.age_min - room.age_max, room.id),
+}
+
+# Построение каждого отчёта из показателей комнат, упорядоченных по id: (показатели, top) -> строки отчёта.
+# Первые top комнат выбираются кучей ограниченного размера, без сортировки всех комнат.
+REPORT_BUILDERS: Dict[str, Callable[[List[RoomAggregate], int], List[Dict[str, Any]]]] = {
+    "rooms_with_student_count": lambda aggregates, top: [
+        {"id": room.id, "name": room.name, "student_count": room.student_count}
+        for room in aggregates
+    ],
+    "rooms_with_average_age": lambda aggregates, top: [
+        {"id": room.id, "name": room.name, "average_age": room.age_avg}
+        for room in heapq.nsmallest(top, _occupied(aggregates), key=TOP_REPORT_KEYS["rooms_with_average_age"])
+    ],
+    "rooms_with_age_difference": lambda aggregates, top: [
+        {"id": room.id, "name": room.name, "age_difference": room.age_max - room.age_min}
+        for room in heapq.nsmallest(top, _occupied(aggregates), key=TOP_REPORT_KEYS["rooms_with_age_difference"])
+    ],
+    "rooms_with_multiple_sex": lambda aggregates, top: [
+        {"id": room.id, "name": room.name}
+        for room in aggregates
+        if room.sex_count > 1
+    ],
+}
+
+
+def derive_reports(aggregates: List[RoomAggregate], top: int = TOP_ROOMS_LIMIT) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Строит четыре отчёта по комнатам из общего набора показателей.
+
+    Порядок строк повторяет отдельные запросы экспортёров: комнаты с равными значениями
+    упорядочены по id, комнаты без студентов в отчёты о возрасте не попадают.
+
+    Args:
+        aggregates (List[RoomAggregate]): Показатели комнат, упорядоченные по id.
+        top (int): Количество комнат в отчётах о возрасте.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: Строки отчётов rooms_with_student_count,
+            rooms_with_average_age, rooms_with_age_difference и rooms_with_multiple_sex.
+    """
+    return {report_name: build(aggregates, top) for report_name, build in REPORT_BUILDERS.items()}
+
+
+def refresh_room_stats(cursor, room_ids: Iterable[int]) -> None:
+    """
+    Пересчитывает строки room_stats только для переданных комнат.
+
+    Вызывается в транзакции загрузки, поэтому сводная таблица фиксируется вместе с данными.
+
+    Args:
+        cursor: Курсор базы данных.
+        room_ids (Iterable[int]): Идентификаторы комнат, затронутых загрузкой.
+    """
+    room_ids = sorted(set(room_ids))
+    if room_ids:
+        with METRICS.timer("load.room_stats"):
+            cursor.execute(REFRESH_ROOM_STATS_QUERY, (room_ids,))
@@ -0,0 +1,656 @@
+import argparse
+import logging
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from psycopg2 import sql
+
+from config import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER, ROOMS_PER_BUILDING
+from database_manager import DatabaseManager
+from room_reports import (BUILDINGS_QUERY, REPORT_QUERIES, ROOM_STATS_REPORT_QUERIES, building_of, building_room_range,
+                          report_params)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Произвольный ключ advisory-блокировки, чтобы миграции не применялись параллельно
+MIGRATIONS_LOCK_ID = 4242
+
+# Канал LISTEN/NOTIFY, в который триггеры rooms и students отправляют идентификаторы изменившихся комнат
+ROOM_CHANGES_CHANNEL = "room_changes"
+
+# Сколько идентификаторов комнат передаётся в одном уведомлении (полезная нагрузка NOTIFY ограничена 8000 байтами)
+ROOM_CHANGES_CHUNK_SIZE = 500
+
+# Транзакция с этой настройкой не уведомляет о своих изменениях из триггеров; вместо этого она
+# сама отправляет комнаты записанных студентов (notify_room_changes). Её выполняют загрузчики
+# и заселение: транзакция, выполнившая NOTIFY, не может быть подготовлена (PREPARE TRANSACTION),
+# а точный список комнат заменяет ROOM_CHANGES_ALL
+DEFER_ROOM_CHANGES_SQL = "SET LOCAL dormitory.defer_notify = 'on';"
+
+# Полезная нагрузка уведомления, означающая, что изменились студенты неизвестных комнат:
+# наблюдатель пересчитывает все отчёты
+ROOM_CHANGES_ALL = "*"
+
+# Триггер students уровня оператора без таблиц переходов (миграция 11): таблица переходов хранит
+# каждую строку оператора, в том числе COPY миллиона строк, и выходит на диск после work_mem.
+# Поэтому триггер отправляет ROOM_CHANGES_ALL, а загрузчики и заселение выполняют DEFER_ROOM_CHANGES_SQL
+# и сами уведомляют о комнатах записанных студентов (notify_room_changes).
+# Создаётся заново при замене таблицы students (команда partition, загрузка с --unlogged).
+STUDENTS_NOTIFY_TRIGGERS_SQL = """
+    DROP TRIGGER IF EXISTS students_notify_insert ON students;
+    DROP TRIGGER IF EXISTS students_notify_update ON students;
+    DROP TRIGGER IF EXISTS students_notify_delete ON students;
+    CREATE OR REPLACE TRIGGER students_notify_changes AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON students
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_students_changed();
+"""
+
+# Первичный ключ секционированной students включает room_id, поэтому глобальную уникальность id
+# обеспечивает таблица student_ids: триггеры уровня оператора переносят в неё id вставленных,
+# изменённых и удалённых студентов, а её первичный ключ отвергает id, уже занятый в другом корпусе.
+# Одновременные вставки одного id упорядочивает уникальный индекс student_ids.
+TRACK_STUDENT_IDS_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION track_student_ids() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO student_ids SELECT id FROM new_rows;
+        ELSIF TG_OP = 'UPDATE' THEN
+            DELETE FROM student_ids WHERE id IN (SELECT id FROM old_rows EXCEPT SELECT id FROM new_rows);
+            INSERT INTO student_ids SELECT id FROM new_rows EXCEPT ALL SELECT id FROM old_rows;
+        ELSIF TG_OP = 'DELETE' THEN
+            DELETE FROM student_ids WHERE id IN (SELECT id FROM old_rows);
+        ELSE
+            TRUNCATE student_ids;
+        END IF;
+        RETURN NULL;
+    END;
+    $$;
+"""
+
+# Создаёт student_ids по текущим строкам students и триггеры, которые её поддерживают;
+# выполняется для секционированной students (команда partition, миграция 10)
+STUDENT_IDS_SQL = """
+    CREATE TABLE student_ids (id INT PRIMARY KEY);
+    INSERT INTO student_ids SELECT id FROM students;
+    CREATE TRIGGER students_track_ids_insert AFTER INSERT ON students
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION track_student_ids();
+    CREATE TRIGGER students_track_ids_update AFTER UPDATE ON students
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION track_student_ids();
+    CREATE TRIGGER students_track_ids_delete AFTER DELETE ON students
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION track_student_ids();
+    CREATE TRIGGER students_track_ids_truncate AFTER TRUNCATE ON students
+        FOR EACH STATEMENT EXECUTE FUNCTION track_student_ids();
+"""
+
+# Версионированные миграции схемы. Каждая применяется один раз, в своей транзакции.
+# Новые миграции добавляются в конец списка; уже выпущенные не изменяются.
+MIGRATIONS: List[Tuple[int, str, str]] = [
+    (1, "rooms and students tables", """
+        CREATE TABLE IF NOT EXISTS rooms (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS students (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            birthday DATE NOT NULL,
+            sex CHAR(1) NOT NULL,
+            room_id INT REFERENCES rooms(id)
+        );
+    """),
+    (2, "room_stats summary table", """
+        CREATE TABLE IF NOT EXISTS room_stats (
+            room_id INT PRIMARY KEY REFERENCES rooms(id),
+            student_count INT NOT NULL,
+            birthday_min DATE,
+            birthday_max DATE,
+            birthday_sum BIGINT,
+            male_count INT NOT NULL,
+            female_count INT NOT NULL
+        );
+    """),
+    (3, "covering index for per-room aggregates", """
+        CREATE INDEX IF NOT EXISTS idx_students_room_id_covering
+            ON students (room_id) INCLUDE (id, birthday, sex);
+        DROP INDEX IF EXISTS idx_students_room_id;
+        DROP INDEX IF EXISTS idx_students_sex;
+    """),
+    (4, "students content hash for delta loads", """
+        ALTER TABLE students ADD COLUMN IF NOT EXISTS content_hash UUID GENERATED ALWAYS AS (
+            md5(name || '|' || (birthday - DATE '1970-01-01')::text || '|' || sex
+                || '|' || COALESCE(room_id::text, ''))::uuid
+        ) STORED;
+    """),
+    (5, "students birthday key for integer age arithmetic", """
+        ALTER TABLE students ADD COLUMN IF NOT EXISTS birthday_key INT GENERATED ALWAYS AS (
+            (EXTRACT(YEAR FROM birthday) * 10000 + EXTRACT(MONTH FROM birthday) * 100
+                + EXTRACT(DAY FROM birthday))::int
+        ) STORED;
+        CREATE INDEX IF NOT EXISTS idx_students_room_id_ages
+            ON students (room_id) INCLUDE (id, birthday_key, birthday, sex);
+        DROP INDEX IF EXISTS idx_students_room_id_covering;
+    """),
+    (6, "room_stats ordering columns for top-k reports", """
+        ALTER TABLE room_stats ADD COLUMN IF NOT EXISTS birthday_mean NUMERIC GENERATED ALWAYS AS (
+            birthday_sum::numeric / NULLIF(student_count, 0)
+        ) STORED;
+        ALTER TABLE room_stats ADD COLUMN IF NOT EXISTS age_span INT GENERATED ALWAYS AS (
+            ((EXTRACT(YEAR FROM birthday_max) * 10000 + EXTRACT(MONTH FROM birthday_max) * 100
+                + EXTRACT(DAY FROM birthday_max))
+            - (EXTRACT(YEAR FROM birthday_min) * 10000 + EXTRACT(MONTH FROM birthday_min) * 100
+                + EXTRACT(DAY FROM birthday_min)))::int / 10000
+        ) STORED;
+        CREATE INDEX IF NOT EXISTS idx_room_stats_birthday_mean
+            ON room_stats (birthday_mean DESC, room_id) WHERE student_count > 0;
+        CREATE INDEX IF NOT EXISTS idx_room_stats_age_span
+            ON room_stats (age_span DESC, room_id) WHERE student_count > 0;
+    """),
+    # Полезная нагрузка NOTIFY ограничена 8000 байтами, поэтому идентификаторы комнат
+    # отправляются порциями по 500 через запятую
+    (7, "change feed triggers for report watchers", """
+        CREATE OR REPLACE FUNCTION notify_room_changes() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            changed INT[];
+            chunk_start INT;
+        BEGIN
+            IF TG_TABLE_NAME = 'rooms' THEN
+                SELECT array_agg(id ORDER BY id) INTO changed FROM new_rows;
+            ELSIF TG_OP = 'INSERT' THEN
+                SELECT array_agg(DISTINCT room_id) INTO changed FROM new_rows;
+            ELSIF TG_OP = 'UPDATE' THEN
+                SELECT array_agg(DISTINCT room_id) INTO changed
+                FROM (SELECT room_id FROM old_rows UNION ALL SELECT room_id FROM new_rows) AS moved;
+            ELSE
+                SELECT array_agg(DISTINCT room_id) INTO changed FROM old_rows;
+            END IF;
+            FOR chunk_start IN 1 .. COALESCE(array_length(changed, 1), 0) BY 500 LOOP
+                PERFORM pg_notify('room_changes', array_to_string(changed[chunk_start:chunk_start + 499], ','));
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$;
+        CREATE OR REPLACE TRIGGER rooms_notify_insert AFTER INSERT ON rooms
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_room_changes();
+        CREATE OR REPLACE TRIGGER rooms_notify_update AFTER UPDATE ON rooms
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_room_changes();
+        CREATE OR REPLACE TRIGGER students_notify_insert AFTER INSERT ON students
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_room_changes();
+        CREATE OR REPLACE TRIGGER students_notify_update AFTER UPDATE ON students
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_room_changes();
+        CREATE OR REPLACE TRIGGER students_notify_delete AFTER DELETE ON students
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_room_changes();
+    """),
+    # Позиция пакетной загрузки записывается в транзакции каждой пачки (load_checkpoint.py)
+    (8, "load checkpoints for resumable loads", """
+        CREATE TABLE IF NOT EXISTS load_checkpoints (
+            source TEXT PRIMARY KEY,
+            size BIGINT NOT NULL,
+            mtime_ns BIGINT NOT NULL,
+            records BIGINT NOT NULL,
+            rows_written BIGINT NOT NULL,
+            unlogged BOOLEAN NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """),
+    # Триггеры не уведомляют об изменениях транзакции с DEFER_ROOM_CHANGES_SQL
+    (9, "deferrable change notifications for prepared transactions", """
+        CREATE OR REPLACE FUNCTION notify_room_changes() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            changed INT[];
+            chunk_start INT;
+        BEGIN
+            IF current_setting('dormitory.defer_notify', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            IF TG_TABLE_NAME = 'rooms' THEN
+                SELECT array_agg(id ORDER BY id) INTO changed FROM new_rows;
+            ELSIF TG_OP = 'INSERT' THEN
+                SELECT array_agg(DISTINCT room_id) INTO changed FROM new_rows;
+            ELSIF TG_OP = 'UPDATE' THEN
+                SELECT array_agg(DISTINCT room_id) INTO changed
+                FROM (SELECT room_id FROM old_rows UNION ALL SELECT room_id FROM new_rows) AS moved;
+            ELSE
+                SELECT array_agg(DISTINCT room_id) INTO changed FROM old_rows;
+            END IF;
+            FOR chunk_start IN 1 .. COALESCE(array_length(changed, 1), 0) BY 500 LOOP
+                PERFORM pg_notify('room_changes', array_to_string(changed[chunk_start:chunk_start + 499], ','));
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$;
+    """),
+    # Уже секционированная students получает student_ids, как после команды partition
+    (10, "globally unique student ids in the partitioned students table", TRACK_STUDENT_IDS_FUNCTION_SQL + """
+        DO $migration$
+        BEGIN
+            IF (SELECT relkind FROM pg_class WHERE oid = 'students'::regclass) = 'p'
+                    AND to_regclass('student_ids') IS NULL THEN
+                EXECUTE $student_ids$""" + STUDENT_IDS_SQL + """$student_ids$;
+            END IF;
+        END;
+        $migration$;
+    """),
+    # Триггеры students с таблицами переходов заменяются триггером без них, см. STUDENTS_NOTIFY_TRIGGERS_SQL
+    (11, "students change notifications without transition tables", """
+        CREATE OR REPLACE FUNCTION notify_students_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF current_setting('dormitory.defer_notify', true) IS DISTINCT FROM 'on' THEN
+                PERFORM pg_notify('room_changes', '*');
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+    """ + STUDENTS_NOTIFY_TRIGGERS_SQL),
+    # Удалённые комнаты тоже уведомляются, чтобы наблюдатель убрал их из отчётов.
+    # Триггеры students функцию больше не используют (миграция 11)
+    (12, "change feed for deleted rooms", """
+        CREATE OR REPLACE FUNCTION notify_room_changes() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            changed INT[];
+            chunk_start INT;
+        BEGIN
+            IF current_setting('dormitory.defer_notify', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'DELETE' THEN
+                SELECT array_agg(id ORDER BY id) INTO changed FROM old_rows;
+            ELSE
+                SELECT array_agg(id ORDER BY id) INTO changed FROM new_rows;
+            END IF;
+            FOR chunk_start IN 1 .. COALESCE(array_length(changed, 1), 0) BY 500 LOOP
+                PERFORM pg_notify('room_changes', array_to_string(changed[chunk_start:chunk_start + 499], ','));
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$;
+        CREATE OR REPLACE TRIGGER rooms_notify_delete AFTER DELETE ON rooms
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_room_changes();
+    """),
+]
+
+
+# Секционирование students по корпусам (команда partition): новая таблица секционируется
+# по диапазонам room_id, данные копируются в неё, и она заменяет прежнюю в одной транзакции.
+# Первичный ключ секционированной таблицы обязан включать ключ секционирования, поэтому
+# уникальность id во всех корпусах обеспечивает student_ids (STUDENT_IDS_SQL); id по-прежнему
+# выдаёт последовательность students_id_seq.
+PARTITION_STUDENTS_SQL = """
+    LOCK TABLE rooms, students IN SHARE ROW EXCLUSIVE MODE;
+    CREATE TABLE students_partitioned (LIKE students INCLUDING DEFAULTS INCLUDING GENERATED)
+        PARTITION BY RANGE (room_id);
+    ALTER TABLE students_partitioned ALTER COLUMN room_id SET NOT NULL;
+"""
+
+SWAP_PARTITIONED_STUDENTS_SQL = """
+    INSERT INTO students_partitioned (id, name, birthday, sex, room_id)
+    SELECT id, name, birthday, sex, room_id FROM students;
+    ALTER SEQUENCE students_id_seq OWNED BY NONE;
+    DROP TABLE students;
+    ALTER TABLE students_partitioned RENAME TO students;
+    ALTER SEQUENCE students_id_seq OWNED BY students.id;
+    ALTER TABLE students ADD PRIMARY KEY (id, room_id);
+    ALTER TABLE students ADD FOREIGN KEY (room_id) REFERENCES rooms(id);
+    CREATE INDEX idx_students_room_id_ages ON students (room_id) INCLUDE (id, birthday_key, birthday, sex);
+    CREATE INDEX idx_students_id ON students (id);
+    ANALYZE students;
+"""
+
+
+# Загрузка с --unlogged: студенты копируются в нежурналируемую таблицу без индексов и ограничений,
+# а в конце она переводится в журналируемую, получает ключи и индексы и заменяет пустую students
+STUDENTS_LOAD_TABLE = "students_load"
+
+CREATE_STUDENTS_LOAD_SQL = """
+    DROP TABLE IF EXISTS students_load;
+    CREATE UNLOGGED TABLE students_load (LIKE students INCLUDING DEFAULTS INCLUDING GENERATED);
+"""
+
+SWAP_LOADED_STUDENTS_SQL = """
+    ALTER TABLE students_load SET LOGGED;
+    ALTER SEQUENCE students_id_seq OWNED BY NONE;
+    DROP TABLE students;
+    ALTER TABLE students_load RENAME TO students;
+    ALTER SEQUENCE students_id_seq OWNED BY students.id;
+    ALTER TABLE students ADD PRIMARY KEY (id);
+    ALTER TABLE students ADD FOREIGN KEY (room_id) REFERENCES rooms(id);
+    CREATE INDEX idx_students_room_id_ages ON students (room_id) INCLUDE (id, birthday_key, birthday, sex);
+    ANALYZE students;
+"""
+
+
+def is_students_partitioned(cursor) -> bool:
+    """
+    Проверяет, секционирована ли таблица students.
+
+    Args:
+        cursor: Курсор базы данных.
+
+    Returns:
+        bool: True, если students — секционированная таблица.
+    """
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = 'students'::regclass;")
+    return cursor.fetchone()[0]
+
+
+def create_student_partition(cursor, building: int, parent: str = "students") -> None:
+    """
+    Создаёт секцию students для корпуса, если её ещё нет.
+
+    Args:
+        cursor: Курсор базы данных.
+        building (int): Номер корпуса.
+        parent (str): Секционированная таблица.
+    """
+    room_id_min, room_id_max = building_room_range(building)
+    cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s);").format(
+        sql.Identifier(f"students_building_{building}"), sql.Identifier(parent)), (room_id_min, room_id_max + 1))
+
+
+def ensure_student_partitions(cursor, room_ids: Iterable[int]) -> None:
+    """
+    Создаёт недостающие секции students для корпусов переданных комнат.
+
+    Для несекционированной таблицы ничего не делает. Строки по секциям раскладывает
+    сама база данных при COPY и INSERT, поэтому загрузчику достаточно вызвать эту функцию
+    при добавлении комнат.
+
+    Args:
+        cursor: Курсор базы данных.
+        room_ids (Iterable[int]): Идентификаторы добавленных комнат.
+    """
+    buildings = sorted({building_of(room_id) for room_id in room_ids})
+    if not buildings or not is_students_partitioned(cursor):
+        return
+    cursor.execute("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = 'students'::regclass;
+    """)
+    existing = {row[0] for row in cursor.fetchall()}
+    for building in buildings:
+        if f"students_building_{building}" not in existing:
+            create_student_partition(cursor, building)
+
+
+def install_students_notify_triggers(cursor) -> bool:
+    """
+    Создаёт триггер уведомлений students, если миграция 11 применена.
+
+    Args:
+        cursor: Курсор базы данных.
+
+    Returns:
+        bool: True, если триггер создан.
+    """
+    cursor.execute("SELECT to_regprocedure('notify_students_changed()') IS NOT NULL;")
+    if not cursor.fetchone()[0]:
+        return False
+    cursor.execute(STUDENTS_NOTIFY_TRIGGERS_SQL)
+    return True
+
+
+def notify_room_changes(cursor, room_ids: Iterable[int]) -> None:
+    """
+    Отправляет в канал ROOM_CHANGES_CHANNEL идентификаторы комнат, изменённых в обход триггеров.
+
+    Args:
+        cursor: Курсор базы данных.
+        room_ids (Iterable[int]): Идентификаторы изменённых комнат.
+    """
+    room_ids = sorted(room_ids)
+    for start in range(0, len(room_ids), ROOM_CHANGES_CHUNK_SIZE):
+        chunk = room_ids[start:start + ROOM_CHANGES_CHUNK_SIZE]
+        cursor.execute("SELECT pg_notify(%s, %s);", (ROOM_CHANGES_CHANNEL, ','.join(map(str, chunk))))
+
+
+def check_unlogged_load_target(cursor) -> None:
+    """
+    Проверяет, что students можно заменить таблицей загрузки с --unlogged.
+
+    SWAP_LOADED_STUDENTS_SQL создаёт обычную таблицу с первичным ключом (id), поэтому замена
+    секционированной students молча отменила бы секционирование.
+
+    Args:
+        cursor: Курсор базы данных.
+
+    Raises:
+        ValueError: Если students секционирована.
+    """
+    if is_students_partitioned(cursor):
+        raise ValueError("Unlogged loads do not support the partitioned students table; load without --unlogged")
+
+
+def create_students_load_table(cursor) -> None:
+    """
+    Создаёт пустую нежурналируемую таблицу STUDENTS_LOAD_TABLE для загрузки с --unlogged.
+
+    Args:
+        cursor: Курсор базы данных.
+
+    Raises:
+        ValueError: Если students секционирована или уже содержит строки.
+    """
+    check_unlogged_load_target(cursor)
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM students);")
+    if cursor.fetchone()[0]:
+        raise ValueError("Unlogged loads replace the students table and require it to be empty")
+    cursor.execute(CREATE_STUDENTS_LOAD_SQL)
+
+
+def swap_loaded_students(cursor) -> None:
+    """
+    Заменяет пустую таблицу students загруженной таблицей STUDENTS_LOAD_TABLE.
+
+    Таблица переводится в журналируемую, получает первичный и внешний ключи, индексы
+    и триггер уведомлений. О комнатах загруженных студентов уведомляет загрузчик.
+
+    Args:
+        cursor: Курсор базы данных.
+
+    Raises:
+        ValueError: Если students за время загрузки секционирована или в ней появились строки.
+    """
+    cursor.execute("LOCK TABLE students IN ACCESS EXCLUSIVE MODE;")
+    check_unlogged_load_target(cursor)
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM students);")
+    if cursor.fetchone()[0]:
+        raise ValueError(f"Table students received rows during the load; {STUDENTS_LOAD_TABLE} was not swapped in")
+    cursor.execute(SWAP_LOADED_STUDENTS_SQL)
+    install_students_notify_triggers(cursor)
+
+
+class SchemaManager:
+    """
+    Класс для создания и обновления схемы базы данных.
+
+    Применённые миграции записываются в таблицу schema_migrations, поэтому повторный
+    запуск ничего не меняет. DDL выполняется один раз при развёртывании, а не в запросах
+    экспорта.
+
+    Args:
+        db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+
+    Methods:
+        current_version() -> int:
+            Возвращает номер последней применённой миграции.
+
+        migrate() -> List[int]:
+            Применяет все ещё не применённые миграции.
+
+        partition_students() -> int:
+            Секционирует таблицу students по корпусам.
+
+        explain_reports(use_room_stats: bool = False, as_of: Optional[date] = None,
+                        building: Optional[int] = None) -> Dict[str, str]:
+            Выполняет EXPLAIN ANALYZE для запросов отчётов и возвращает их планы.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        """
+        Инициализирует экземпляр класса SchemaManager.
+
+        Args:
+            db_manager (DatabaseManager): Менеджер базы данных для работы с данными.
+        """
+        self.db_manager = db_manager
+
+    @staticmethod
+    def _ensure_migrations_table(cursor) -> None:
+        """
+        Создаёт таблицу учёта применённых миграций, если её ещё нет.
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+        """)
+
+    def current_version(self) -> int:
+        """
+        Возвращает номер последней применённой миграции.
+
+        Returns:
+            int: Номер версии схемы или 0, если миграции не применялись.
+        """
+        with self.db_manager as db:
+            with db.conn.cursor() as cursor:
+                cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL;")
+                if not cursor.fetchone()[0]:
+                    return 0
+                cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations;")
+                return cursor.fetchone()[0]
+
+    def migrate(self) -> List[int]:
+        """
+        Применяет все ещё не применённые миграции по порядку.
+
+        Каждая миграция выполняется в отдельной транзакции под advisory-блокировкой,
+        поэтому одновременный запуск с нескольких машин безопасен.
+
+        Returns:
+            List[int]: Номера применённых миграций.
+        """
+        applied = []
+        with self.db_manager as db:
+            for version, description, sql in MIGRATIONS:
+                with db.conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATIONS_LOCK_ID,))
+                    self._ensure_migrations_table(cursor)
+                    cursor.execute("SELECT 1 FROM schema_migrations WHERE version = %s;", (version,))
+                    if cursor.fetchone():
+                        db.conn.commit()
+                        continue
+                    logger.info(f"Applying migration {version}: {description}")
+                    cursor.execute(sql)
+                    cursor.execute("""
+                        INSERT INTO schema_migrations (version, description)
+                        VALUES (%s, %s);
+                    """, (version, description))
+                db.conn.commit()
+                applied.append(version)
+        logger.info(f"Schema is at version {MIGRATIONS[-1][0]}, applied: {applied or 'nothing'}")
+        return applied
+
+    def partition_students(self) -> int:
+        """
+        Секционирует таблицу students по корпусам (диапазонам room_id по ROOMS_PER_BUILDING комнат).
+
+        Создаётся секция для каждого корпуса, в котором есть комнаты; секции новых корпусов
+        загрузчик добавляет сам. Данные переносятся одной транзакцией, на время которой
+        загрузка и экспорт ждут. Уникальность id во всех корпусах обеспечивает таблица student_ids.
+        Повторный запуск ничего не меняет.
+
+        Returns:
+            int: Количество созданных секций или 0, если таблица уже секционирована.
+        """
+        with self.db_manager as db:
+            with db.conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATIONS_LOCK_ID,))
+                if is_students_partitioned(cursor):
+                    logger.info("Table students is already partitioned")
+                    db.conn.rollback()
+                    return 0
+                cursor.execute(PARTITION_STUDENTS_SQL)
+                params = report_params(date.today())
+                cursor.execute(BUILDINGS_QUERY, dict(params, rooms_per_building=ROOMS_PER_BUILDING))
+                buildings = [row[0] for row in cursor.fetchall()]
+                for building in buildings:
+                    create_student_partition(cursor, building, "students_partitioned")
+                cursor.execute(SWAP_PARTITIONED_STUDENTS_SQL)
+                cursor.execute(TRACK_STUDENT_IDS_FUNCTION_SQL)
+                cursor.execute("DROP TABLE IF EXISTS student_ids;")
+                cursor.execute(STUDENT_IDS_SQL)
+                install_students_notify_triggers(cursor)
+            db.conn.commit()
+        logger.info(f"Partitioned students into {len(buildings)} building partitions "
+                    f"of {ROOMS_PER_BUILDING} rooms")
+        return len(buildings)
+
+    def explain_reports(self, use_room_stats: bool = False, as_of: Optional[date] = None,
+                        building: Optional[int] = None) -> Dict[str, str]:
+        """
+        Выполняет EXPLAIN (ANALYZE, BUFFERS) для запросов всех отчётов.
+
+        Args:
+            use_room_stats (bool): Анализировать запросы по room_stats вместо students.
+            as_of (Optional[date]): Дата, на которую вычисляется возраст; по умолчанию текущая.
+            building (Optional[int]): Номер корпуса, которым ограничены отчёты; None означает все комнаты.
+
+        Returns:
+            Dict[str, str]: План выполнения каждого отчёта.
+        """
+        queries = ROOM_STATS_REPORT_QUERIES if use_room_stats else REPORT_QUERIES
+        params = report_params(as_of or date.today(), building=building)
+        plans = {}
+        with self.db_manager as db:
+            with db.conn.cursor() as cursor:
+                for report_name, query in queries.items():
+                    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+                    plans[report_name] = "\n".join(row[0] for row in cursor.fetchall())
+            db.conn.rollback()
+        return plans
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the database schema.")
+    parser.add_argument("command", choices=["migrate", "status", "explain", "partition"],
+                        help="migrate: apply pending migrations; status: print schema version; "
+                             "explain: print EXPLAIN ANALYZE plans of the export queries; "
+                             "partition: partition the students table by building.")
+    parser.add_argument("--room-stats", action="store_true",
+                        help="With explain: analyze the room_stats report queries.")
+    parser.add_argument("--as-of", type=date.fromisoformat,
+                        help="With explain: date (YYYY-MM-DD) as of which ages are computed; today by default.")
+    parser.add_argument("--building", type=int,
+                        help="With explain: analyze the report queries restricted to this building.")
+
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
+    schema_manager = SchemaManager(db_manager)
+
+    if args.command == "migrate":
+        schema_manager.migrate()
+
+    if args.command == "status":
+        print(f"Schema version: {schema_manager.current_version()} (latest: {MIGRATIONS[-1][0]})")
+
+    if args.command == "partition":
+        schema_manager.partition_students()
+
+    if args.command == "explain":
+        for report_name, plan in schema_manager.explain_reports(args.room_stats, args.as_of, args.building).items():
+            print(f"-- {report_name}\n{plan}\n")
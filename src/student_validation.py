@@ -0,0 +1,103 @@
+import json
+import re
+from datetime import date, datetime
+from typing import Any, Collection, Dict, List, Optional, TextIO, Tuple
+
+VALID_SEXES = frozenset({'M', 'F'})
+STUDENT_FIELDS = ('id', 'name', 'birthday', 'sex', 'room')
+
+# Формат дат рождения во входных файлах: 2004-01-05T00:00:00.000000
+_BIRTHDAY_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+# Строки, которые strptime с _BIRTHDAY_FORMAT разбирает так же, как срез даты (секунды до 61, как у %S)
+_BIRTHDAY_RE = re.compile(r"\d{4}-\d{2}-\d{2}T(?:[01]\d|2[0-3]):[0-5]\d:(?:[0-5]\d|6[01])\.\d{6}", re.ASCII)
+
+
+def _parse_birthday(value: str) -> Optional[date]:
+    """
+    Разбирает одну дату рождения; возвращает None для некорректного значения.
+
+    Строки фиксированного формата с допустимым временем разбираются срезом даты без strptime,
+    остальные строки — через strptime с тем же форматом.
+    """
+    try:
+        if _BIRTHDAY_RE.fullmatch(value):
+            return date.fromisoformat(value[:10])
+        return datetime.strptime(value, _BIRTHDAY_FORMAT).date()
+    except ValueError:
+        return None
+
+
+def parse_birthdays(values: List[Any]) -> List[Optional[date]]:
+    """
+    Разбирает столбец дат рождения целиком.
+
+    Каждое уникальное значение разбирается один раз: дат рождения намного меньше,
+    чем студентов, поэтому большая часть столбца заполняется поиском в словаре.
+
+    Args:
+        values (List[Any]): Значения поля birthday.
+
+    Returns:
+        List[Optional[date]]: Даты рождения; None на месте некорректных значений.
+    """
+    parsed = {value: _parse_birthday(value) for value in set(value for value in values if isinstance(value, str))}
+    return [parsed.get(value) if isinstance(value, str) else None for value in values]
+
+
+def validate_students(students_data: List[Dict[str, Any]],
+                      room_ids: Optional[Collection[int]]) -> Tuple[List[Tuple], List[Dict[str, Any]]]:
+    """
+    Проверяет пачку студентов по столбцам и преобразует корректные записи в строки таблицы students.
+
+    Даты рождения, пол и ссылки на комнаты проверяются за один проход по столбцам пачки.
+    Некорректные записи не вставляются и возвращаются вместе с причиной отказа.
+
+    Args:
+        students_data (List[Dict[str, Any]]): Пачка словарей с данными о студентах.
+        room_ids (Optional[Collection[int]]): Идентификаторы существующих комнат; None — не проверять
+            комнату (для заселяемых студентов, которым комната ещё не назначена).
+
+    Returns:
+        Tuple[List[Tuple], List[Dict[str, Any]]]: Строки id, name, birthday, sex, room_id для вставки
+            и отклонённые записи вида {"reason": ..., "record": ...}.
+    """
+    columns = {field: [student.get(field) for student in students_data] for field in STUDENT_FIELDS}
+    birthdays = parse_birthdays(columns['birthday'])
+    sex_valid = [isinstance(sex, str) and sex in VALID_SEXES for sex in columns['sex']]
+    if room_ids is None:
+        room_valid = [True] * len(students_data)
+    else:
+        room_valid = [isinstance(room, int) and room in room_ids for room in columns['room']]
+
+    rows = []
+    rejected = []
+    for index, (student_id, name, birthday, sex, room) in enumerate(
+            zip(columns['id'], columns['name'], birthdays, columns['sex'], columns['room'])):
+        if birthday is not None and sex_valid[index] and room_valid[index] \
+                and student_id is not None and name is not None:
+            rows.append((student_id, name, birthday, sex, room))
+            continue
+
+        student = students_data[index]
+        if student_id is None or name is None:
+            reason = f"missing {'id' if student_id is None else 'name'}"
+        elif birthday is None:
+            reason = f"invalid birthday {student.get('birthday')!r}"
+        elif not sex_valid[index]:
+            reason = f"invalid sex {sex!r}"
+        else:
+            reason = f"unknown room {room!r}"
+        rejected.append({"reason": reason, "record": student})
+    return rows, rejected
+
+
+def write_rejected(file: TextIO, rejected: List[Dict[str, Any]]) -> None:
+    """
+    Дописывает отклонённые записи в файл в формате JSON Lines.
+
+    Args:
+        file (TextIO): Файл, открытый на запись.
+        rejected (List[Dict[str, Any]]): Отклонённые записи с причиной отказа.
+    """
+    for item in rejected:
+        file.write(json.dumps(item, ensure_ascii=False, default=str) + '\n')
@@ -1,11 +1,50 @@
+import asyncio
+import io
 import json
+import os
+import queue
+import select
 import sqlite3
+import struct
+import tempfile
+import threading
 import unittest
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
 from unittest.mock import MagicMock, patch
 
-from config import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
+import numpy as np
+import psycopg2.errors
+import psycopg2.extensions
+import psycopg2.pool
+import pyarrow as pa
+
+from config import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER, ROOMS_PER_BUILDING
+from data_compiler import (COMPILED_STUDENTS_SCHEMA, POSTGRES_EPOCH_DAYS, DataCompiler, iter_compiled_batches,
+                           iter_room_records, students_copy_data)
+from data_exporter_arrow import STUDENTS_SCHEMA, read_snapshot, students_batch
+from data_exporter_async import AsyncDataExporter
 from data_exporter_json import DataExporterJson
-from database_manager import DatabaseManager
+from data_loader import (CHANGED_STUDENTS_ROOMS_SQL, DELETE_MISSING_STUDENTS_SQL, INSERT_NEW_STUDENTS_SQL,
+                         STUDENTS_STAGING_COPY_SQL, UPDATE_STUDENTS_SQL, CsvCopyStream, DataLoader, init_csv_worker,
+                         students_csv_chunk)
+from database_manager import ConnectionPool, DatabaseManager
+from export_engine import ExportEngine, write_records
+from json_stream import batched, iter_json_records, write_json_array
+from load_checkpoint import LoadCheckpoint
+from metrics import Metrics
+from offline_reports import EPOCH_ORDINAL, OfflineRoomReports, ages_in_years, numeric_average
+from query_cache import QueryCache
+from report_watcher import LiveRoomReports
+from room_placement import RoomAllocator
+from room_reports import (REFRESH_ROOM_STATS_QUERY, REPORT_BUILDERS, REPORT_FIELDS, REPORT_QUERIES, RoomAggregate,
+                          building_of, building_room_range, date_key, derive_reports, fetch_room_aggregates,
+                          report_params)
+from schema import (MIGRATIONS_LOCK_ID, ROOM_CHANGES_ALL, ROOM_CHANGES_CHANNEL, SWAP_LOADED_STUDENTS_SQL, SchemaManager,
+                    swap_loaded_students)
+from student_validation import parse_birthdays, validate_students
+from xml_stream import write_xml_records
 
 
 class TestDatabaseManager(unittest.TestCase):
@@ -23,7 +62,928 @@ class TestDatabaseManager(unittest.TestCase):
             mock_logging.info.assert_called_with("Successfully connected to the database")
             self.assertIsNotNone(db_manager.conn)
 
+    @staticmethod
+    def make_connection():
+        conn = TestConnectionPool.make_connection()
+        conn.cursor.return_value.__enter__.return_value.__iter__.side_effect = lambda: iter([(1,), (2,)])
+        return conn
+
+    def make_manager(self):
+        db_manager = DatabaseManager(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
+        db_manager.pool = ConnectionPool(self.make_connection, max_size=3, timeout=0)
+        return db_manager
+
+    def test_nested_contexts_return_their_own_connections(self):
+        db_manager = self.make_manager()
+
+        with db_manager as db:
+            outer = db.conn
+            with db_manager:
+                self.assertIsNot(db.conn, outer)
+            self.assertIs(db.conn, outer)
+            thread_conns = []
+            thread = threading.Thread(target=lambda: thread_conns.append(db_manager.conn))
+            thread.start()
+            thread.join()
+            self.assertEqual(thread_conns, [None])
+
+        self.assertIsNone(db_manager.conn)
+        self.assertEqual(db_manager.pool_stats()["in_use"], 0)
+
+    def test_streams_use_separate_connections_and_cursor_names(self):
+        db_manager = self.make_manager()
+
+        with db_manager as db:
+            first = db_manager.stream("SELECT 1;")
+            second = db_manager.stream("SELECT 2;")
+            next(first, None)
+            next(second, None)
+            self.assertEqual(db_manager.pool_stats()["in_use"], 3)
+            first.close()
+            second.close()
+            self.assertIsNotNone(db.conn)
+
+        self.assertEqual(db_manager.pool_stats()["in_use"], 0)
+        names = [conn.cursor.call_args.kwargs["name"] for conn, _ in db_manager.pool._idle if conn.cursor.called]
+        self.assertEqual(len(set(names)), 2)
+
+
+class TestConnectionPool(unittest.TestCase):
+    @staticmethod
+    def make_connection():
+        conn = MagicMock()
+        conn.closed = 0
+        conn.get_transaction_status.return_value = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        return conn
+
+    def test_connection_is_reused(self):
+        connect = MagicMock(side_effect=self.make_connection)
+        pool = ConnectionPool(connect, min_size=1, max_size=2)
+
+        first = pool.getconn()
+        pool.putconn(first)
+        second = pool.getconn()
+
+        self.assertIs(first, second)
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(pool.stats()["hits"], 1)
+        self.assertEqual(pool.stats()["misses"], 1)
+
+    def test_closed_connection_is_replaced(self):
+        pool = ConnectionPool(self.make_connection, min_size=1, max_size=2)
+
+        first = pool.getconn()
+        pool.putconn(first)
+        first.closed = 1
+        second = pool.getconn()
+
+        self.assertIsNot(first, second)
+        self.assertEqual(pool.stats()["misses"], 2)
+
+    def test_exhausted_pool(self):
+        pool = ConnectionPool(self.make_connection, max_size=1, timeout=0)
+        pool.getconn()
+
+        with self.assertRaises(psycopg2.pool.PoolError):
+            pool.getconn()
+
+
+class TestJsonStream(unittest.TestCase):
+    def write_temp_file(self, content):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_array_records_across_chunk_boundaries(self):
+        records = [{"id": 1, "name": "Room ]1"}, 25, 3.5, None, [1, {"a": "b"}]]
+        file_path = self.write_temp_file(json.dumps(records, indent=4))
+
+        for chunk_size in (1, 3, 1024):
+            self.assertEqual(list(iter_json_records(file_path, chunk_size)), records)
+
+    def test_json_lines(self):
+        file_path = self.write_temp_file('{"id": 1}\n\n{"id": 2}\n')
+
+        self.assertEqual(list(iter_json_records(file_path)), [{"id": 1}, {"id": 2}])
+
+    def test_json_lines_of_arrays(self):
+        file_path = self.write_temp_file('[1, 2]\n[3]\n')
+
+        self.assertEqual(list(iter_json_records(file_path)), [[1, 2], [3]])
+
+    @patch('json_stream.MAX_RECORD_SIZE', 64)
+    def test_malformed_element_stops_at_record_limit(self):
+        head = '[{"id": 1}, '
+        file_path = self.write_temp_file(head + '{"id": oops' + ', {"id": 2}' * 1000 + ']')
+
+        with self.assertRaisesRegex(ValueError, f"at byte {len(head)} "):
+            list(iter_json_records(file_path, 4))
+
+    def test_truncated_array(self):
+        file_path = self.write_temp_file('[{"id": 1}, {"id": 2}')
+
+        with self.assertRaises(ValueError):
+            list(iter_json_records(file_path, 4))
+
+    def test_write_json_array_matches_json_dump(self):
+        records = [{"id": 1, "name": "Room #1", "student_count": 2}, {"id": 2, "name": "Room #2"}]
+
+        for records_to_write in (records, []):
+            output = io.StringIO()
+            write_json_array(output, iter(records_to_write), indent=2)
+            self.assertEqual(output.getvalue(), json.dumps(records_to_write, indent=2))
+
+    def test_write_json_array_compact(self):
+        output = io.StringIO()
+        write_json_array(output, iter([{"id": 1}, {"id": 2}]), indent=None)
+
+        self.assertEqual(output.getvalue(), '[{"id":1},{"id":2}]')
+
+    def test_batched(self):
+        self.assertEqual(list(batched(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+
+class TestXmlStream(unittest.TestCase):
+    def test_indented_output(self):
+        output = io.StringIO()
+        write_xml_records(output, "rooms", iter([{"id": 1, "name": "A & B"}]))
+
+        self.assertEqual(output.getvalue(), (
+            '<?xml version="1.0" ?>\n'
+            '<rooms>\n'
+            '    <room>\n'
+            '        <id>1</id>\n'
+            '        <name>A &amp; B</name>\n'
+            '    </room>\n'
+            '</rooms>\n'
+        ))
+
+    def test_empty_compact_output(self):
+        output = io.StringIO()
+        write_xml_records(output, "rooms", iter([]), indent=None)
+
+        self.assertEqual(output.getvalue(), '<?xml version="1.0" ?><rooms/>')
+
+
+class TestExportEngine(unittest.TestCase):
+    def test_write_records_to_every_format(self):
+        records = [{"id": 1, "name": "Room #1", "student_count": 2}, {"id": 2, "name": "Room, 2", "student_count": 0}]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_files = {export_format: os.path.join(temp_dir, f"report.{export_format}")
+                            for export_format in ("json", "xml", "csv", "ndjson")}
+
+            written = write_records("rooms_with_student_count", iter(records), output_files)
+
+            contents = {}
+            for export_format, output_file in output_files.items():
+                with open(output_file) as file:
+                    contents[export_format] = file.read()
+
+        self.assertEqual(written, 2)
+        self.assertEqual(json.loads(contents["json"]), records)
+        self.assertIn("<name>Room, 2</name>", contents["xml"])
+        self.assertEqual(contents["csv"], 'id,name,student_count\n1,Room #1,2\n2,"Room, 2",0\n')
+        self.assertEqual([json.loads(line) for line in contents["ndjson"].splitlines()], records)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            write_records("rooms_with_student_count", iter([]), {"yaml": "report.yaml"})
+
+    @patch('export_engine.fetch_room_aggregates')
+    def test_export_all_reads_room_stats_reports(self, fetch_room_aggregates):
+        engine = ExportEngine(MagicMock(), use_room_stats=True, as_of=date(2024, 9, 1))
+        engine.fetch_report = MagicMock(return_value=[(1, "Room #1")])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            reports = engine.export_all(temp_dir)
+
+        fetch_room_aggregates.assert_not_called()
+        self.assertEqual(engine.fetch_report.call_count, 4)
+        self.assertEqual(reports["rooms_with_multiple_sex"], [{"id": 1, "name": "Room #1"}])
+
+
+class TestAsyncDataExporter(unittest.TestCase):
+    def test_cancelled_query_is_cancelled_and_not_pooled(self):
+        exporter = AsyncDataExporter(DatabaseManager(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT), pool_size=1)
+        sleep_query = f"SELECT pg_sleep(30), '{uuid.uuid4().hex}';"
+
+        async def cancel_sleep():
+            async with exporter:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(exporter._query(sleep_query), 0.2)
+                self.assertEqual((exporter._idle, exporter._opened), ([], 0))
+                return await asyncio.wait_for(exporter._query(
+                    "SELECT count(*) FROM pg_stat_activity WHERE state = 'active' AND query = %(query)s;",
+                    {"query": sleep_query}), 5)
+
+        self.assertEqual(asyncio.run(cancel_sleep()), [(0,)])
+
+
+class TestArrowSnapshot(unittest.TestCase):
+    def test_students_batch_round_trip(self):
+        rows = [(1, "A", date(2004, 1, 5), "F", 7, "Room #7"), (2, "B", date(1999, 12, 31), "M", None, None)]
+        batch = students_batch(rows)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            snapshot_file = os.path.join(temp_dir, "students.arrow")
+            with pa.ipc.new_file(snapshot_file, STUDENTS_SCHEMA) as writer:
+                writer.write_batch(batch)
+            table = read_snapshot(snapshot_file)
+
+            self.assertEqual(table.schema, STUDENTS_SCHEMA)
+            self.assertEqual(table.column("sex").chunk(0).indices.to_pylist(), [0, 1])
+            self.assertEqual([tuple(row.values()) for row in table.to_pylist()], rows)
+            del table
+
+
+class TestDataCompiler(unittest.TestCase):
+    def test_compiled_students_encode_as_binary_copy_tuples(self):
+        rooms = [{"id": 1, "name": "Room #1"}, {"id": 2, "name": "Room #2"}]
+        students = [
+            {"id": 10, "name": "Zoë", "birthday": "2004-03-01T00:00:00.000000", "sex": "F", "room": 2},
+            {"id": 11, "name": "", "birthday": "1999-12-31T00:00:00.000000", "sex": "M", "room": 1},
+            {"id": 12, "name": "C", "birthday": "2001-03-02T00:00:00.000000", "sex": "X", "room": 1},
+        ]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            rooms_file = os.path.join(temp_dir, "rooms.json")
+            students_file = os.path.join(temp_dir, "students.json")
+            for file_path, records in ((rooms_file, rooms), (students_file, students)):
+                with open(file_path, 'w') as file:
+                    json.dump(records, file)
+
+            compiler = DataCompiler(rejects_file=os.path.join(temp_dir, "rejects.jsonl"))
+            files = compiler.compile_data(rooms_file, students_file, os.path.join(temp_dir, "compiled"))
+            compiled_rooms = list(iter_room_records(files["rooms"]))
+            data = b"".join(students_copy_data(batch)
+                            for batch in iter_compiled_batches(files["students"], COMPILED_STUDENTS_SCHEMA))
+
+        def copy_tuple(student_id, room_id, birthday, sex, name):
+            days = date.fromisoformat(birthday).toordinal() - date(1970, 1, 1).toordinal() - POSTGRES_EPOCH_DAYS
+            encoded = name.encode()
+            return struct.pack(f">hiiiiiiic i{len(encoded)}s", 5, 4, student_id, 4, room_id, 4, days, 1, sex.encode(),
+                               len(encoded), encoded)
+
+        self.assertEqual(compiled_rooms, rooms)
+        self.assertEqual(compiler.rejected_count, 1)
+        self.assertEqual(data, copy_tuple(10, 2, "2004-03-01", "F", "Zoë") + copy_tuple(11, 1, "1999-12-31", "M", ""))
+
+
+class TestCsvCopy(unittest.TestCase):
+    students = [
+        {"id": 1, "name": 'Doe, "Jr."\nthe second', "birthday": "2004-01-05T00:00:00.000000", "sex": "M", "room": None},
+        {"id": 2, "name": "", "birthday": "1999-12-31T00:00:00.000000", "sex": "F", "room": 7},
+        {"id": 3, "name": "Zoë", "birthday": "2001-06-15T00:00:00.000000", "sex": "F", "room": 7},
+    ]
+
+    def test_copy_stream_quotes_names_and_leaves_null_rooms_empty(self):
+        rows, rejected = validate_students(self.students, None)
+        stream = CsvCopyStream(rows)
+
+        chunks = list(iter(lambda: stream.read(7), ''))
+
+        self.assertEqual(rejected, [])
+        self.assertEqual(''.join(chunks), '1,"Doe, ""Jr.""\nthe second",2004-01-05,M,\n'
+                                          '2,,1999-12-31,F,7\n'
+                                          '3,Zoë,2001-06-15,F,7\n')
+        self.assertTrue(all(len(chunk) <= 7 for chunk in chunks))
+        self.assertEqual(stream.rows_written, 3)
+        self.assertEqual(stream.bytes_written, len(''.join(chunks)))
+
+    def test_csv_chunk_rejects_null_rooms(self):
+        self.addCleanup(init_csv_worker, frozenset())
+        init_csv_worker({7})
+
+        data, rows, rejected, _ = students_csv_chunk(self.students)
+
+        self.assertEqual(data, '2,,1999-12-31,F,7\n3,Zoë,2001-06-15,F,7\n')
+        self.assertEqual(rows, 2)
+        self.assertEqual(rejected, [{"reason": "unknown room None", "record": self.students[0]}])
+
+
+class TestLoadCheckpoint(unittest.TestCase):
+    def test_checkpoint_is_rejected_after_source_changes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            students_file = os.path.join(temp_dir, "students.json")
+            with open(students_file, 'w') as file:
+                json.dump([{"id": 1}], file)
+            checkpoint = LoadCheckpoint()
+            cursor = MagicMock()
+            cursor.fetchone.return_value = None
+
+            self.assertIsNone(checkpoint.load(cursor, students_file))
+            checkpoint.save(cursor, students_file, 1, 1, False)
+            source, *saved = cursor.execute.call_args.args[1]
+            self.assertEqual(source, os.path.abspath(students_file))
+            cursor.fetchone.return_value = tuple(saved)
+            self.assertEqual(checkpoint.load(cursor, students_file),
+                             {"records": 1, "rows_written": 1, "unlogged": False})
+
+            with open(students_file, 'a') as file:
+                file.write("\n")
+            with self.assertRaises(ValueError):
+                checkpoint.load(cursor, students_file)
+
+
+class TestSyncStudents(unittest.TestCase):
+    def make_loader(self, temp_dir, students):
+        students_file = os.path.join(temp_dir, "students.json")
+        with open(students_file, 'w') as file:
+            json.dump(students, file)
+        db_manager = MagicMock()
+        cursor = db_manager.__enter__.return_value.conn.cursor.return_value.__enter__.return_value
+        loader = DataLoader(db_manager, rejects_file=os.path.join(temp_dir, "rejected.jsonl"))
+        return loader, students_file, cursor
+
+    def test_only_changed_students_are_merged_and_rejected_ones_are_kept(self):
+        students = [
+            {"id": 1, "name": "A, \"B\"", "birthday": "2004-01-05T00:00:00.000000", "sex": "F", "room": 1},
+            {"id": 2, "name": "C", "birthday": "2004-01-05T00:00:00.000000", "sex": "X", "room": 1},
+            {"id": 3, "name": "D", "birthday": "2003-02-28T00:00:00.000000", "sex": "M", "room": 2},
+            {"id": 4, "name": "E", "birthday": "2002-03-01T00:00:00.000000", "sex": "M", "room": 2},
+        ]
+        results = {
+            "SELECT id FROM rooms;": [(1,), (2,)],
+            CHANGED_STUDENTS_ROOMS_SQL: [(1,)],
+            UPDATE_STUDENTS_SQL: [(2,)],
+            INSERT_NEW_STUDENTS_SQL: [(2,)],
+            DELETE_MISSING_STUDENTS_SQL: [(5,)],
+        }
+        with tempfile.TemporaryDirectory() as temp_dir:
+            loader, students_file, cursor = self.make_loader(temp_dir, students)
+            cursor.fetchall.side_effect = lambda: results[cursor.execute.call_args.args[0]]
+            staged = []
+            cursor.copy_expert.side_effect = lambda sql, stream: staged.append((sql, stream.read()))
+
+            counts = loader.sync_students_data(students_file)
+
+        self.assertEqual(counts, {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 1})
+        self.assertEqual(staged, [(STUDENTS_STAGING_COPY_SQL, '1,"A, ""B""",2004-01-05,F,1\n'
+                                                              '3,D,2003-02-28,M,2\n'
+                                                              '4,E,2002-03-01,M,2\n')])
+        executed = [call.args for call in cursor.execute.call_args_list]
+        merge = [query for query, *_ in executed
+                 if query in (CHANGED_STUDENTS_ROOMS_SQL, UPDATE_STUDENTS_SQL, INSERT_NEW_STUDENTS_SQL)]
+        self.assertEqual(merge, [CHANGED_STUDENTS_ROOMS_SQL, UPDATE_STUDENTS_SQL, INSERT_NEW_STUDENTS_SQL])
+        self.assertIn((DELETE_MISSING_STUDENTS_SQL, ([2],)), executed)
+        self.assertIn("AND students.id <> ALL(%s::int[])", DELETE_MISSING_STUDENTS_SQL)
+        for query in (CHANGED_STUDENTS_ROOMS_SQL, UPDATE_STUDENTS_SQL):
+            self.assertIn("students.content_hash IS DISTINCT FROM", query)
+        self.assertIn((REFRESH_ROOM_STATS_QUERY, ([1, 2, 5],)), executed)
+        loader.db_manager.__enter__.return_value.conn.commit.assert_called_once()
+
+    def test_duplicate_ids_in_one_file_abort_the_sync(self):
+        student = {"id": 1, "name": "A", "birthday": "2004-01-05T00:00:00.000000", "sex": "F", "room": 1}
+        error = psycopg2.errors.UniqueViolation()
+
+        def execute(query, params=None):
+            if query == "ALTER TABLE students_staging ADD PRIMARY KEY (id);":
+                raise error
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            loader, students_file, cursor = self.make_loader(temp_dir, [student, dict(student, name="B")])
+            cursor.fetchall.return_value = [(1,)]
+            cursor.execute.side_effect = execute
+            with self.assertRaises(psycopg2.errors.UniqueViolation):
+                loader.sync_students_data(students_file)
+
+        executed = [call.args[0] for call in cursor.execute.call_args_list]
+        self.assertNotIn(UPDATE_STUDENTS_SQL, executed)
+        self.assertNotIn(INSERT_NEW_STUDENTS_SQL, executed)
+        loader.db_manager.__enter__.return_value.conn.commit.assert_not_called()
+
+
+class TestParallelLoad(unittest.TestCase):
+    def make_manager(self, connect_error=None):
+        def connect():
+            if connect_error is not None:
+                raise connect_error
+            conn = TestConnectionPool.make_connection()
+            self.connections.append(conn)
+            return conn
+
+        db_manager = DatabaseManager(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
+        db_manager.pool = ConnectionPool(connect, max_size=3, timeout=0)
+        return db_manager
+
+    def setUp(self):
+        self.connections = []
+        self.loader = DataLoader(self.make_manager())
+
+    def run_writers(self, managers, chunks, parties=None):
+        """
+        Запускает потоки записи с менеджерами managers и возвращает ошибки загрузки.
+        """
+        chunk_queue = queue.Queue()
+        for chunk in chunks + [None] * len(managers):
+            chunk_queue.put(chunk)
+        barrier = threading.Barrier(parties or len(managers))
+        failed = threading.Event()
+        errors = []
+        with patch('data_loader.DatabaseManager', side_effect=managers):
+            writers = [threading.Thread(target=self.loader._copy_chunks_worker,
+                                        args=(chunk_queue, barrier, failed, errors, ("load", str(index))))
+                       for index in range(len(managers))]
+            for writer in writers:
+                writer.start()
+            for writer in writers:
+                writer.join(5)
+        self.assertFalse(any(writer.is_alive() for writer in writers))
+        self.assertTrue(chunk_queue.empty())
+        return errors
+
+    def test_writers_commit_after_every_prepare(self):
+        errors = self.run_writers([self.make_manager(), self.make_manager()], ["1,a\n", "2,b\n"])
+
+        self.assertEqual(errors, [])
+        for conn in self.connections:
+            conn.tpc_prepare.assert_called_once()
+            conn.tpc_commit.assert_called_once()
+            conn.tpc_rollback.assert_not_called()
+
+    def test_failed_write_rolls_back_every_connection(self):
+        managers = [self.make_manager(), self.make_manager()]
+        error = psycopg2.Error("copy failed")
+        with managers[0] as db:
+            db.conn.cursor.return_value.__enter__.return_value.copy_expert.side_effect = error
+
+        errors = self.run_writers(managers, ["1,a\n", "2,b\n", "3,c\n"])
+
+        self.assertIs(errors[0], error)
+        for conn in self.connections:
+            conn.tpc_commit.assert_not_called()
+            conn.tpc_rollback.assert_called_once()
+
+    def test_writer_without_connection_breaks_the_barrier(self):
+        error = psycopg2.OperationalError("connection refused")
+
+        with patch('data_loader.LOAD_COMMIT_TIMEOUT', 30):
+            errors = self.run_writers([self.make_manager(error), self.make_manager()], ["1,a\n"])
+
+        self.assertIsInstance(errors[0], psycopg2.OperationalError)
+        self.assertIsInstance(errors[1], threading.BrokenBarrierError)
+        self.connections[0].tpc_commit.assert_not_called()
+        self.connections[0].tpc_rollback.assert_called_once()
+
+    def test_barrier_timeout_rolls_back(self):
+        with patch('data_loader.LOAD_COMMIT_TIMEOUT', 0.1):
+            errors = self.run_writers([self.make_manager()], ["1,a\n"], parties=2)
+
+        self.assertEqual([type(error) for error in errors], [threading.BrokenBarrierError])
+        self.connections[0].tpc_commit.assert_not_called()
+        self.connections[0].tpc_rollback.assert_called_once()
+
+    def write_students(self, directory, count):
+        students_file = os.path.join(directory, "students.json")
+        with open(students_file, 'w') as file:
+            json.dump([{"id": index, "name": f"Student {index}", "birthday": "2004-01-05T00:00:00.000000",
+                        "sex": "F", "room": 1} for index in range(count)], file)
+        return students_file
+
+    def test_without_prepared_transactions_one_connection_writes(self):
+        cursor = self.loader.db_manager.pool.getconn().cursor.return_value.__enter__.return_value
+        self.loader.db_manager.pool.putconn(self.connections[0])
+        cursor.fetchall.return_value = [(1,)]
+        cursor.fetchone.return_value = (0,)
+        writers = []
+
+        def make_writer(*args):
+            writers.append(self.make_manager())
+            return writers[-1]
+
+        with tempfile.TemporaryDirectory() as temp_dir, patch('data_loader.DatabaseManager', side_effect=make_writer):
+            self.loader.load_students_data_parallel(self.write_students(temp_dir, 3), workers=3)
+
+        self.assertEqual(len(writers), 1)
+        writer_conn = self.connections[1]
+        writer_conn.tpc_begin.assert_not_called()
+        writer_conn.commit.assert_called_once()
+        copied = writer_conn.cursor.return_value.__enter__.return_value.copy_expert.call_args.args[1].getvalue()
+        self.assertEqual(len(copied.splitlines()), 3)
+
+    def test_failed_writer_stops_parsing(self):
+        cursor = self.loader.db_manager.pool.getconn().cursor.return_value.__enter__.return_value
+        self.loader.db_manager.pool.putconn(self.connections[0])
+        cursor.fetchall.return_value = [(1,)]
+        cursor.fetchone.return_value = (2,)
+        error = psycopg2.OperationalError("connection refused")
+        connect_failed = threading.Event()
+        parsed = []
+
+        def make_writer(*args):
+            connect_failed.set()
+            return self.make_manager(error)
+
+        def iter_records(path):
+            for index in range(1000):
+                connect_failed.wait(5)
+                parsed.append(index)
+                yield {"id": index, "name": "A", "birthday": "2004-01-05T00:00:00.000000", "sex": "F", "room": 1}
+
+        self.loader.batch_size = 1
+        with patch('data_loader.DatabaseManager', side_effect=make_writer), \
+                patch('data_loader.iter_json_records', iter_records):
+            with self.assertRaises(psycopg2.OperationalError):
+                self.loader.load_students_data_parallel("students.json", workers=2)
+
+        self.assertLess(len(parsed), 1000)
+
+
+class TestOfflineRoomReports(unittest.TestCase):
+    def test_numeric_average_matches_postgresql(self):
+        self.assertEqual(str(numeric_average(130, 10)), "13.0000000000000000")
+        self.assertEqual(str(numeric_average(70, 3)), "23.3333333333333333")
+        self.assertEqual(str(numeric_average(2, 3)), "0.66666666666666666667")
+
+    def test_ages_match_birthday_key_arithmetic(self):
+        as_of = date(2024, 2, 28)
+        birthdays = [date(2000, 2, 29), date(2004, 2, 28), date(2004, 2, 29), date(1999, 12, 31),
+                     date(2024, 3, 1), date(2025, 3, 1)]
+
+        ages = ages_in_years(np.array([day.toordinal() - EPOCH_ORDINAL for day in birthdays]), as_of)
+
+        self.assertEqual(date_key(as_of), 20240228)
+        self.assertEqual(ages.tolist(), [23, 20, 19, 24, 0, -1])
+
+    def test_reports(self):
+        rooms = [{"id": 1, "name": "Room #1"}, {"id": 2, "name": "Room #2"}, {"id": 3, "name": "Room #3"}]
+        students = [
+            {"id": 1, "name": "A", "birthday": "2004-03-01T00:00:00.000000", "sex": "F", "room": 1},
+            {"id": 2, "name": "B", "birthday": "2000-02-29T00:00:00.000000", "sex": "M", "room": 1},
+            {"id": 3, "name": "C", "birthday": "2001-03-02T00:00:00.000000", "sex": "M", "room": 2},
+            {"id": 4, "name": "D", "birthday": "2001-03-02T00:00:00.000000", "sex": "X", "room": 2},
+        ]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            rooms_file = os.path.join(temp_dir, "rooms.json")
+            students_file = os.path.join(temp_dir, "students.json")
+            for file_path, records in ((rooms_file, rooms), (students_file, students)):
+                with open(file_path, 'w') as file:
+                    json.dump(records, file)
+
+            engine = OfflineRoomReports(as_of=date(2024, 3, 1))
+            engine.load(rooms_file, students_file)
+            reports = engine.reports()
+
+        self.assertEqual(engine.rejected_count, 1)
+        self.assertEqual([room["student_count"] for room in reports["rooms_with_student_count"]], [2, 1, 0])
+        self.assertEqual([(room["id"], room["average_age"]) for room in reports["rooms_with_average_age"]],
+                         [(1, 22), (2, 22)])
+        self.assertEqual([(room["id"], room["age_difference"]) for room in reports["rooms_with_age_difference"]],
+                         [(1, 4), (2, 0)])
+        self.assertEqual(reports["rooms_with_multiple_sex"], [{"id": 1, "name": "Room #1"}])
+
+        top_reports = derive_reports(engine.room_aggregates(), top=1)
+        self.assertEqual([room["id"] for room in top_reports["rooms_with_average_age"]], [1])
+        self.assertEqual([room["id"] for room in top_reports["rooms_with_age_difference"]], [1])
+
+
+class ScratchSchemaTestCase(unittest.TestCase):
+    def scratch_schema_manager(self):
+        schema_name = f"test_{uuid.uuid4().hex}"
+        db_manager = DatabaseManager(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
+        db_manager.pool = ConnectionPool(lambda: psycopg2.connect(
+            dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT,
+            options=f"-c search_path={schema_name}"), max_size=1)
+        self.addCleanup(db_manager.pool.closeall)
+        self.addCleanup(self.execute, db_manager, f"DROP SCHEMA {schema_name} CASCADE;")
+        self.execute(db_manager, f"CREATE SCHEMA {schema_name};")
+        return db_manager
+
+    @staticmethod
+    def execute(db_manager, query, params=None):
+        with db_manager as db:
+            with db.conn.cursor() as cursor:
+                cursor.execute(query, params)
+            db.conn.commit()
+
+
+class TestBuildings(ScratchSchemaTestCase):
+    def test_building_room_range_contains_its_rooms(self):
+        for room_id in (0, 1, 99, 100, 12345, -1):
+            room_id_min, room_id_max = building_room_range(building_of(room_id))
+            self.assertTrue(room_id_min <= room_id <= room_id_max)
+            self.assertEqual(building_of(room_id_min), building_of(room_id_max))
+        self.assertEqual(building_room_range(building_of(0))[1] + 1, building_room_range(building_of(0) + 1)[0])
+
+    def test_report_params_without_building_cover_every_room(self):
+        params = report_params(date(2024, 9, 1))
+        self.assertEqual((params["room_id_min"], params["room_id_max"]), (-2 ** 31, 2 ** 31 - 1))
+        params = report_params(date(2024, 9, 1), building=3)
+        self.assertEqual((params["room_id_min"], params["room_id_max"]), building_room_range(3))
+
+    def test_parallel_aggregates_without_buildings_are_empty(self):
+        db_manager = MagicMock()
+        cursor = db_manager.__enter__.return_value.conn.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = ("00000003-00000002-1",)
+        cursor.fetchall.return_value = []
+
+        self.assertEqual(fetch_room_aggregates(db_manager, as_of=date(2024, 9, 1), building=7, workers=4), [])
+
+    def test_partitioned_students_refuse_duplicate_id_across_buildings(self):
+        db_manager = self.scratch_schema_manager()
+        schema_manager = SchemaManager(db_manager)
+        schema_manager.migrate()
+        self.execute(db_manager, "INSERT INTO rooms (id, name) VALUES (1, 'Room #1'), (%s, 'Room #2');",
+                     (ROOMS_PER_BUILDING + 1,))
+        self.execute(db_manager, "INSERT INTO students (id, name, birthday, sex, room_id) "
+                                 "VALUES (1, 'A', '2004-01-05', 'F', 1);")
+        self.assertEqual(schema_manager.partition_students(), 2)
+
+        with self.assertRaises(psycopg2.errors.UniqueViolation):
+            self.execute(db_manager, "INSERT INTO students (id, name, birthday, sex, room_id) "
+                                     "VALUES (1, 'B', '2004-01-05', 'F', %s);", (ROOMS_PER_BUILDING + 1,))
+        self.execute(db_manager, "UPDATE students SET room_id = %s WHERE id = 1;", (ROOMS_PER_BUILDING + 1,))
+        self.execute(db_manager, "INSERT INTO students (id, name, birthday, sex, room_id) "
+                                 "VALUES (2, 'B', '2004-01-05', 'F', 1);")
+
+    def test_unlogged_swap_refuses_partitioned_students(self):
+        cursor = MagicMock()
+        cursor.fetchone.return_value = (True,)
+
+        with self.assertRaises(ValueError):
+            swap_loaded_students(cursor)
+
+        self.assertNotIn(SWAP_LOADED_STUDENTS_SQL, [call.args[0] for call in cursor.execute.call_args_list])
+
+
+class TestDeriveReports(ScratchSchemaTestCase):
+    aggregates = [
+        RoomAggregate(1, "Room #1", 2, Decimal(44), Decimal(22), Decimal(20), Decimal(24), 2),
+        RoomAggregate(2, "Room #2", 0, None, None, None, None, 0),
+        RoomAggregate(3, "Room #3", 1, Decimal(22), Decimal(22), Decimal(22), Decimal(22), 1),
+        RoomAggregate(4, "Room #4", 2, Decimal(39), Decimal(19.5), Decimal(19), Decimal(20), 1),
+    ]
+
+    def test_four_reports_from_one_set_of_aggregates(self):
+        reports = derive_reports(self.aggregates, top=2)
+
+        self.assertEqual(reports, {
+            "rooms_with_student_count": [
+                {"id": 1, "name": "Room #1", "student_count": 2},
+                {"id": 2, "name": "Room #2", "student_count": 0},
+                {"id": 3, "name": "Room #3", "student_count": 1},
+                {"id": 4, "name": "Room #4", "student_count": 2},
+            ],
+            "rooms_with_average_age": [
+                {"id": 4, "name": "Room #4", "average_age": Decimal(19.5)},
+                {"id": 1, "name": "Room #1", "average_age": Decimal(22)},
+            ],
+            "rooms_with_age_difference": [
+                {"id": 1, "name": "Room #1", "age_difference": Decimal(4)},
+                {"id": 4, "name": "Room #4", "age_difference": Decimal(1)},
+            ],
+            "rooms_with_multiple_sex": [{"id": 1, "name": "Room #1"}],
+        })
+        self.assertEqual(derive_reports([RoomAggregate(2, "Room #2", 0, None, None, None, None, 0)]), {
+            "rooms_with_student_count": [{"id": 2, "name": "Room #2", "student_count": 0}],
+            "rooms_with_average_age": [],
+            "rooms_with_age_difference": [],
+            "rooms_with_multiple_sex": [],
+        })
+
+    def test_reports_match_separate_report_queries(self):
+        db_manager = self.scratch_schema_manager()
+        SchemaManager(db_manager).migrate()
+        self.execute(db_manager, "INSERT INTO rooms (id, name) "
+                                 "SELECT id, 'Room #' || id FROM generate_series(1, 4) AS id;")
+        self.execute(db_manager, """
+            INSERT INTO students (id, name, birthday, sex, room_id) VALUES
+                (1, 'A', '2004-03-01', 'F', 1), (2, 'B', '2000-02-29', 'M', 1),
+                (3, 'C', '2002-03-02', 'M', 3), (4, 'D', '2004-03-02', 'F', 4), (5, 'E', '2005-01-01', 'F', 4);
+        """)
+        as_of = date(2024, 3, 1)
+
+        reports = derive_reports(fetch_room_aggregates(db_manager, as_of=as_of), top=2)
+
+        with db_manager as db:
+            with db.conn.cursor() as cursor:
+                for report_name, query in REPORT_QUERIES.items():
+                    cursor.execute(query, report_params(as_of, top=2))
+                    rows = [dict(zip(REPORT_FIELDS[report_name], row)) for row in cursor.fetchall()]
+                    self.assertEqual(reports[report_name], rows, report_name)
+            db.conn.rollback()
+        self.assertEqual(reports["rooms_with_student_count"][1], {"id": 2, "name": "Room #2", "student_count": 0})
+
+
+class TestSchemaMigrations(unittest.TestCase):
+    def test_migrate_skips_applied_versions_and_applies_new_ones_in_order(self):
+        migrations = [(1, "first", "SELECT 'first';"), (2, "second", "SELECT 'second';"),
+                      (3, "third", "SELECT 'third';")]
+        db_manager = MagicMock()
+        conn = db_manager.__enter__.return_value.conn
+        cursor = conn.cursor.return_value.__enter__.return_value
+        log = MagicMock()
+        log.attach_mock(cursor.execute, "execute")
+        log.attach_mock(conn.commit, "commit")
+        cursor.fetchone.side_effect = lambda: (1,) if cursor.execute.call_args.args[1] == (1,) else None
+
+        with patch('schema.MIGRATIONS', migrations):
+            applied = SchemaManager(db_manager).migrate()
+
+        self.assertEqual(applied, [2, 3])
+        steps = []
+        for name, args, _ in log.mock_calls:
+            if name == "commit":
+                steps.append("commit")
+            elif args[0].startswith("SELECT pg_advisory_xact_lock"):
+                self.assertEqual(args[1], (MIGRATIONS_LOCK_ID,))
+                steps.append("lock")
+            elif "schema_migrations WHERE version" in args[0]:
+                steps.append(f"check {args[1][0]}")
+            elif "INSERT INTO schema_migrations" in args[0]:
+                steps.append(f"record {args[1][0]}")
+            elif "CREATE TABLE IF NOT EXISTS schema_migrations" not in args[0]:
+                steps.append(args[0])
+        self.assertEqual(steps, [
+            "lock", "check 1", "commit",
+            "lock", "check 2", "SELECT 'second';", "record 2", "commit",
+            "lock", "check 3", "SELECT 'third';", "record 3", "commit",
+        ])
+
+
+class TestRoomChanges(ScratchSchemaTestCase):
+    def listen(self):
+        conn = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+        self.addCleanup(conn.close)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {ROOM_CHANGES_CHANNEL};")
+        return conn
+
+    @staticmethod
+    def payloads(conn):
+        select.select([conn], [], [], 5)
+        conn.poll()
+        payloads = [notify.payload for notify in conn.notifies]
+        conn.notifies.clear()
+        return payloads
+
+    def test_loader_notifies_its_rooms_and_other_writes_notify_all(self):
+        db_manager = self.scratch_schema_manager()
+        SchemaManager(db_manager).migrate()
+        self.execute(db_manager, "INSERT INTO rooms (id, name) VALUES (1, 'Room #1'), (2, 'Room #2');")
+        conn = self.listen()
+
+        DataLoader(db_manager).insert_students_data([
+            {"id": 1, "name": "A", "birthday": "2004-01-05T00:00:00.000000", "sex": "F", "room": 2}], use_copy=True)
+        self.assertEqual(self.payloads(conn), ["2"])
+        self.execute(db_manager, "UPDATE students SET room_id = 1;")
+        self.assertEqual(self.payloads(conn), [ROOM_CHANGES_ALL])
+
+    def test_deleted_rooms_are_notified(self):
+        db_manager = self.scratch_schema_manager()
+        SchemaManager(db_manager).migrate()
+        self.execute(db_manager, "INSERT INTO rooms (id, name) VALUES (1, 'Room #1'), (2, 'Room #2');")
+        conn = self.listen()
+
+        self.execute(db_manager, "DELETE FROM room_stats WHERE room_id = 2; DELETE FROM rooms WHERE id = 2;")
+        self.assertEqual(self.payloads(conn), ["2"])
+
+
+class TestLiveRoomReports(unittest.TestCase):
+    def test_apply_rebuilds_only_changed_reports(self):
+        reports = LiveRoomReports(top=1)
+        reports.load([RoomAggregate(1, "Room #1", 2, 40, 20, 19, 21, 2),
+                      RoomAggregate(2, "Room #2", 1, 30, 30, 30, 30, 1),
+                      RoomAggregate(3, "Room #3", 0, None, None, None, None, 0)])
+
+        self.assertEqual(reports.apply([RoomAggregate(2, "Room #2", 2, 61, 30.5, 30, 31, 1)]),
+                         ["rooms_with_student_count"])
+        self.assertEqual(reports.apply([RoomAggregate(3, "Room #3", 1, 18, 18, 18, 18, 1)]),
+                         ["rooms_with_student_count", "rooms_with_average_age"])
+        self.assertEqual([room["id"] for room in reports.reports["rooms_with_average_age"]], [3])
+        self.assertEqual(reports.apply([RoomAggregate(0, "Room #0", 2, 40, 20, 18, 22, 2)]),
+                         ["rooms_with_student_count", "rooms_with_age_difference", "rooms_with_multiple_sex"])
+        self.assertEqual(list(reports.rooms), [0, 1, 2, 3])
+
+    def test_apply_removes_deleted_rooms(self):
+        reports = LiveRoomReports(top=1)
+        reports.load([RoomAggregate(1, "Room #1", 2, 40, 20, 19, 21, 2),
+                      RoomAggregate(2, "Room #2", 1, 30, 30, 30, 30, 1),
+                      RoomAggregate(3, "Room #3", 0, None, None, None, None, 0)])
+
+        self.assertEqual(reports.apply([], [3]), ["rooms_with_student_count"])
+        self.assertEqual(reports.apply([], [1, 4]), list(REPORT_BUILDERS))
+        self.assertEqual(list(reports.rooms), [2])
+        self.assertEqual(reports.reports["rooms_with_average_age"], [{"id": 2, "name": "Room #2", "average_age": 30}])
+        self.assertEqual(reports.reports["rooms_with_multiple_sex"], [])
+
+
+class TestRoomAllocator(unittest.TestCase):
+    def test_place_respects_sex_age_gap_and_capacity(self):
+        allocator = RoomAllocator(capacity=2, max_age_gap=1, same_sex=True)
+        allocator.add_room(1, 1, date(2000, 1, 1), date(2000, 1, 1), 1, 0)
+        allocator.add_room(2, 2, date(2000, 1, 1), date(2000, 5, 1), 0, 2)
+        allocator.add_room(3, 0, None, None, 0, 0)
+        allocator.add_room(4, 1, date(2000, 1, 1), date(2000, 1, 1), 0, 1)
+        students = [
+            (10, "A", date(2003, 1, 1), 'M', None),
+            (11, "B", date(2001, 6, 1), 'M', None),
+            (12, "C", date(2001, 12, 31), 'F', None),
+            (13, "D", date(2002, 1, 1), 'F', None),
+            (14, "E", date(2003, 6, 1), 'M', None),
+        ]
+
+        placed, unplaced = allocator.place(students)
+
+        self.assertEqual(placed, [
+            (11, "B", date(2001, 6, 1), 'M', 1),
+            (12, "C", date(2001, 12, 31), 'F', 4),
+            (13, "D", date(2002, 1, 1), 'F', 3),
+        ])
+        self.assertEqual([student[0] for student in unplaced], [10, 14])
+
+
+class TestMetrics(unittest.TestCase):
+    def test_timed_counts_only_fetching(self):
+        metrics = Metrics()
+        with patch("metrics.time.perf_counter", side_effect=[0.0, 1.0, 5.0, 6.0, 10.0, 10.5]):
+            self.assertEqual(list(metrics.timed("load.parse", ["a", "b"])), ["a", "b"])
+
+        self.assertEqual(metrics.snapshot()["phases"], {"load.parse": {"seconds": 2.5, "calls": 3}})
+
+    def test_prometheus_output(self):
+        metrics = Metrics()
+        metrics.observe("export.fetch", 0.25)
+        metrics.count("export.rows", 3)
+        metrics.count("export.rows", 2)
+
+        output = metrics.to_prometheus()
+
+        self.assertIn('dormitory_phase_seconds_total{phase="export.fetch"} 0.250000\n', output)
+        self.assertIn('dormitory_phase_calls_total{phase="export.fetch"} 1\n', output)
+        self.assertIn('dormitory_export_rows_total 5\n', output)
+
+
+class TestStudentValidation(unittest.TestCase):
+    def test_parse_birthdays(self):
+        self.assertEqual(
+            parse_birthdays(["2004-01-05T00:00:00.000000", "2004-01-05T00:00:00.000000", "2004-02-30T00:00:00.000000",
+                             "1999-12-31T23:59:59.5", "2004-01-05T25:99:99.000000", "2004-W01-1T00:00:00.000000",
+                             None, []]),
+            [date(2004, 1, 5), date(2004, 1, 5), None, date(1999, 12, 31), None, None, None, None])
+
+    def test_invalid_students_are_rejected(self):
+        valid = {"id": 1, "name": "A", "birthday": "2004-01-05T00:00:00.000000", "sex": "F", "room": 7}
+        students = [valid, {**valid, "id": 2, "sex": "X"}, {**valid, "id": 3, "room": 8},
+                    {**valid, "id": 4, "birthday": "bad"}]
+
+        rows, rejected = validate_students(students, {7})
+
+        self.assertEqual(rows, [(1, "A", date(2004, 1, 5), "F", 7)])
+        self.assertEqual([item["reason"] for item in rejected],
+                         ["invalid sex 'X'", "unknown room 8", "invalid birthday 'bad'"])
+        self.assertEqual([item["record"]["id"] for item in rejected], [2, 3, 4])
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache_dir = temp_dir.name
+
+    def test_repeated_fetch_is_served_from_cache(self):
+        cache = QueryCache(self.cache_dir)
+        fetch_rows = MagicMock(return_value=[(1, "Room #1", 2)])
+
+        self.assertEqual(cache.fetch("SELECT 1;", fetch_rows), [(1, "Room #1", 2)])
+        self.assertEqual(QueryCache(self.cache_dir).fetch("SELECT 1;", fetch_rows), [(1, "Room #1", 2)])
+        self.assertEqual(fetch_rows.call_count, 1)
+
+    def test_bump_version_invalidates_entries(self):
+        cache = QueryCache(self.cache_dir)
+        cache.fetch("SELECT 1;", lambda: [(1,)])
+
+        cache.bump_version()
+
+        self.assertIsNone(cache.get("SELECT 1;"))
+        self.assertEqual(os.listdir(self.cache_dir), ["version"])
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = QueryCache(self.cache_dir, max_bytes=55)
+        cache.put("first", None, [(1,)])
+        cache.put("second", None, [(2,)])
+        entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)]
+        for age, path in enumerate(sorted(entries, key=os.path.getmtime)):
+            os.utime(path, (age, age))
+        cache.get("first")
+
+        cache.put("third", None, [("x" * 40,)])
+
+        self.assertIsNotNone(cache.get("first"))
+        self.assertIsNone(cache.get("second"))
+        self.assertIsNotNone(cache.get("third"))
+
+    def test_entries_keep_decimal_and_date_values(self):
+        rows = [(1, "Room #1", Decimal("19.50"), date(2005, 3, 1), datetime(2024, 9, 1, 12, 30), None)]
+        QueryCache(self.cache_dir).put("SELECT 1;", None, rows)
+
+        self.assertEqual(QueryCache(self.cache_dir).get("SELECT 1;"), rows)
+
+    def test_directory_writable_by_others_is_rejected(self):
+        os.chmod(self.cache_dir, 0o777)
 
+        with self.assertRaises(PermissionError):
+            QueryCache(self.cache_dir)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,93 @@
+from typing import Any, Dict, Iterable, Optional, TextIO
+from xml.sax.saxutils import escape
+
+XML_DECLARATION = '<?xml version="1.0" ?>'
+
+_TEXT_ENTITIES = {'"': '&quot;'}
+
+
+class XmlRecordWriter:
+    """
+    Записывает XML-документ в файл по одной записи.
+
+    Каждая запись становится элементом item_tag, каждое её поле — вложенным элементом
+    с текстом str(значение). С отступом результат совпадает с выводом
+    xml.dom.minidom toprettyxml(indent=indent), но документ не строится в памяти целиком.
+
+    Args:
+        file (TextIO): Файл, открытый на запись.
+        root_tag (str): Имя корневого элемента.
+        item_tag (str): Имя элемента для одной записи.
+        indent (Optional[str]): Строка отступа или None для записи без отступов и переводов строк.
+
+    Attributes:
+        written (int): Количество записанных элементов.
+    """
+
+    def __init__(self, file: TextIO, root_tag: str, item_tag: str = "room", indent: Optional[str] = "    "):
+        self.file = file
+        self.root_tag = root_tag
+        self.item_tag = item_tag
+        self.written = 0
+        self._newline = '' if indent is None else '\n'
+        self._item_indent = indent or ''
+        self._field_indent = self._item_indent * 2
+        file.write(XML_DECLARATION + self._newline)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """
+        Записывает очередной элемент.
+
+        Args:
+            record (Dict[str, Any]): Запись.
+        """
+        newline = self._newline
+        if not self.written:
+            self.file.write(f'<{self.root_tag}>{newline}')
+        self.file.write(f'{self._item_indent}<{self.item_tag}>{newline}')
+        for field, value in record.items():
+            text = escape(str(value), _TEXT_ENTITIES)
+            if text:
+                self.file.write(f'{self._field_indent}<{field}>{text}</{field}>{newline}')
+            else:
+                self.file.write(f'{self._field_indent}<{field}/>{newline}')
+        self.file.write(f'{self._item_indent}</{self.item_tag}>{newline}')
+        self.written += 1
+
+    def close(self) -> int:
+        """
+        Закрывает корневой элемент. Файл не закрывается.
+
+        Returns:
+            int: Количество записанных элементов.
+        """
+        if self.written:
+            self.file.write(f'</{self.root_tag}>{self._newline}')
+        else:
+            self.file.write(f'<{self.root_tag}/>{self._newline}')
+        return self.written
+
+
+def write_xml_records(file: TextIO, root_tag: str, records: Iterable[Dict[str, Any]],
+                      item_tag: str = "room", indent: Optional[str] = "    ") -> int:
+    """
+    Записывает записи в файл как XML-документ по мере их поступления.
+
+    Каждая запись становится элементом item_tag, каждое её поле — вложенным элементом
+    с текстом str(значение). С отступом результат совпадает с выводом
+    xml.dom.minidom toprettyxml(indent=indent), но документ не строится в памяти целиком.
+
+    Args:
+        file (TextIO): Файл, открытый на запись.
+        root_tag (str): Имя корневого элемента.
+        records (Iterable[Dict[str, Any]]): Поток записей.
+        item_tag (str): Имя элемента для одной записи.
+        indent (Optional[str]): Строка отступа или None для записи без отступов и переводов строк.
+
+    Returns:
+        int: Количество записанных элементов.
+    """
+    writer = XmlRecordWriter(file, root_tag, item_tag, indent)
+    for record in records:
+        writer.write(record)
+    return writer.close()